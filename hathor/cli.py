@@ -1,11 +1,13 @@
 from copy import deepcopy
 from json import dumps
 from pathlib import Path
+import signal
 
 import click
 from pyaml_env import parse_config
 
 from hathor.client import HathorClient
+from hathor.daemon import SyncScheduler
 from hathor.exc import CliException
 from hathor.podcast.archive import VALID_ARCHIVE_KEYS
 from hathor.utils import setup_logger
@@ -52,6 +54,7 @@ def cli(ctx, config):
         'config': {
             'hathor': options.get('hathor', {}),
             'logging': options.get('logging', {}),
+            'daemon': options.get('daemon', {}),
         }
     }
     config_copy = deepcopy(ctx.obj['config']['hathor'])
@@ -59,6 +62,8 @@ def cli(ctx, config):
         logger = setup_logger('hathor', **ctx.obj['config']['logging'])
         config_copy['logger'] = logger
     ctx.obj['client'] = HathorClient(**config_copy)
+    # Lets background plugins finish before the process exits
+    ctx.call_on_close(ctx.obj['client'].close)
 
 @cli.command(name='dump-config')
 @click.pass_context
@@ -68,6 +73,29 @@ def dump_config(ctx):
     '''
     click.echo(dumps(ctx.obj['config'], indent=4))
 
+@cli.group(name='db')
+@click.pass_context
+def db(_ctx):
+    '''
+    Database functions
+    '''
+
+@db.command(name='status')
+@click.pass_context
+def db_status(ctx):
+    '''
+    Show database schema version
+    '''
+    click.echo(dumps(ctx.obj['client'].database_status(), indent=4))
+
+@db.command(name='migrate')
+@click.pass_context
+def db_migrate(ctx):
+    '''
+    Apply pending database migrations
+    '''
+    click.echo(dumps(ctx.obj['client'].database_migrate(), indent=4))
+
 @cli.group()
 @click.pass_context
 def podcast(_ctx):
@@ -239,18 +267,34 @@ def episode_sync(ctx, include_podcasts, exclude_podcasts, max_episode_sync):
 @click.option('--only-files', is_flag=True, default=False, help='Only show episodes with files')
 @click.option('--include-podcasts', help='Comma separated list of podcasts')
 @click.option('--exclude-podcasts', help='Comma separated list of podcasts')
+@click.option('--no-descriptions', is_flag=True, default=False, help='Leave out episode descriptions')
+@click.option('--limit', type=int, help='Max episodes to list, in id order')
+@click.option('--after-id', type=int, help='List episodes after this id, in id order')
+@click.option('--ndjson', is_flag=True, default=False, help='Stream one JSON episode per line, in id order')
 @click.pass_context
-def episode_list(ctx, only_files, include_podcasts, exclude_podcasts):
+def episode_list(ctx, only_files, include_podcasts, exclude_podcasts, no_descriptions,
+                 limit, after_id, ndjson):
     '''
     Episode list
     '''
     include_podcasts, exclude_podcasts = _generate_cluders(include_podcasts, exclude_podcasts)
-    result = ctx.obj['client'].episode_list(
-        only_files=only_files,
-        include_podcasts=include_podcasts,
-        exclude_podcasts=exclude_podcasts,
-    )
-    click.echo(dumps(result, indent=4))
+    list_args = {
+        'only_files': only_files,
+        'include_podcasts': include_podcasts,
+        'exclude_podcasts': exclude_podcasts,
+        'include_descriptions': not no_descriptions,
+    }
+    if not ndjson and limit is None and after_id is None:
+        result = ctx.obj['client'].episode_list(**list_args)
+        click.echo(dumps(result, indent=4))
+        return
+    episodes = ctx.obj['client'].iter_episodes(limit=limit, after_id=after_id, **list_args)
+    if not ndjson:
+        click.echo(dumps(list(episodes), indent=4))
+        return
+    # Written as each episode is read, so nothing holds the whole library
+    for episode_data in episodes:
+        click.echo(dumps(episode_data))
 
 @episode.command(name='show')
 @click.argument('episode_id', type=int, nargs=-1)
@@ -280,13 +324,14 @@ def episode_update(ctx, episode_id, prevent_delete):
 
 @episode.command(name='download')
 @click.argument('episode_id', type=int, nargs=-1)
+@click.option('--download-concurrency', type=int, help='Episodes to download at once')
 @click.pass_context
-def episode_download(ctx, episode_id):
+def episode_download(ctx, episode_id, download_concurrency):
     '''
     Episode download
     '''
     episode_ids = list(episode_id)
-    result = ctx.obj['client'].episode_download(episode_ids)
+    result = ctx.obj['client'].episode_download(episode_ids, download_concurrency=download_concurrency)
     click.echo(dumps(result, indent=4))
 
 @episode.command(name='delete')
@@ -344,8 +389,11 @@ def episode_cleanup(ctx):
 @click.option('--exclude-podcasts', help='Comma separated list of podcasts')
 @click.option('--no-sync-web-episodes', is_flag=True, default=False, help='Dont sync web episodes')
 @click.option('--no-download-episodes', is_flag=True, default=False, help='Dont download new episodes')
+@click.option('--download-concurrency', type=int, help='Episodes to download at once')
+@click.option('--force', is_flag=True, default=False, help='Sync podcasts not expected to have published yet')
 @click.pass_context
-def podcast_sync(ctx, include_podcasts, exclude_podcasts, no_sync_web_episodes, no_download_episodes):
+def podcast_sync(ctx, include_podcasts, exclude_podcasts, no_sync_web_episodes, no_download_episodes,
+                 download_concurrency, force):
     '''
     Podcast Sync
     '''
@@ -355,9 +403,40 @@ def podcast_sync(ctx, include_podcasts, exclude_podcasts, no_sync_web_episodes,
         exclude_podcasts=exclude_podcasts,
         sync_web_episodes=not no_sync_web_episodes,
         download_episodes=not no_download_episodes,
+        download_concurrency=download_concurrency,
+        force=force,
     )
     click.echo(dumps(result, indent=4))
 
+@cli.command(name='daemon')
+@click.option('--sync-interval', type=int, help='Seconds between syncs of each podcast')
+@click.option('--sync-jitter', type=int, help='Most seconds added at random to each podcast sync')
+@click.option('--no-download-episodes', is_flag=True, default=False, help='Dont download new episodes')
+@click.option('--download-concurrency', type=int, help='Episodes to download at once')
+@click.pass_context
+def daemon(ctx, sync_interval, sync_jitter, no_download_episodes, download_concurrency):
+    '''
+    Sync podcasts on an interval until stopped
+    '''
+    settings = deepcopy(ctx.obj['config']['daemon'])
+    if sync_interval is not None:
+        settings['sync_interval'] = sync_interval
+    if sync_jitter is not None:
+        settings['sync_jitter'] = sync_jitter
+    if no_download_episodes:
+        settings['download_episodes'] = False
+    if download_concurrency is not None:
+        settings['download_concurrency'] = download_concurrency
+    scheduler = SyncScheduler(ctx.obj['client'], **settings)
+    # Let a sync in progress finish and commit before exiting
+    handlers = {signal_number: signal.signal(signal_number, lambda *_: scheduler.stop()) \
+                for signal_number in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        scheduler.run()
+    finally:
+        for signal_number, handler in handlers.items():
+            signal.signal(signal_number, handler)
+
 def main():
     '''
     Hathor CLI runner
@@ -1,39 +1,104 @@
-from datetime import datetime
+# pylint: disable=too-many-lines
+from datetime import datetime, timedelta
+from functools import lru_cache
 from importlib import import_module
-from inspect import getmembers, isfunction
+from importlib.metadata import entry_points
+from inspect import getmembers, isfunction, ismodule
+from statistics import median
 import os
 from logging import RootLogger
 import re
-from shutil import move
+from time import monotonic
 from typing import Literal
+from urllib.parse import urlparse
 
 
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy import and_, desc, or_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func as sql_func
+from sqlalchemy.orm import sessionmaker, undefer
 from sqlalchemy.sql import text
 
 from hathor.audio.metadata import tags_update
-from hathor.database.tables import BASE, Podcast
-from hathor.database.tables import PodcastEpisode, PodcastTitleFilter
+from hathor.database import migrations
+from hathor.database.tables import BroadcastResolution, Podcast
+from hathor.database.tables import PodcastEpisode, PodcastFeedValidator, PodcastSyncCheck, PodcastTitleFilter
+from hathor.database.tables import YoutubeShortsCheck
 from hathor.exc import AudioFileException, EpisodeNotReady, HathorException
+from hathor.hooks import PLUGIN_TIMEOUT, PLUGIN_WORKERS, HookPool
 from hathor.podcast.archive import ARCHIVE_TYPES, VALID_ARCHIVE_KEYS
+from hathor.podcast.archive import HTTP_BACKOFF_FACTOR, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_RETRIES
+from hathor.podcast.archive import build_http_session, compile_title_filters
 from hathor import utils
 
 DEFAULT_DATETIME_FORMAT = '%Y-%m-%d'
 
+# Max urls bound into a single IN clause when checking for stored episodes
+EPISODE_QUERY_CHUNK_SIZE = 500
+# Episodes read per query when iterating over episodes
+EPISODE_ITER_BATCH_SIZE = 1000
+# Media files removed at once when deleting episodes in bulk
+FILE_DELETE_CONCURRENCY = 8
+# Media files moved at once when a podcast's file location changes. Renames are
+# instant, so this only bounds the copies made between filesystems
+FILE_MOVE_CONCURRENCY = 4
+# Most downloads run against one host at once, however wide the download pool
+DOWNLOAD_HOST_CONCURRENCY = 4
+# Days a looked up broadcast id, such as the uploads playlist of a youtube channel,
+# is trusted before it is looked up again. They next to never change
+BROADCAST_RESOLUTION_TTL_DAYS = 30
+# Recent episodes a podcast's publishing interval is measured over
+SYNC_CADENCE_EPISODES = 10
+# A podcast sync checks a podcast again once a quarter of the time between now and
+# its next expected episode has passed, so checks bunch up around the time it should
+# publish and thin out the further off that is, in either direction
+SYNC_CHECK_DIVISOR = 4
+SYNC_CHECK_INTERVAL_MIN = timedelta(minutes=15)
+SYNC_CHECK_INTERVAL_MAX = timedelta(days=7)
+
+# Applied to every sqlite connection, and overridable per pragma through the
+# sqlite_pragmas setting
+SQLITE_PRAGMAS = {
+    # Readers no longer wait on a writer, and a commit appends to the log
+    # instead of rewriting the pages it touched in place
+    'journal_mode' : 'WAL',
+    # Under WAL a power cut can lose the last few commits, never corrupt the file
+    'synchronous' : 'NORMAL',
+    # Milliseconds to wait on another process's lock before giving up
+    'busy_timeout' : 5000,
+    # Negative is in KiB, so 64 MiB of page cache
+    'cache_size' : -64000,
+    'mmap_size' : 256 * 1024 * 1024,
+    'temp_store' : 'MEMORY',
+}
+SQLITE_PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
 FILE_PATH = os.path.abspath(__file__)
 
-def load_plugins():
+# Installed packages can ship plugins under this entry point group, either a module whose
+# functions are all plugins, or a single function named for the client function it follows
+PLUGIN_ENTRY_POINT_GROUP = 'hathor.plugins'
+
+def _plugin_functions_add(plugins: dict, name: str, obj):
+    if ismodule(obj):
+        for func_name, func in getmembers(obj, isfunction):
+            plugins.setdefault(func_name, []).append(func)
+        return
+    plugins.setdefault(name, []).append(obj)
+
+@lru_cache(maxsize=1)
+def load_plugins() -> dict:
     '''
-    Loads plugins for dir, gets list of functions to run later
+    Loads plugins from the plugins dir and the hathor.plugins entry points, once per process
+
+    Returns: dict of client function name to tuple of plugin functions to run after it
     '''
     parent_dir = Path(FILE_PATH).parent
     plugins_dir = parent_dir / 'plugins'
 
-    functions = []
-    for path in plugins_dir.glob('**/*.py'):
+    plugins = {}
+    for path in sorted(plugins_dir.glob('**/*.py')):
         if path.name == '__init__.py':
             continue
         if path.is_dir():
@@ -43,35 +108,42 @@ def load_plugins():
         relative_path = relative_path.parent / relative_path.stem
         import_name = f'hathor.{str(relative_path).replace(os.sep, ".")}'
         # Import and get functions
-        module = import_module(import_name)
-        for name, func in getmembers(module, isfunction):
-            functions.append((name, func))
-    return functions
+        _plugin_functions_add(plugins, import_name, import_module(import_name))
+    for entry_point in entry_points(group=PLUGIN_ENTRY_POINT_GROUP):
+        _plugin_functions_add(plugins, entry_point.name, entry_point.load())
+    # Tuples, since the same dict is shared by every client in the process
+    return {name: tuple(funcs) for name, funcs in plugins.items()}
 
 def run_plugins(func):
     '''
     Decorator to add to functions
-    Will add any plugin function that matches name
+    Will add any plugin function that matches name, run after the function, along with
+    "before_<name>" plugins run ahead of it and "background_<name>" plugins queued after it
     '''
+    func_name = func.__name__
+    before_name = f'before_{func_name}'
+    background_name = f'background_{func_name}'
     def decorator(*args, **kwargs):
-        func_name = func.__name__
-        result = func(*args, **kwargs)
         # Assume first arg called is "self"
         selfie = args[0]
-        # Look through plugins
-        for plugin in selfie.plugins:
-            # Plugins will be (name, func obj)
-            if plugin[0] == func_name:
-                # Run plugin function with client class
-                # and result of original function
-                plugin_func = plugin[1]
-                result = plugin_func(selfie, result, *args, **kwargs)
+        # Plugins are keyed by function name, so most calls find nothing to run
+        for plugin_func in selfie.plugins.get(before_name, ()):
+            # Raising stops the function from running
+            plugin_func(selfie, *args, **kwargs)
+        result = func(*args, **kwargs)
+        for plugin_func in selfie.plugins.get(func_name, ()):
+            # Run plugin function with client class
+            # and result of original function
+            result = plugin_func(selfie, result, *args, **kwargs)
+        for plugin_func in selfie.plugins.get(background_name, ()):
+            # Return value ignored, the caller already has its result
+            selfie.plugin_hooks.submit(plugin_func, selfie, result, *args, **kwargs)
         return result
     return decorator
 
 ArchiveType = Literal[VALID_ARCHIVE_KEYS]
 
-class HathorClient():  # pylint: disable=too-many-instance-attributes
+class HathorClient():  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     '''
     Hathor Client
     Sync podcasts from different sources
@@ -84,7 +156,19 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
                  twitch_client_id: str | None = None,
                  twitch_client_secret: str | None = None,
                  ytdlp_options: dict | None = None,
-                 youtube_skip_shorts: bool = False):
+                 youtube_skip_shorts: bool = False,
+                 sync_concurrency: int = 1,
+                 download_concurrency: int = 1,
+                 download_segments: int = 1,
+                 download_segment_threshold: int | None = None,
+                 http_pool_connections: int = HTTP_POOL_CONNECTIONS,
+                 http_pool_maxsize: int | None = None,
+                 http_retries: int = HTTP_RETRIES,
+                 http_backoff_factor: float = HTTP_BACKOFF_FACTOR,
+                 database_auto_migrate: bool = True,
+                 sqlite_pragmas: dict | None = None,
+                 plugin_workers: int = PLUGIN_WORKERS,
+                 plugin_timeout: float = PLUGIN_TIMEOUT):
         '''
         Initialize the hathor client
         podcast_directory               :   Directory where new podcasts will be placed by default
@@ -96,6 +180,24 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         logger                          :   Logger for client to use
         ytdlp_options                   :   Extra options passed to yt-dlp, merged over hathor's own
         youtube_skip_shorts             :   Leave youtube shorts out of episode syncs
+        sync_concurrency                :   Podcasts listed at once during an episode sync, each archive
+                                            type may hold its own share lower
+        download_concurrency            :   Episodes downloaded at once, each archive type and host may
+                                            hold its own share lower
+        download_segments               :   Split large rss downloads into this many byte ranges fetched at
+                                            once, 1 downloads them as a single stream
+        download_segment_threshold      :   Size in bytes under which rss downloads are never split
+        http_pool_connections           :   Hosts the shared http session keeps a connection pool for
+        http_pool_maxsize               :   Connections kept open per host, by default enough for every
+                                            download and segment that can hit one host at once
+        http_retries                    :   Times a failed idempotent http request is retried
+        http_backoff_factor             :   Base of the exponential sleep between http retries, in seconds
+        database_auto_migrate           :   Apply pending schema migrations when the client starts, when
+                                            off they are left for "hathor db migrate"
+        sqlite_pragmas                  :   Pragmas set on each sqlite connection, merged over SQLITE_PRAGMAS.
+                                            A pragma set to None is left at the sqlite default
+        plugin_workers                  :   Background plugins run at once
+        plugin_timeout                  :   Seconds a background plugin may run before it is abandoned
         '''
         self.podcast_directory = None
         if podcast_directory:
@@ -109,8 +211,14 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         self.engine = create_engine(f'{self.database_connection_string}')
         self.logger.debug(f'Initializing hathor client with database connection {self.database_connection_string}')
 
-        BASE.metadata.create_all(self.engine)
         self.db_session = sessionmaker(bind=self.engine)()
+        # Built once the settings below check out
+        self.http_session = None
+        self.plugin_hooks = None
+        # Hooked up before anything connects
+        if self.engine.dialect.name == 'sqlite':
+            self.__sqlite_pragmas_listen(sqlite_pragmas or {})
+        self.__schema_update(database_auto_migrate)
 
         if not google_api_key:
             self.logger.debug("No google api key given, will not be to able to access google api")
@@ -121,14 +229,75 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         self.twitch_client_secret = twitch_client_secret
         self.ytdlp_options = ytdlp_options or {}
         self.youtube_skip_shorts = youtube_skip_shorts
+        if sync_concurrency < 1:
+            self._fail(f'Sync concurrency must be positive integer, {sync_concurrency} given')
+        self.sync_concurrency = sync_concurrency
+        if download_concurrency < 1:
+            self._fail(f'Download concurrency must be positive integer, {download_concurrency} given')
+        self.download_concurrency = download_concurrency
+        if download_segments < 1:
+            self._fail(f'Download segments must be positive integer, {download_segments} given')
+        self.download_segments = download_segments
+        self.download_segment_threshold = download_segment_threshold
+        if http_pool_connections < 1:
+            self._fail(f'Http pool connections must be positive integer, {http_pool_connections} given')
+        if http_pool_maxsize is None:
+            # A pool smaller than the downloads sharing it drops the extra connections
+            # once they finish, and the next download pays for a new handshake
+            http_pool_maxsize = max(HTTP_POOL_MAXSIZE,
+                                    min(download_concurrency, DOWNLOAD_HOST_CONCURRENCY) * download_segments)
+        if http_pool_maxsize < 1:
+            self._fail(f'Http pool maxsize must be positive integer, {http_pool_maxsize} given')
+        if http_retries < 0:
+            self._fail(f'Http retries must be non-negative integer, {http_retries} given')
+        # One session for every manager, so connections are pooled across all of them
+        self.http_session = build_http_session(pool_connections=http_pool_connections,
+                                               pool_maxsize=http_pool_maxsize,
+                                               retries=http_retries,
+                                               backoff_factor=http_backoff_factor)
         self._archive_managers = {}
 
         self.plugins = load_plugins()
+        self.plugin_hooks = HookPool(self.logger, workers=plugin_workers, timeout=plugin_timeout)
+
+    def __sqlite_pragmas_listen(self, sqlite_pragmas: dict):
+        pragmas = {}
+        for name, value in {**SQLITE_PRAGMAS, **sqlite_pragmas}.items():
+            if name not in SQLITE_PRAGMAS:
+                self._fail(f'Unsupported sqlite pragma {name}, must be one of {", ".join(SQLITE_PRAGMAS)}')
+            if value is None:
+                continue
+            # Pragmas take no bound parameters, so values are held to plain words and numbers
+            if not SQLITE_PRAGMA_VALUE_RE.match(str(value)):
+                self._fail(f'Invalid value for sqlite pragma {name}, {value} given')
+            pragmas[name] = value
+
+        def connect(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+        event.listen(self.engine, 'connect', connect)
+
+    def __schema_update(self, auto_migrate: bool):
+        if migrations.schema_create(self.engine):
+            return
+        if auto_migrate:
+            migrations.migrate(self.engine, self.logger)
+            return
+        pending = migrations.pending_migrations(self.engine)
+        if pending:
+            self.logger.warning(f'Database is {len(pending)} schema migrations behind, '
+                                'run "hathor db migrate" to apply them')
 
     def close(self):
-        '''Close database session and engine connections'''
+        '''Wait on background plugins, then close database session, engine and http connections'''
+        if self.plugin_hooks:
+            self.plugin_hooks.wait()
         self.db_session.close()
         self.engine.dispose()
+        if self.http_session:
+            self.http_session.close()
 
     def __enter__(self):
         return self
@@ -152,10 +321,22 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
                                                  'twitch_client_id' : self.twitch_client_id,
                                                  'twitch_client_secret' : self.twitch_client_secret,
                                                  'ytdlp_options' : self.ytdlp_options,
-                                                 'youtube_skip_shorts' : self.youtube_skip_shorts})
+                                                 'youtube_skip_shorts' : self.youtube_skip_shorts,
+                                                 'download_segments' : self.download_segments,
+                                                 'download_segment_threshold' : self.download_segment_threshold,
+                                                 'http_session' : self.http_session})
         self._archive_managers[archive_type] = manager
         return manager
 
+    def _archive_limits(self, archive_types: set[str], limit_name: str, concurrency: int) -> dict:
+        # Items run at once per archive type, the lower of the pool size and the
+        # cap the archive manager sets for itself
+        limits = {}
+        for archive_type in archive_types:
+            limit = getattr(self._archive_manager(archive_type), limit_name) or concurrency
+            limits[archive_type] = min(limit, concurrency)
+        return limits
+
     def _database_select(self, table, given_input):
         if not given_input:
             return []
@@ -167,6 +348,27 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         self.logger.error(message)
         raise HathorException(message)
 
+    @run_plugins
+    def database_status(self) -> dict:
+        '''
+        Show the schema version of the database, and the migrations it is missing
+        '''
+        pending = migrations.pending_migrations(self.engine)
+        return {
+            'version' : migrations.schema_version(self.engine),
+            'latest_version' : migrations.LATEST_VERSION,
+            'pending' : [{'version' : version, 'description' : description} for version, description, _ in pending],
+        }
+
+    @run_plugins
+    def database_migrate(self) -> list[dict]:
+        '''
+        Apply pending schema migrations to the database
+        '''
+        # Migrations run on their own connections, so the session lets go of its own first
+        self.db_session.commit()
+        return migrations.migrate(self.engine, self.logger)
+
     @run_plugins
     def podcast_create(self, archive_type: ArchiveType,
                        broadcast_id: str,
@@ -290,6 +492,7 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
             self.logger.debug(f'Updating automatic download to {automatic_download} for podcast {podcast_id}')
             pod.automatic_episode_download = automatic_download
 
+        self._feed_validator_clear([pod.id])
         self.db_session.commit()
         self.logger.info(f'Podcast {pod.id} update commited')
         return pod.as_dict(self.datetime_output_format)
@@ -321,18 +524,9 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
             new_podcast_dir.mkdir(exist_ok=True, parents=True)
 
             episodes = self.db_session.query(PodcastEpisode).filter(PodcastEpisode.podcast_id == podcast_id)
-            episodes = episodes.filter(PodcastEpisode.file_path != None)
-            for episode in episodes:
-                episode_path = Path(episode.file_path)
-                new_path = new_podcast_dir / episode_path.name
-                # Not Path.rename, which is os.rename and fails with EXDEV when the two
-                # directories are on different filesystems, or merely on different mount
-                # points of the same filesystem -- which is what two bind mounts of one
-                # drive are inside a container. move falls back to a copy and unlink.
-                move(episode_path, new_path)
-                episode.file_path = str(new_path.resolve())
-                self.logger.info(f'Updating episode {episode.id} to path {str(new_path.resolve())} in db')
-                self.db_session.commit()
+            episodes = episodes.filter(PodcastEpisode.file_path != None).all()
+            new_paths = [new_podcast_dir / Path(episode.file_path).name for episode in episodes]
+            self.__episode_files_move(episodes, new_paths)
             # rm_tree is recursive, so removing the old dir when it resolves to the new one
             # would delete the files that were just moved into it
             if old_podcast_dir.resolve() != new_podcast_dir.resolve():
@@ -343,6 +537,27 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         self.logger.info(f'Updated podcast id: {podcast_id} file location to {str(new_podcast_dir.resolve())}')
         return pod.as_dict(self.datetime_output_format)
 
+    def __episode_files_move(self, episodes: list[PodcastEpisode], new_paths: list[Path]):
+        # Moved on a thread pool, with the records updated from this thread and committed
+        # a batch at a time. Whatever moved before a failure is still committed, and a
+        # file the last run moved without recording it is picked up where it now is
+        started = monotonic()
+        bytes_moved = 0
+        jobs = [(Path(episode.file_path), new_path) for episode, new_path in zip(episodes, new_paths)]
+        results = utils.run_concurrently(lambda job: utils.move_file(*job), jobs, FILE_MOVE_CONCURRENCY)
+        try:
+            for count, (episode, new_path, size) in enumerate(zip(episodes, new_paths, results), start=1):
+                episode.file_path = str(new_path.resolve())
+                self.logger.debug(f'Updating episode {episode.id} to path {episode.file_path} in db')
+                bytes_moved += size
+                if count % EPISODE_QUERY_CHUNK_SIZE == 0 or count == len(episodes):
+                    self.db_session.commit()
+                    rate = bytes_moved / max(monotonic() - started, 0.001) / 2 ** 20
+                    self.logger.info(f'Moved {count}/{len(episodes)} episode files, '
+                                     f'{bytes_moved / 2 ** 20:.1f} MiB at {rate:.1f} MiB/s')
+        finally:
+            self.db_session.commit()
+
     @run_plugins
     def podcast_delete(self, podcast_input: list[int], delete_files: bool = True) -> list[int]:
         '''
@@ -357,23 +572,34 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
     @run_plugins
     def __podcast_delete_input(self, podcast_input: list[int], delete_files: bool) -> list[int]:
-        podcasts_deleted = []
-        for podcast in podcast_input:
-            # first delete all episodes
-            episodes = self.db_session.query(PodcastEpisode).filter(PodcastEpisode.podcast_id == podcast.id).all()
-            self.__episode_delete_input(episodes, delete_files=delete_files)
-            # delete all filters
-            filters = self.db_session.query(PodcastTitleFilter).filter(PodcastTitleFilter.podcast_id == podcast.id).all()
-            self.__podcast_title_filter_delete_input(filters)
-            # delete record
-            self.db_session.delete(podcast)
-            self.db_session.commit()
-            self.logger.info(f'Deleted podcast record: {podcast.id}')
-            # delete files if needed
-            if delete_files:
-                utils.rm_tree(Path(podcast.file_location))
-            podcasts_deleted.append(podcast.id)
-        return podcasts_deleted
+        podcasts = list(podcast_input)
+        podcast_ids = [podcast.id for podcast in podcasts]
+        if not podcast_ids:
+            return []
+        directories = [Path(podcast.file_location) for podcast in podcasts]
+        # Episodes and filters of every podcast at once, through the same functions as
+        # deleting them directly so their plugins still run, but left for the one commit
+        # below so a failure part way leaves the podcast whole. Files can live outside the
+        # podcast directory after an episode path update, so they are removed on their
+        # own before the directories go
+        episodes = self.db_session.query(PodcastEpisode).\
+            filter(PodcastEpisode.podcast_id.in_(podcast_ids)).all()
+        self.__episode_delete_input(episodes, delete_files=delete_files, commit=False)
+        filters = self.db_session.query(PodcastTitleFilter).\
+            filter(PodcastTitleFilter.podcast_id.in_(podcast_ids)).all()
+        self.__podcast_title_filter_delete_input(filters, commit=False)
+        # Cleared for podcasts without episodes or filters too, or the next podcast
+        # given a reused id would inherit their validators, sync checks and shorts checks
+        self._feed_validator_clear(podcast_ids)
+        self.db_session.query(YoutubeShortsCheck).filter(YoutubeShortsCheck.podcast_id.in_(podcast_ids)).\
+            delete(synchronize_session=False)
+        self.db_session.query(Podcast).filter(Podcast.id.in_(podcast_ids)).delete()
+        self.db_session.commit()
+        self.logger.info(f'Deleted podcast records: {podcast_ids}')
+        if delete_files:
+            list(utils.run_concurrently(lambda pth: pth.exists() and utils.rm_tree(pth),
+                                        directories, FILE_DELETE_CONCURRENCY))
+        return podcast_ids
 
     @run_plugins
     def filter_create(self, podcast_id: int, regex_string: str) -> dict:
@@ -389,6 +615,10 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         podcast = self.db_session.get(Podcast, podcast_id)
         if not podcast:
             self._fail(f'Unable to find podcast with id: {podcast_id}')
+        try:
+            re.compile(regex_string)
+        except re.error as error:
+            self._fail(f'Invalid regex string: {regex_string}, {str(error)}')
 
         new_args = {
             'podcast_id' : podcast.id,
@@ -396,6 +626,7 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         }
         new_filter = PodcastTitleFilter(**new_args)
         self.db_session.add(new_filter)
+        self._feed_validator_clear([podcast.id])
         self.db_session.commit()
         self.logger.info(f'Created new podcast filter: {new_filter.id}, podcast_id: {podcast.id} and regex: {regex_string}')
         return new_filter.as_dict(self.datetime_output_format)
@@ -433,13 +664,18 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         return self.__podcast_title_filter_delete_input(query)
 
     @run_plugins
-    def __podcast_title_filter_delete_input(self, filter_input: list[int]) -> list[int]:
-        filters_deleted = []
-        for title_filter in filter_input:
-            self.db_session.delete(title_filter)
+    def __podcast_title_filter_delete_input(self, filter_input: list[int], commit: bool = True) -> list[int]:
+        # Left uncommitted when part of a podcast delete, which commits once
+        filters = list(filter_input)
+        filters_deleted = [title_filter.id for title_filter in filters]
+        if not filters_deleted:
+            return []
+        self._feed_validator_clear(list({title_filter.podcast_id for title_filter in filters}))
+        self.db_session.query(PodcastTitleFilter).\
+            filter(PodcastTitleFilter.id.in_(filters_deleted)).delete()
+        if commit:
             self.db_session.commit()
-            filters_deleted.append(title_filter.id)
-            self.logger.info(f'Deleted podcast title filter: {title_filter.id}')
+        self.logger.info(f'Deleted podcast title filters: {filters_deleted}')
         return filters_deleted
 
     @run_plugins
@@ -458,7 +694,11 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
     @run_plugins
     def __episode_sync_cluders(self, include_podcasts: list[int] | None, exclude_podcasts: list[int] | None,
-                               max_episode_sync: int | None = None, automatic_sync: bool = True) -> list[dict]:
+                               max_episode_sync: int | None = None, automatic_sync: bool = True,
+                               adaptive: bool | None = None) -> list[dict]:
+        # With adaptive set, podcasts not expected to have published are left out, and
+        # with it set either way the podcasts synced are recorded for the next podcast
+        # sync to judge by. Left unset, as for episode_sync, the sync checks go untouched
         query = self.db_session.query(Podcast)
         if include_podcasts:
             opts = (Podcast.id == pod for pod in include_podcasts)
@@ -467,108 +707,424 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
             opts = (Podcast.id != pod for pod in exclude_podcasts)
             query = query.filter(and_(opts))
 
-        new_episodes = []
+        sync_checks = {row.podcast_id: row for row in self.db_session.query(PodcastSyncCheck)}
+        sync_started = datetime.now()
+        podcasts = []
         for podcast in query:
             if not automatic_sync and not podcast.automatic_episode_download:
                 self.logger.debug(f'Skipping episode sync on podcast: {podcast.id}')
                 continue
+            podcasts.append(podcast)
+        if adaptive:
+            podcasts = self.__podcast_sync_due_filter(podcasts, sync_checks, sync_started)
+
+        validators = {row.podcast_id: row for row in self.db_session.query(PodcastFeedValidator)}
+        plans = [self.__episode_sync_plan(podcast, max_episode_sync, validators.get(podcast.id)) \
+                 for podcast in podcasts]
+
+        # Only the listings run on the pool. The session is not thread safe, so the
+        # episodes are stored from this thread as each listing comes back, in
+        # podcast order. Each archive type is held to its own cap, so a big library
+        # of rss feeds cannot drag youtube past its rate limits, and listings held
+        # back by their cap leave the workers to the other types
+        type_limits = self._archive_limits({plan['archive_type'] for plan in plans},
+                                           'sync_concurrency_limit', self.sync_concurrency)
+
+        # Read back here once every listing is done
+        shorts_caches = self.__shorts_check_load([plan['podcast_id'] for plan in plans])
+        shorts_known = {podcast_id: set(cache) for podcast_id, cache in shorts_caches.items()}
+        resolution_rows, resolution_caches = self.__broadcast_resolution_load({plan['archive_type'] for plan in plans})
+        resolutions_known = {archive_type: dict(cache) for archive_type, cache in resolution_caches.items()}
+
+        def fetch(plan):
+            return self.__episode_sync_fetch(plan, shorts_caches[plan['podcast_id']],
+                                             resolution_caches[plan['archive_type']])
 
-            self.logger.debug(f'Running episode sync on podcast: {podcast.id}')
-            manager = self._archive_manager(podcast.archive_type)
-
-            # check for filters for podcast
-            compiled_filters = [re.compile(f.regex_string) for f in \
-                self.db_session.query(PodcastTitleFilter).\
-                filter(PodcastTitleFilter.podcast_id == podcast.id)]
-
-            # Handed to the archive manager so it can stop paging once it reaches
-            # episodes already stored. The per-episode checks below still run,
-            # managers are free to ignore this
-            known_urls = {row[0] for row in self.db_session.query(PodcastEpisode.download_url).\
-                filter(PodcastEpisode.podcast_id == podcast.id)}
-
-            # A podcast under its max allowed is missing episodes OLDER than the ones it
-            # still has, and a newest-first listing that stops on known episodes can never
-            # reach them -- deleting episodes, or a new filter dropping some, strands the
-            # gap forever. Ask for a backfill instead, sized to the gap so it stops as
-            # soon as the podcast is whole again
-            episodes_stored = len(known_urls)
-            backfill = podcast.max_allowed is not None and episodes_stored < podcast.max_allowed
-            if backfill:
-                self.logger.debug(f'Podcast {podcast.id} holds {episodes_stored} of '
-                                  f'{podcast.max_allowed} episodes, backfilling the difference')
-
-            # if sync all episodes, give no max results so all episodes returned
-            if max_episode_sync is None:
-                # An explicit max_episode_sync is the caller's call and overrides the gap
-                max_results = podcast.max_allowed - episodes_stored if backfill else podcast.max_allowed
-            elif max_episode_sync == 0:
-                max_results = None
-            else:
-                max_results = max_episode_sync
-
-            current_episodes = manager.broadcast_update(podcast.broadcast_id,
-                                                        max_results=max_results,
-                                                        filters=compiled_filters,
-                                                        known_urls=known_urls,
-                                                        backfill=backfill)
-            for episode in current_episodes:
-                episode_processed_url = episode['download_link']
-                # Patreon keeps the same basic url but changes up the query params
-                # Have this check for the base url, default to full url for others
-                is_patreon = utils.check_patreon(episode['download_link'])
-                if is_patreon:
-                    episode_processed_url = utils.process_url(episode['download_link'])
-                    existing_episode = self.db_session.query(PodcastEpisode).filter(PodcastEpisode.processed_url == episode_processed_url).first()
-                    if existing_episode:
-                        self.logger.debug(f'Episode {existing_episode.id} has same url "{episode_processed_url}", skipping saving episode')
-                        continue
-                existing_episode = self.db_session.query(PodcastEpisode).filter(PodcastEpisode.download_url == episode['download_link']).first()
-                if existing_episode:
-                    self.logger.debug(f'Episode {existing_episode.id} has same url "{episode["download_link"]}", skipping saving episode')
+        new_episodes = []
+        feeds_unchanged = 0
+        results = utils.run_concurrently(fetch, plans, self.sync_concurrency,
+                                         limits=lambda plan: [(plan['archive_type'], type_limits[plan['archive_type']])])
+        for plan, current_episodes in zip(plans, results):
+            new_episodes += self.__episode_sync_insert(plan['podcast'], current_episodes,
+                                                       plan['known_urls'], plan['known_processed_urls'])
+            # Saved only once the episodes are, so a sync that fails part way
+            # fetches the feed in full next time
+            if plan['feed_state'] is not None:
+                if plan['feed_state'].get('unchanged'):
+                    feeds_unchanged += 1
+                    self.logger.debug(f'Feed unchanged for podcast: {plan["podcast_id"]}, skipping')
+                self.__feed_validator_save(plan['podcast_id'], plan['feed_validator'], plan['feed_state'])
+        if feeds_unchanged:
+            self.logger.info(f'Episode sync found {feeds_unchanged} of {len(plans)} feeds unchanged')
+        shorts_checked = [YoutubeShortsCheck(podcast_id=podcast_id, video_id=video_id, is_short=is_short) \
+                          for podcast_id, cache in shorts_caches.items() \
+                          for video_id, is_short in cache.items() if video_id not in shorts_known[podcast_id]]
+        if shorts_checked:
+            self.db_session.add_all(shorts_checked)
+            self.db_session.commit()
+            self.logger.debug(f'Stored {len(shorts_checked)} new youtube shorts checks')
+        self.__broadcast_resolution_save(resolution_rows, resolution_caches, resolutions_known)
+        if adaptive is not None:
+            self.__podcast_sync_check_save([plan['podcast_id'] for plan in plans], sync_checks, sync_started)
+        return new_episodes
+
+    def __podcast_sync_due_filter(self, podcasts: list[Podcast], sync_checks: dict, now: datetime) -> list[Podcast]:
+        due = []
+        for podcast in podcasts:
+            sync_check = sync_checks.get(podcast.id)
+            # Podcasts never synced, or without the episodes to measure, are always due
+            if sync_check is not None and sync_check.publish_interval is not None:
+                expected = sync_check.last_published + timedelta(seconds=sync_check.publish_interval)
+                check_interval = min(max(abs(now - expected) / SYNC_CHECK_DIVISOR, SYNC_CHECK_INTERVAL_MIN),
+                                     SYNC_CHECK_INTERVAL_MAX)
+                if now - sync_check.last_checked < check_interval:
+                    self.logger.debug(f'Skipping episode sync on podcast: {podcast.id}, not expected to publish yet')
+                    continue
+            due.append(podcast)
+        if len(due) < len(podcasts):
+            self.logger.info(f'Episode sync skipped {len(podcasts) - len(due)} podcasts not expected to publish yet')
+        return due
+
+    def __podcast_sync_check_save(self, podcast_ids: list[int], sync_checks: dict, checked: datetime):
+        if not podcast_ids:
+            return
+        # The newest few dates of every podcast synced, in one ranked query
+        rank = self.__episode_rank_subquery(PodcastEpisode.podcast_id.in_(podcast_ids),
+                                            PodcastEpisode.date.isnot(None))
+        dates = {}
+        for podcast_id, date in self.db_session.query(PodcastEpisode.podcast_id, PodcastEpisode.date).\
+                join(rank, rank.c.id == PodcastEpisode.id).\
+                filter(rank.c.rank <= SYNC_CADENCE_EPISODES):
+            dates.setdefault(podcast_id, []).append(date)
+        for podcast_id in podcast_ids:
+            sync_check = sync_checks.get(podcast_id)
+            if sync_check is None:
+                sync_check = PodcastSyncCheck(podcast_id=podcast_id)
+                self.db_session.add(sync_check)
+            sync_check.last_checked = checked
+            # Kept from earlier syncs when too few episodes are left to measure,
+            # such as after the ones without files are cleaned up
+            podcast_dates = sorted(dates.get(podcast_id, []))
+            if len(podcast_dates) > 1:
+                gaps = [(later - earlier).total_seconds() for earlier, later in zip(podcast_dates, podcast_dates[1:])]
+                sync_check.last_published = podcast_dates[-1]
+                sync_check.publish_interval = int(median(gaps))
+        self.db_session.commit()
+
+    def __shorts_check_load(self, podcast_ids: list[int]) -> dict:
+        # One cache per podcast, holding the answers of that podcast only, so the
+        # table is never read in full
+        caches = {podcast_id: {} for podcast_id in podcast_ids}
+        if not self.youtube_skip_shorts or not podcast_ids:
+            return caches
+        for row in self.db_session.query(YoutubeShortsCheck).filter(YoutubeShortsCheck.podcast_id.in_(podcast_ids)):
+            caches[row.podcast_id][row.video_id] = row.is_short
+        return caches
+
+    def __broadcast_resolution_load(self, archive_types: set[str]) -> tuple[dict, dict]:
+        # Every stored row, to update in place, and the ids still inside their ttl
+        # by archive type and broadcast id, for the listings to read and add to
+        cutoff = datetime.now() - timedelta(days=BROADCAST_RESOLUTION_TTL_DAYS)
+        rows = {}
+        caches = {archive_type: {} for archive_type in archive_types}
+        for row in self.db_session.query(BroadcastResolution).\
+                filter(BroadcastResolution.archive_type.in_(archive_types)):
+            rows[(row.archive_type, row.broadcast_id)] = row
+            if row.resolved_at >= cutoff:
+                caches[row.archive_type][row.broadcast_id] = row.resolved_id
+        return rows, caches
+
+    def __broadcast_resolution_save(self, rows: dict, caches: dict, known: dict):
+        now = datetime.now()
+        changed = False
+        for archive_type, cache in caches.items():
+            for broadcast_id, resolved_id in cache.items():
+                if known[archive_type].get(broadcast_id) == resolved_id:
                     continue
-                episode_args = {
-                    'title' : episode['title'],
-                    'date' : episode['date'],
-                    'description' : episode['description'],
-                    'download_url' : episode['download_link'],
-                    'processed_url': episode_processed_url,
-                    'podcast_id' : podcast.id,
-                    'prevent_deletion' : False,
+                row = rows.get((archive_type, broadcast_id))
+                if row is None:
+                    row = BroadcastResolution(archive_type=archive_type, broadcast_id=broadcast_id)
+                    self.db_session.add(row)
+                row.resolved_id = resolved_id
+                row.resolved_at = now
+                changed = True
+        if changed:
+            self.db_session.commit()
+
+    def __feed_validator_save(self, podcast_id: int, validator: PodcastFeedValidator | None, feed_state: dict):
+        values = {
+            'etag' : feed_state.get('etag'),
+            'last_modified' : feed_state.get('modified'),
+            'content_hash' : feed_state.get('content_hash'),
+        }
+        if validator is None:
+            # Managers that do not use validators leave the state alone
+            if not any(values.values()):
+                return
+            validator = PodcastFeedValidator(podcast_id=podcast_id)
+            self.db_session.add(validator)
+        elif all(getattr(validator, key) == value for key, value in values.items()):
+            return
+        for key, value in values.items():
+            setattr(validator, key, value)
+        self.db_session.commit()
+
+    def _feed_validator_clear(self, podcast_ids: list[int] | None = None):
+        # Anything that changes which episodes a sync should store -- filters, max allowed,
+        # episodes deleted and due to be picked up again -- has to fetch the feed in
+        # full next time, so the validators go. So do the sync checks, so the next
+        # podcast sync does not leave the podcast out. No podcast ids clears every podcast
+        for table in (PodcastFeedValidator, PodcastSyncCheck):
+            query = self.db_session.query(table)
+            if podcast_ids is not None:
+                query = query.filter(table.podcast_id.in_(podcast_ids))
+            # Fetched, so rows loaded earlier and expired since still leave the session
+            query.delete(synchronize_session='fetch')
+
+    def __episode_sync_plan(self, podcast: Podcast, max_episode_sync: int | None,
+                            feed_validator: PodcastFeedValidator | None) -> dict:
+        manager = self._archive_manager(podcast.archive_type)
+
+        # check for filters for podcast, in a stable order since the compiled
+        # filters are cached on them across syncs
+        title_filters = tuple(f.regex_string for f in \
+            self.db_session.query(PodcastTitleFilter).\
+            filter(PodcastTitleFilter.podcast_id == podcast.id).\
+            order_by(PodcastTitleFilter.id))
+        compile_title_filters(title_filters)
+
+        # Handed to the archive manager so it can stop paging once it reaches
+        # episodes already stored, and used below to drop the episodes this
+        # podcast already holds without going back to the database for each one.
+        # Managers are free to ignore it
+        known_urls = set()
+        known_processed_urls = set()
+        for download_url, processed_url in self.db_session.query(PodcastEpisode.download_url,
+                                                                 PodcastEpisode.processed_url).\
+                filter(PodcastEpisode.podcast_id == podcast.id):
+            known_urls.add(download_url)
+            known_processed_urls.add(processed_url)
+
+        # A podcast under its max allowed is missing episodes OLDER than the ones it
+        # still has, and a newest-first listing that stops on known episodes can never
+        # reach them -- deleting episodes, or a new filter dropping some, strands the
+        # gap forever. Ask for a backfill instead, sized to the gap so it stops as
+        # soon as the podcast is whole again
+        episodes_stored = len(known_urls)
+        backfill = podcast.max_allowed is not None and episodes_stored < podcast.max_allowed
+        if backfill:
+            self.logger.debug(f'Podcast {podcast.id} holds {episodes_stored} of '
+                              f'{podcast.max_allowed} episodes, backfilling the difference')
+
+        # if sync all episodes, give no max results so all episodes returned
+        if max_episode_sync is None:
+            # An explicit max_episode_sync is the caller's call and overrides the gap
+            max_results = podcast.max_allowed - episodes_stored if backfill else podcast.max_allowed
+        elif max_episode_sync == 0:
+            max_results = None
+        else:
+            max_results = max_episode_sync
+
+        # A backfill or an explicit max_episode_sync is after episodes the last
+        # listing left out, so an unchanged feed still has to be walked in full
+        feed_state = None
+        if max_episode_sync is None and not backfill:
+            feed_state = {}
+            if feed_validator is not None:
+                feed_state = {
+                    'etag' : feed_validator.etag,
+                    'modified' : feed_validator.last_modified,
+                    'content_hash' : feed_validator.content_hash,
                 }
-                new_episode = PodcastEpisode(**episode_args)
-                self.db_session.add(new_episode)
-                self.db_session.commit()
-                self.logger.debug(f'Created new podcast episode: {new_episode.id} from url: {new_episode.download_url}')
-                new_episodes.append(new_episode.as_dict(self.datetime_output_format))
+
+        return {
+            'podcast' : podcast,
+            'manager' : manager,
+            # Read here so the listing never touches the session from another thread
+            'podcast_id' : podcast.id,
+            'archive_type' : podcast.archive_type,
+            'broadcast_id' : podcast.broadcast_id,
+            'max_results' : max_results,
+            'filters' : title_filters,
+            'known_urls' : known_urls,
+            'known_processed_urls' : known_processed_urls,
+            'backfill' : backfill,
+            'feed_validator' : feed_validator,
+            'feed_state' : feed_state,
+        }
+
+    def __episode_sync_fetch(self, plan: dict, shorts_cache: dict, resolution_cache: dict) -> list[dict]:
+        self.logger.debug(f'Running episode sync on podcast: {plan["podcast_id"]}')
+        return plan['manager'].broadcast_update(plan['broadcast_id'],
+                                                max_results=plan['max_results'],
+                                                filters=plan['filters'],
+                                                known_urls=plan['known_urls'],
+                                                backfill=plan['backfill'],
+                                                feed_state=plan['feed_state'],
+                                                shorts_cache=shorts_cache,
+                                                resolution_cache=resolution_cache)
+
+    def _episode_urls_stored(self, column, urls: set[str]) -> set[str]:
+        '''
+        Find which of the given urls are already stored on any podcast
+        column  :   PodcastEpisode column to match against
+        urls    :   Urls to look for
+        '''
+        stored = set()
+        urls = list(urls)
+        # Chunked to stay well under the bound parameter limit of sqlite
+        for start in range(0, len(urls), EPISODE_QUERY_CHUNK_SIZE):
+            chunk = urls[start:start + EPISODE_QUERY_CHUNK_SIZE]
+            stored.update(row[0] for row in self.db_session.query(column).filter(column.in_(chunk)))
+        return stored
+
+    def __episode_sync_insert(self, podcast: Podcast, current_episodes: list[dict],
+                              known_urls: set[str], known_processed_urls: set[str]) -> list[dict]:
+        # Drop anything the podcast already holds, or that turns up twice in the
+        # same listing, without touching the database
+        candidates = []
+        listed_urls = set()
+        listed_processed_urls = set()
+        for episode in current_episodes:
+            download_url = episode['download_link']
+            # Patreon keeps the same basic url but changes up the query params
+            # Have this check for the base url, default to full url for others
+            processed_url = download_url
+            is_patreon = utils.check_patreon(download_url)
+            if is_patreon:
+                processed_url = utils.process_url(download_url)
+                if processed_url in known_processed_urls or processed_url in listed_processed_urls:
+                    self.logger.debug(f'Episode with url "{processed_url}" already stored, skipping saving episode')
+                    continue
+            if download_url in known_urls or download_url in listed_urls:
+                self.logger.debug(f'Episode with url "{download_url}" already stored, skipping saving episode')
+                continue
+            listed_urls.add(download_url)
+            listed_processed_urls.add(processed_url)
+            candidates.append((episode, processed_url, is_patreon))
+        if not candidates:
+            return []
+
+        # Download urls are unique across every podcast, and patreon urls are matched
+        # on their base url across every podcast, so what is left still has to be
+        # checked against the rest of the library. One query for the whole listing
+        # rather than one per episode
+        stored_urls = self._episode_urls_stored(PodcastEpisode.download_url,
+                                                {c[0]['download_link'] for c in candidates})
+        stored_processed_urls = self._episode_urls_stored(PodcastEpisode.processed_url,
+                                                          {c[1] for c in candidates if c[2]})
+
+        new_rows = []
+        for episode, processed_url, is_patreon in candidates:
+            if is_patreon and processed_url in stored_processed_urls:
+                self.logger.debug(f'Episode with url "{processed_url}" stored on another podcast, skipping saving episode')
+                continue
+            if episode['download_link'] in stored_urls:
+                self.logger.debug(f'Episode with url "{episode["download_link"]}" stored on another podcast, skipping saving episode')
+                continue
+            new_rows.append(PodcastEpisode(**{
+                'title' : episode['title'],
+                'date' : episode['date'],
+                'description' : episode['description'],
+                'download_url' : episode['download_link'],
+                'processed_url': processed_url,
+                'podcast_id' : podcast.id,
+                'prevent_deletion' : False,
+            }))
+        if not new_rows:
+            return []
+
+        # All of a podcasts new episodes go in as one batched insert and one commit.
+        # The flush hands back the new ids, and reading the rows before the commit
+        # expires them saves a select per episode
+        self.db_session.add_all(new_rows)
+        self.db_session.flush()
+        new_episodes = []
+        for new_episode in new_rows:
+            self.logger.debug(f'Created new podcast episode: {new_episode.id} from url: {new_episode.download_url}')
+            new_episodes.append(new_episode.as_dict(self.datetime_output_format))
+        self.db_session.commit()
         return new_episodes
 
+    def __episode_list_query(self, only_files: bool, include_podcasts: list[int] | None,
+                             exclude_podcasts: list[int] | None, include_descriptions: bool):
+        query = self.db_session.query(PodcastEpisode)
+        if include_descriptions:
+            # Loaded with the rows, not one query per row
+            query = query.options(undefer(PodcastEpisode.description))
+        if only_files:
+            query = query.filter(PodcastEpisode.file_path != None)
+        if include_podcasts:
+            opts = (PodcastEpisode.podcast_id == pod for pod in include_podcasts)
+            query = query.filter(or_(opts))
+        if exclude_podcasts:
+            opts = (PodcastEpisode.podcast_id != pod for pod in exclude_podcasts)
+            query = query.filter(and_(opts))
+        return query
+
     @run_plugins
     def episode_list(self, only_files: bool = True,
-                     include_podcasts: list[int] | None = None, exclude_podcasts: list[int] | None = None) -> list[dict]:
+                     include_podcasts: list[int] | None = None, exclude_podcasts: list[int] | None = None,
+                     include_descriptions: bool = True) -> list[dict]:
         '''
         List Podcast Episodes
         only_files           :   Indicates you only want to list episodes with a file_path
         include_podcasts     :   Only include these podcasts. Single ID or lists of IDs
         exclude_podcasts     :   Do not include these podcasts. Single ID or list of IDs
+        include_descriptions :   Include episode descriptions, which are left out of the query entirely when not
 
         Returns: List of dictionaries for all episodes requested
         '''
-        query = self.db_session.query(PodcastEpisode).order_by(desc(PodcastEpisode.date))
-        if only_files:
-            query = query.filter(PodcastEpisode.file_path != None)
-        if include_podcasts:
-            opts = (PodcastEpisode.podcast_id == pod for pod in include_podcasts)
-            query = query.filter(or_(opts))
-        if exclude_podcasts:
-            opts = (PodcastEpisode.podcast_id != pod for pod in exclude_podcasts)
-            query = query.filter(and_(opts))
+        query = self.__episode_list_query(only_files, include_podcasts, exclude_podcasts, include_descriptions).\
+            order_by(desc(PodcastEpisode.date))
+        exclude = None if include_descriptions else ['description']
 
         episode_data = []
         for episode in query.all():
-            episode_data.append(episode.as_dict(self.datetime_output_format))
+            episode_data.append(episode.as_dict(self.datetime_output_format, exclude=exclude))
         return episode_data
 
+    def iter_episodes(self, only_files: bool = True,
+                      include_podcasts: list[int] | None = None, exclude_podcasts: list[int] | None = None,
+                      include_descriptions: bool = True, limit: int | None = None, after_id: int | None = None,
+                      batch_size: int = EPISODE_ITER_BATCH_SIZE):
+        '''
+        Iterate over Podcast Episodes in id order, a batch at a time, so memory
+        stays flat however large the library
+        only_files           :   Indicates you only want to list episodes with a file_path
+        include_podcasts     :   Only include these podcasts. Single ID or lists of IDs
+        exclude_podcasts     :   Do not include these podcasts. Single ID or list of IDs
+        include_descriptions :   Include episode descriptions, which are left out of the query entirely when not
+        limit                :   Stop after this many episodes
+        after_id             :   Start after this episode id, the id of the last episode of a previous page
+        batch_size           :   Episodes fetched per query
+
+        Yields: Dictionary for each episode requested
+        '''
+        if limit is not None and limit < 1:
+            self._fail(f'Limit must be positive integer, {limit} given')
+        if batch_size < 1:
+            self._fail(f'Batch size must be positive integer, {batch_size} given')
+        query = self.__episode_list_query(only_files, include_podcasts, exclude_podcasts, include_descriptions).\
+            order_by(PodcastEpisode.id)
+        exclude = None if include_descriptions else ['description']
+
+        yielded = 0
+        while limit is None or yielded < limit:
+            # Keyset pagination, each batch picks up after the last id of the one
+            # before. Unlike an offset it costs the same however deep it goes
+            page = query
+            if after_id is not None:
+                page = page.filter(PodcastEpisode.id > after_id)
+            size = batch_size if limit is None else min(batch_size, limit - yielded)
+            episodes = page.limit(size).all()
+            for episode in episodes:
+                yield episode.as_dict(self.datetime_output_format, exclude=exclude)
+            if len(episodes) < size:
+                return
+            yielded += len(episodes)
+            after_id = episodes[-1].id
+
     @run_plugins
     def episode_show(self, episode_input: list[int]) -> list[dict]:
         '''
@@ -577,7 +1133,9 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
         Returns: List of dictionaries for all episodes requested
         '''
-        query = self._database_select(PodcastEpisode, episode_input)
+        if not episode_input:
+            return []
+        query = self._database_select(PodcastEpisode, episode_input).options(undefer(PodcastEpisode.description))
         episode_list = []
         for episode in query:
             episode_list.append(episode.as_dict(self.datetime_output_format))
@@ -592,15 +1150,18 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
         Returns: dict representing updated episodes
         '''
-        episode = self.db_session.get(PodcastEpisode, episode_id)
+        episode = self.db_session.get(PodcastEpisode, episode_id, options=[undefer(PodcastEpisode.description)])
         if not episode:
             self._fail(f'Podcast Episode not found for ID: {episode_id}')
 
         if prevent_delete is not None:
             self.logger.debug(f'Updating prevent delete to {prevent_delete} for episode {episode_id}')
             episode.prevent_deletion = prevent_delete
+        # Read before the commit expires the row, which would cost a select for the
+        # row and another for its description
+        episode_data = episode.as_dict(self.datetime_output_format)
         self.db_session.commit()
-        return episode.as_dict(self.datetime_output_format)
+        return episode_data
 
     @run_plugins
     def episode_update_file_path(self, episode_id: int, file_path: Path) -> dict:
@@ -611,7 +1172,7 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
         Returns: dict representing updated episode
         '''
-        episode = self.db_session.get(PodcastEpisode, episode_id)
+        episode = self.db_session.get(PodcastEpisode, episode_id, options=[undefer(PodcastEpisode.description)])
         if not episode:
             self._fail(f'Podcast Episode not found for ID: {episode_id}')
         podcast = self.db_session.get(Podcast, episode.podcast_id)
@@ -625,8 +1186,9 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         existing_path.rename(file_path)
         episode.file_path = str(file_path.resolve())
         self.logger.info(f'Update episode: {episode.id} file path to: {str(file_path)}')
+        episode_data = episode.as_dict(self.datetime_output_format)
         self.db_session.commit()
-        return episode.as_dict(self.datetime_output_format)
+        return episode_data
 
     @run_plugins
     def episode_delete(self, episode_input: list[int], delete_files: bool = True) -> list[int]:
@@ -641,82 +1203,166 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         return self.__episode_delete_input(query, delete_files=delete_files)
 
     @run_plugins
-    def __episode_delete_input(self, query_input: list[int], delete_files: bool = True) -> list[int]:
-        # delete episode files to make it one call and a bit more simple
+    def __episode_delete_input(self, query_input: list[int], delete_files: bool = True,
+                               commit: bool = True) -> list[int]:
+        # Left uncommitted when part of a podcast delete, which commits once
+        episodes = list(query_input)
+        episodes_deleted = [episode.id for episode in episodes]
+        podcast_ids = list({episode.podcast_id for episode in episodes})
         if delete_files:
-            self.__episode_delete_file_input(query_input)
-        # now delete episode records
-        episodes_deleted = []
-        for episode in query_input:
-            self.logger.info(f'Deleting podcast episode: {episode.id} from database')
-            self.db_session.delete(episode)
+            self.__episode_delete_file_input(episodes, commit=False)
+        self._episode_rows_delete(episodes_deleted, podcast_ids)
+        if commit:
             self.db_session.commit()
-            episodes_deleted.append(episode.id)
         return episodes_deleted
 
+    def _episode_rows_delete(self, episode_ids: list[int], podcast_ids: list[int]):
+        # Deleted a chunk of ids per statement, and left for the caller to commit
+        # so a large delete is still one transaction
+        self._feed_validator_clear(podcast_ids)
+        for start in range(0, len(episode_ids), EPISODE_QUERY_CHUNK_SIZE):
+            chunk = episode_ids[start:start + EPISODE_QUERY_CHUNK_SIZE]
+            # Matched to loaded rows by the ids deleted, rather than testing every row
+            # in the session against each chunk
+            self.db_session.query(PodcastEpisode).filter(PodcastEpisode.id.in_(chunk)).\
+                delete(synchronize_session='fetch')
+            self.logger.info(f'Deleted {start + len(chunk)}/{len(episode_ids)} podcast episodes from database')
+
+    def _episode_files_remove(self, episodes: list[PodcastEpisode]) -> list[int]:
+        # Unlinked on a thread pool, the records are updated from this thread and
+        # left for the caller to commit. Episodes whose file is already gone are left alone
+        episodes = [episode for episode in episodes if episode.file_path is not None]
+        paths = [Path(episode.file_path) for episode in episodes]
+        episodes_removed = []
+        results = utils.unlink_files(paths, FILE_DELETE_CONCURRENCY)
+        for count, (episode, removed) in enumerate(zip(episodes, results), start=1):
+            if removed:
+                episode.file_path = None
+                episode.file_size = None
+                # Make sure prevent delete is turned off
+                episode.prevent_deletion = False
+                self.logger.debug(f'Removed file for episode {episode.id}')
+                episodes_removed.append(episode.id)
+            if count % EPISODE_QUERY_CHUNK_SIZE == 0 or count == len(episodes):
+                self.logger.info(f'Removed {count}/{len(episodes)} episode files')
+        return episodes_removed
+
     @run_plugins
-    def episode_download(self, episode_input: list[int]) -> list[dict]:
+    def episode_download(self, episode_input: list[int], download_concurrency: int | None = None) -> list[dict]:
         '''
         Download episode(s) to local machine
-        episode_input    :  List of integer ids
+        episode_input           :  List of integer ids
+        download_concurrency    :  Episodes downloaded at once, defaults to the client setting
 
         Returns: List of dictionaries of episodes downloaded
         '''
         query = self.db_session.query(PodcastEpisode, Podcast).\
+            options(undefer(PodcastEpisode.description)).\
             filter(PodcastEpisode.podcast_id == Podcast.id).\
             filter(PodcastEpisode.id.in_(episode_input))
-        return self.__episode_download_input(query)
+        return self.__episode_download_input(query, download_concurrency=download_concurrency)
 
     @run_plugins
-    def __episode_download_input(self, episode_input) -> list[dict]:
+    def __episode_download_input(self, episode_input, download_concurrency: int | None = None) -> list[dict]:
         def build_episode_path(episode, podcast):
             return Path(podcast.file_location) / f'{datetime.strftime(episode.date, self.datetime_output_format)}.{utils.normalize_name(episode.title)}'
 
-        episodes_downloaded = []
+        if download_concurrency is None:
+            download_concurrency = self.download_concurrency
+        if download_concurrency < 1:
+            self._fail(f'Download concurrency must be positive integer, {download_concurrency} given')
 
+        # Everything a download needs is read off the rows here, so the workers
+        # never touch the session
+        jobs = []
         for query_data in episode_input:
             episode = query_data[0]
             podcast = query_data[1]
-
-            manager = self._archive_manager(podcast.archive_type)
-
-            self.logger.debug(f'Downloading episode: {episode.id} data from url: {episode.download_url}')
-
-            episode_path_prefix = build_episode_path(episode, podcast)
-
-            try:
-                output_path, download_size = manager.episode_download(episode.download_url,
-                                                                      episode_path_prefix)
-            except EpisodeNotReady as error:
-                self.logger.debug(f'Skipping episode: {episode.id}, not ready for download: {str(error)}')
-                continue
-            if output_path is None or (download_size is None or download_size == 0):
-                self.logger.error(f'Unable to download episode: {episode.id}')
-                continue
-            self.logger.info(f'Downloaded episode {episode.id} data to file {str(output_path)}')
-
-            episode.file_path = str(output_path.resolve())
-            episode.file_size = download_size
-            self.db_session.commit()
-
-            # Update metadata tags
             # use artist name if possible
             artist_name = podcast.artist_name or podcast.name
-            audio_tags = {
-                'artist' : artist_name,
-                'albumartist' : artist_name,
-                'album' : podcast.name,
-                'title' : episode.title,
-                'date' : episode.date.strftime(self.datetime_output_format),
-            }
+            jobs.append({
+                # Read now, as every commit below expires the rows, and reading one after
+                # would cost a select for it and another for its description
+                'episode_data' : episode.as_dict(self.datetime_output_format),
+                'episode_id' : episode.id,
+                'archive_type' : podcast.archive_type,
+                'manager' : self._archive_manager(podcast.archive_type),
+                'download_url' : episode.download_url,
+                'host' : urlparse(episode.download_url).netloc,
+                'episode_path_prefix' : build_episode_path(episode, podcast),
+                'audio_tags' : {
+                    'artist' : artist_name,
+                    'albumartist' : artist_name,
+                    'album' : podcast.name,
+                    'title' : episode.title,
+                    'date' : episode.date.strftime(self.datetime_output_format),
+                },
+            })
+
+        # Looked up in bulk from this thread, before any worker starts downloading
+        urls_by_type = {}
+        for job in jobs:
+            urls_by_type.setdefault(job['archive_type'], []).append(job['download_url'])
+        for archive_type, download_urls in urls_by_type.items():
+            self._archive_manager(archive_type).episode_download_prepare(download_urls)
+
+        # Capped per archive type, so youtube keeps to its pacing however wide the pool,
+        # and per host, so a library of feeds on one cdn does not open a connection
+        # for every worker against it. A download held back by either cap does not
+        # take a worker, so rss hosts carry on alongside a youtube backlog
+        type_limits = self._archive_limits({job['archive_type'] for job in jobs},
+                                           'download_concurrency_limit', download_concurrency)
+        host_limit = min(DOWNLOAD_HOST_CONCURRENCY, download_concurrency)
+
+        def limits(job):
+            return [(('type', job['archive_type']), type_limits[job['archive_type']]),
+                    (('host', job['host']), host_limit)]
+
+        def download(job):
             try:
-                tags_update(output_path, audio_tags)
-                self.logger.debug(f'Updated database audio tags for episode {episode.id}')
-            except AudioFileException as error:
-                self.logger.warning(f'Unable to update tags on file {str(output_path)} : {str(error)}')
-            episodes_downloaded.append(episode.as_dict(self.datetime_output_format))
+                return self.__episode_download_fetch(job)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # One bad host or file only fails its own episode, the rest of the
+                # run still gets recorded
+                self.logger.error(f'Unable to download episode: {job["episode_id"]}: {str(error)}')
+                return None, None
+
+        episodes_downloaded = []
+        results = utils.run_concurrently(download, jobs, download_concurrency, limits=limits)
+        for job, (output_path, download_size) in zip(jobs, results):
+            if output_path is None:
+                continue
+            # Results are written from this thread only, one commit per file so a
+            # run that dies part way keeps what it already has on disk
+            file_path = str(output_path.resolve())
+            # Updated by id, as setting it on the expired row would select it first
+            self.db_session.query(PodcastEpisode).filter(PodcastEpisode.id == job['episode_id']).\
+                update({'file_path': file_path, 'file_size': download_size}, synchronize_session=False)
+            self.db_session.commit()
+            episodes_downloaded.append({**job['episode_data'], 'file_path': file_path, 'file_size': download_size})
         return episodes_downloaded
 
+    def __episode_download_fetch(self, job: dict) -> tuple[Path | None, int | None]:
+        self.logger.debug(f'Downloading episode: {job["episode_id"]} data from url: {job["download_url"]}')
+        try:
+            output_path, download_size = job['manager'].episode_download(job['download_url'],
+                                                                         job['episode_path_prefix'])
+        except EpisodeNotReady as error:
+            self.logger.debug(f'Skipping episode: {job["episode_id"]}, not ready for download: {str(error)}')
+            return None, None
+        if output_path is None or (download_size is None or download_size == 0):
+            self.logger.error(f'Unable to download episode: {job["episode_id"]}')
+            return None, None
+        self.logger.info(f'Downloaded episode {job["episode_id"]} data to file {str(output_path)}')
+
+        # Update metadata tags
+        try:
+            tags_update(output_path, job['audio_tags'])
+            self.logger.debug(f'Updated database audio tags for episode {job["episode_id"]}')
+        except AudioFileException as error:
+            self.logger.warning(f'Unable to update tags on file {str(output_path)} : {str(error)}')
+        return output_path, download_size
+
     @run_plugins
     def episode_delete_file(self, episode_input: list[int]) -> list[int]:
         '''
@@ -727,22 +1373,11 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         return self.__episode_delete_file_input(query)
 
     @run_plugins
-    def __episode_delete_file_input(self, query_input) -> list[int]:
-        episodes_deleted = []
-        for episode in query_input:
-            if episode.file_path is not None:
-                file_path = Path(episode.file_path)
-                try:
-                    file_path.unlink()
-                except FileNotFoundError:
-                    continue
-                episode.file_path = None
-                episode.file_size = None
-                # Make sure prevent delete is turned off
-                episode.prevent_deletion = False
-                self.db_session.commit()
-                self.logger.info(f'Removed file and updated record for episode {episode.id}')
-                episodes_deleted.append(episode.id)
+    def __episode_delete_file_input(self, query_input, commit: bool = True) -> list[int]:
+        # Left uncommitted when part of an episode delete, which commits once
+        episodes_deleted = self._episode_files_remove(list(query_input))
+        if commit:
+            self.db_session.commit()
         return episodes_deleted
 
     @run_plugins
@@ -752,6 +1387,7 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
         Also runs the "VACUUM" command to recreate the database in order to shrink its file size
         '''
         self.db_session.query(PodcastEpisode).filter_by(file_path=None).delete()
+        self._feed_validator_clear()
         self.db_session.commit()
         if 'sqlite' in self.database_connection_string:
             self.db_session.execute(text('VACUUM'))
@@ -760,78 +1396,81 @@ class HathorClient():  # pylint: disable=too-many-instance-attributes
 
     @run_plugins
     def podcast_sync(self, include_podcasts: list[int] | None = None, exclude_podcasts: list[int] | None = None,
-                     sync_web_episodes: bool = True, download_episodes: bool = True):
+                     sync_web_episodes: bool = True, download_episodes: bool = True,
+                     download_concurrency: int | None = None, force: bool = False):
         '''
         Updates the media files for podcasts. First sync with interwebs to check for newer episodes, then check to see if any need to be downloaded.
-        include_podcasts     :   Only include these podcasts. Single ID or lists of IDs
-        exclude_podcasts     :   Do not include these podcasts. Single ID or list of IDs
-        sync_web_episodes    :   Sync latest known podcast episodes with web
-        download_episodes    :   Download new podcast episodes
+        include_podcasts        :   Only include these podcasts. Single ID or lists of IDs
+        exclude_podcasts        :   Do not include these podcasts. Single ID or list of IDs
+        sync_web_episodes       :   Sync latest known podcast episodes with web
+        download_episodes       :   Download new podcast episodes
+        download_concurrency    :   Episodes downloaded at once, defaults to the client setting
+        force                   :   Sync every podcast, including those not expected to have
+                                    published since they were last synced
 
         Returns: null
         '''
         if sync_web_episodes:
             self.__episode_sync_cluders(include_podcasts, exclude_podcasts,
-                                        automatic_sync=False)
+                                        automatic_sync=False, adaptive=not force)
         if download_episodes:
-            self._podcast_download_episodes(include_podcasts, exclude_podcasts)
+            self._podcast_download_episodes(include_podcasts, exclude_podcasts,
+                                            download_concurrency=download_concurrency)
         return True
 
-    @run_plugins
-    def _podcast_download_episodes(self, include_podcasts: list[int] | None, exclude_podcasts: list[int] | None):
-        delete_episodes = []
-        download_episodes = []
+    def __episode_rank_subquery(self, *filters):
+        # Each episode's place in its podcast, newest first
+        rank = sql_func.row_number().over(partition_by=PodcastEpisode.podcast_id,
+                                          order_by=desc(PodcastEpisode.date)).label('rank')
+        return self.db_session.query(PodcastEpisode.id, rank).filter(*filters).subquery()
 
-        # Built podcast query to iterate through
-        podcast_query = self.db_session.query(Podcast).\
-            filter(Podcast.automatic_episode_download == True)
+    @run_plugins
+    def _podcast_download_episodes(self, include_podcasts: list[int] | None, exclude_podcasts: list[int] | None,
+                                   download_concurrency: int | None = None):
+        # Podcasts to sync files for
+        podcast_filters = [Podcast.automatic_episode_download == True]
+        # Ranks are per podcast, so only the episodes of podcasts in the sync need ranking
+        rank_filters = []
         if include_podcasts:
-            opts = (Podcast.id == pod for pod in include_podcasts)
-            podcast_query = podcast_query.filter(or_(opts))
+            podcast_filters.append(or_(Podcast.id == pod for pod in include_podcasts))
+            rank_filters.append(PodcastEpisode.podcast_id.in_(include_podcasts))
         if exclude_podcasts:
-            opts = (Podcast.id != pod for pod in exclude_podcasts)
-            podcast_query = podcast_query.filter(and_(opts))
-
-        # Find all episodes to attempt to download
-        for podcast in podcast_query:
-            episode_query = self.db_session.query(PodcastEpisode).\
-                    order_by(desc(PodcastEpisode.date)).\
-                    filter(PodcastEpisode.podcast_id == podcast.id)
-
-            # Make sure you call limit, then do check for file path
-            # If you add the check for file path is None first
-
-            # Get max allowed first, limit to the amount you would need to download
-            # then only download ones that arent downloaded
-
-            if podcast.max_allowed:
-                episode_query = episode_query.limit(podcast.max_allowed)
-            for episode in episode_query:
-                if episode.file_path is None:
-                    download_episodes.append((episode, podcast))
+            podcast_filters.append(and_(Podcast.id != pod for pod in exclude_podcasts))
+            rank_filters.append(PodcastEpisode.podcast_id.notin_(exclude_podcasts))
+
+        # Find all episodes to attempt to download, the newest max allowed of each
+        # podcast that have no file yet. One query across every podcast, ranking each
+        # podcast's episodes newest first
+        ranked = self.__episode_rank_subquery(*rank_filters)
+        download_episodes = self.db_session.query(PodcastEpisode, Podcast).\
+            options(undefer(PodcastEpisode.description)).\
+            join(ranked, ranked.c.id == PodcastEpisode.id).\
+            join(Podcast, Podcast.id == PodcastEpisode.podcast_id).\
+            filter(*podcast_filters).\
+            filter(or_(Podcast.max_allowed == None, ranked.c.rank <= Podcast.max_allowed)).\
+            filter(PodcastEpisode.file_path == None).\
+            order_by(Podcast.id, desc(PodcastEpisode.date)).all()
 
         # Download episodes from query
         if download_episodes:
             self.logger.debug(f'Episodes {[i[0].id for i in download_episodes]} set for download from file sync')
-            self.__episode_download_input(download_episodes)
+            self.__episode_download_input(download_episodes, download_concurrency=download_concurrency)
 
         # Find episodes to delete if there is max allowed on the podcast
-        # Not all episodes may have been downloaded, so this should use
-        # another episode query, since that will check if "file_path" is defined
+        # Not all episodes may have been downloaded, so this should rank only
+        # episodes with a "file_path" defined, after the downloads above
         # that way you dont delete episodes pre-maturely
-        for podcast in podcast_query.filter(Podcast.max_allowed != None):
-            episode_query = self.db_session.query(PodcastEpisode).order_by(desc(PodcastEpisode.date)).\
-                    filter(PodcastEpisode.podcast_id == podcast.id).\
-                    filter(PodcastEpisode.file_path != None).\
-                    offset(podcast.max_allowed)
-                    # Make sure offset is called first, since you want to first limit
-                    # then check if prevent deletion is false
-                    # This way files that should be kept, but also have
-                    # prevent delete will not count against files
-                    # that should be deleted
-            for episode in episode_query:
-                if episode.prevent_deletion is False:
-                    delete_episodes.append(episode)
+        # Files that should be kept, but also have prevent delete, still count
+        # towards the max allowed
+        ranked = self.__episode_rank_subquery(PodcastEpisode.file_path != None, *rank_filters)
+        delete_episodes = self.db_session.query(PodcastEpisode).\
+            join(ranked, ranked.c.id == PodcastEpisode.id).\
+            join(Podcast, Podcast.id == PodcastEpisode.podcast_id).\
+            filter(*podcast_filters).\
+            filter(Podcast.max_allowed != None).\
+            filter(ranked.c.rank > Podcast.max_allowed).\
+            filter(PodcastEpisode.prevent_deletion == False).\
+            order_by(Podcast.id, desc(PodcastEpisode.date)).all()
         if delete_episodes:
             self.logger.debug(f'Episodes {[i.id for i in delete_episodes]} set for deletion for max allowed from file sync')
             self.__episode_delete_file_input(delete_episodes)
@@ -0,0 +1,124 @@
+'''
+Long running podcast sync
+
+Keeps one client, and with it the database engine, http connections, archive managers
+and their caches, alive across every sync, instead of paying for all of them on each
+run of "hathor podcast sync"
+'''
+from random import SystemRandom
+from threading import Event
+from time import monotonic
+
+from hathor.client import HathorClient
+from hathor.database.tables import Podcast
+from hathor.exc import HathorException
+
+# Seconds between syncs of a podcast, unless it is given its own interval
+DAEMON_SYNC_INTERVAL = 3600
+# Up to this many seconds are added at random to each podcast's next sync, so a
+# library added at once does not stay in lockstep, hitting every feed together
+DAEMON_SYNC_JITTER = 300
+# Longest the daemon sleeps before checking for podcasts that were added or removed
+DAEMON_POLL_INTERVAL = 60
+
+class SyncScheduler():  # pylint: disable=too-many-instance-attributes
+    '''
+    Sync each podcast on its own interval, for as long as the scheduler runs
+    '''
+    def __init__(self, client: HathorClient,
+                 sync_interval: int = DAEMON_SYNC_INTERVAL,
+                 sync_jitter: int = DAEMON_SYNC_JITTER,
+                 podcast_sync_intervals: dict | None = None,
+                 download_episodes: bool = True,
+                 download_concurrency: int | None = None):
+        '''
+        Initialize the scheduler
+        client                  :   Hathor client to sync with
+        sync_interval           :   Seconds between syncs of each podcast
+        sync_jitter             :   Most seconds added at random to each podcast's next sync
+        podcast_sync_intervals  :   Seconds between syncs keyed by podcast id, overriding sync_interval
+        download_episodes       :   Download new podcast episodes after each sync
+        download_concurrency    :   Episodes downloaded at once, defaults to the client setting
+        '''
+        self.client = client
+        self.logger = client.logger
+        if sync_interval < 1:
+            self._fail(f'Sync interval must be positive integer, {sync_interval} given')
+        self.sync_interval = sync_interval
+        if sync_jitter < 0:
+            self._fail(f'Sync jitter must be non-negative integer, {sync_jitter} given')
+        self.sync_jitter = sync_jitter
+        self.podcast_sync_intervals = {}
+        for podcast_id, interval in (podcast_sync_intervals or {}).items():
+            if interval < 1:
+                self._fail(f'Sync interval for podcast {podcast_id} must be positive integer, {interval} given')
+            self.podcast_sync_intervals[int(podcast_id)] = interval
+        self.download_episodes = download_episodes
+        self.download_concurrency = download_concurrency
+
+        # Monotonic time each podcast is next due to sync
+        self.next_sync = {}
+        self._random = SystemRandom()
+        self._stop = Event()
+
+    def _fail(self, message):
+        self.logger.error(message)
+        raise HathorException(message)
+
+    def _jitter(self) -> float:
+        return self._random.uniform(0, self.sync_jitter)
+
+    def run_pending(self) -> float:
+        '''
+        Sync every podcast that is due, all in one podcast sync so they share its concurrency
+
+        Returns: seconds until the next podcast is due, at most DAEMON_POLL_INTERVAL
+        '''
+        # The one session lives as long as the daemon, so rows loaded by an earlier sync
+        # are let go, and podcasts edited from the cli in the meantime read afresh
+        self.client.db_session.rollback()
+        now = monotonic()
+        # Only the ids are needed, so the plugins on podcast_list are not run on every wake
+        podcast_ids = {podcast_id for (podcast_id,) in self.client.db_session.query(Podcast.id)}
+        # New podcasts are picked up with their first sync spread over the jitter, and
+        # deleted ones dropped
+        for podcast_id in podcast_ids - set(self.next_sync):
+            self.next_sync[podcast_id] = now + self._jitter()
+        for podcast_id in set(self.next_sync) - podcast_ids:
+            del self.next_sync[podcast_id]
+
+        due = sorted(podcast_id for podcast_id, next_sync in self.next_sync.items() if next_sync <= now)
+        if due:
+            self.logger.info(f'Syncing podcasts {due}')
+            try:
+                self.client.podcast_sync(include_podcasts=due,
+                                         download_episodes=self.download_episodes,
+                                         download_concurrency=self.download_concurrency)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # One bad run, a feed down or a disk full, must not end the daemon. The
+                # podcasts are tried again on their next interval
+                self.logger.error(f'Sync of podcasts {due} failed: {str(error)}')
+                self.client.db_session.rollback()
+            finished = monotonic()
+            for podcast_id in due:
+                interval = self.podcast_sync_intervals.get(podcast_id, self.sync_interval)
+                self.next_sync[podcast_id] = finished + interval + self._jitter()
+
+        if not self.next_sync:
+            return DAEMON_POLL_INTERVAL
+        return max(0, min(DAEMON_POLL_INTERVAL, min(self.next_sync.values()) - monotonic()))
+
+    def run(self):
+        '''
+        Sync podcasts as they come due until stopped
+        '''
+        self.logger.info(f'Starting sync daemon, syncing every {self.sync_interval} seconds')
+        while not self._stop.is_set():
+            self._stop.wait(self.run_pending())
+        self.logger.info('Stopped sync daemon')
+
+    def stop(self):
+        '''
+        Stop the scheduler once any sync in progress finishes
+        '''
+        self._stop.set()
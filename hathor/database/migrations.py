@@ -0,0 +1,86 @@
+'''
+Versioned upgrades for databases created by older releases
+
+create_all only ever adds tables that are missing. Anything that changes a table
+that already exists -- an index, a column -- ships as a step here
+'''
+from datetime import datetime
+from logging import RootLogger
+
+from sqlalchemy import func, inspect, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from hathor.database.tables import BASE, PodcastEpisode, SchemaVersion, YoutubeShortsCheck
+
+def _podcast_episode_indexes(connection: Connection):
+    for index in PodcastEpisode.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def _youtube_shorts_check_podcast(connection: Connection):
+    # Only a cache of answers, and without the podcast each came from the old rows
+    # could never be loaded again, so the table is rebuilt empty rather than copied
+    YoutubeShortsCheck.__table__.drop(connection, checkfirst=True)
+    YoutubeShortsCheck.__table__.create(connection)
+
+# Applied in order, each in its own transaction along with its schema_version row.
+# Steps must be safe to run twice: sqlite commits most ddl as it goes, so a step
+# that fails part way can leave some of its changes behind
+MIGRATIONS = [
+    (1, 'Index podcast episodes by podcast, date, file path and processed url', _podcast_episode_indexes),
+    (2, 'Key youtube shorts checks by podcast', _youtube_shorts_check_podcast),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(engine: Engine) -> int:
+    '''
+    Latest migration applied to the database, 0 if none
+    engine : Sqlalchemy engine
+    '''
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+def pending_migrations(engine: Engine) -> list[tuple]:
+    '''
+    Migrations not yet applied to the database, in the order they apply
+    engine : Sqlalchemy engine
+    '''
+    current = schema_version(engine)
+    return [migration for migration in MIGRATIONS if migration[0] > current]
+
+def schema_create(engine: Engine) -> bool:
+    '''
+    Create any missing tables. A brand new database is created at the latest
+    schema, and is stamped with every migration so none of them run on it
+    engine : Sqlalchemy engine
+
+    Returns True if the database was new
+    '''
+    new_database = not inspect(engine).get_table_names()
+    BASE.metadata.create_all(engine)
+    if new_database:
+        now = datetime.now()
+        with engine.begin() as connection:
+            connection.execute(insert(SchemaVersion), [
+                {'version': version, 'description': description, 'applied_at': now} \
+                for version, description, _ in MIGRATIONS
+            ])
+    return new_database
+
+def migrate(engine: Engine, logger: RootLogger) -> list[dict]:
+    '''
+    Apply every pending migration, in order
+    engine : Sqlalchemy engine
+    logger : Logger to report each migration on
+
+    Returns the migrations applied
+    '''
+    applied = []
+    for version, description, step in pending_migrations(engine):
+        logger.info(f'Applying database migration {version}: {description}')
+        with engine.begin() as connection:
+            step(connection)
+            connection.execute(insert(SchemaVersion).values(version=version, description=description,
+                                                            applied_at=datetime.now()))
+        applied.append({'version': version, 'description': description})
+    return applied
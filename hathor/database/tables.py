@@ -1,16 +1,18 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.orm import declarative_base, deferred
 
 BASE = declarative_base()
 
-def as_dict(row, datetime_output_format) -> dict:
+def as_dict(row, datetime_output_format, exclude: list[str] | None = None) -> dict:
     '''
     Print row as JSON dict
     '''
     data = {}
     for column in row.__table__.columns:
+        if exclude and column.name in exclude:
+            continue
         value = getattr(row, column.name)
         if isinstance(value, datetime):
             value = value.strftime(datetime_output_format)
@@ -50,10 +52,12 @@ class PodcastEpisode(BASE):
     # unique keys
     id = Column(Integer, primary_key=True)
     download_url = Column(String(10*1024), unique=True)
-    processed_url = Column(String(10*1024))
+    # Patreon episodes are matched on it across every podcast
+    processed_url = Column(String(10*1024), index=True)
     # keys set at creation, and inmutable
     title = Column(String(10*1024))
-    description = Column(String(10*1024))
+    # Up to 10KB a row and read by next to nothing, so only loaded when asked for
+    description = deferred(Column(String(10*1024)))
     date = Column(DateTime)
     podcast_id = Column(Integer, ForeignKey('podcast.id'))
     # optional, can be changed via client
@@ -62,11 +66,17 @@ class PodcastEpisode(BASE):
     prevent_deletion = Column(Boolean)
 
 
-    def as_dict(self, datetime_output_format):
+    def as_dict(self, datetime_output_format, exclude: list[str] | None = None):
         '''
         Print row as JSON dict
         '''
-        return as_dict(self, datetime_output_format)
+        return as_dict(self, datetime_output_format, exclude=exclude)
+
+# A podcast's newest episodes, read in order without a sort, for the download
+# and retention passes of a podcast sync
+Index('ix_podcast_episode_podcast_id_date', PodcastEpisode.podcast_id, PodcastEpisode.date.desc())
+# A podcast's downloaded, or not yet downloaded, episodes
+Index('ix_podcast_episode_podcast_id_file_path', PodcastEpisode.podcast_id, PodcastEpisode.file_path)
 
 
 class PodcastTitleFilter(BASE):
@@ -86,3 +96,111 @@ class PodcastTitleFilter(BASE):
         Print row as JSON dict
         '''
         return as_dict(self, datetime_output_format)
+
+
+class PodcastFeedValidator(BASE):
+    '''
+    PodcastFeedValidator table
+    Validators from the last fetch of a podcast feed, sent back on the next
+    sync so an unchanged feed is not downloaded or walked again
+    '''
+    __tablename__ = 'podcast_feed_validator'
+
+    id = Column(Integer, primary_key=True)
+    podcast_id = Column(Integer, ForeignKey('podcast.id'), unique=True, nullable=False)
+    etag = Column(String(1024))
+    last_modified = Column(String(256))
+    content_hash = Column(String(64))
+
+    def as_dict(self, datetime_output_format):
+        '''
+        Print row as JSON dict
+        '''
+        return as_dict(self, datetime_output_format)
+
+
+class PodcastSyncCheck(BASE):
+    '''
+    PodcastSyncCheck table
+    When a podcast was last synced, and how often it has been publishing, so a
+    podcast sync can leave out podcasts not expected to have anything new
+    '''
+    __tablename__ = 'podcast_sync_check'
+
+    id = Column(Integer, primary_key=True)
+    podcast_id = Column(Integer, ForeignKey('podcast.id'), unique=True, nullable=False)
+    last_checked = Column(DateTime, nullable=False)
+    # Date of the newest episode, and the median seconds between its recent episodes.
+    # Both left empty until the podcast has two dated episodes
+    last_published = Column(DateTime)
+    publish_interval = Column(Integer)
+
+    def as_dict(self, datetime_output_format):
+        '''
+        Print row as JSON dict
+        '''
+        return as_dict(self, datetime_output_format)
+
+
+class YoutubeShortsCheck(BASE):
+    '''
+    YoutubeShortsCheck table
+    Answers of the youtube shorts check by podcast and video id, so a video is
+    only ever checked once, and a sync loads just the answers of the podcasts it lists
+    '''
+    __tablename__ = 'youtube_shorts_check'
+    __table_args__ = (UniqueConstraint('podcast_id', 'video_id',
+                                       name='_youtube_shorts_check_identifier'),)
+
+    id = Column(Integer, primary_key=True)
+    podcast_id = Column(Integer, ForeignKey('podcast.id'), nullable=False)
+    video_id = Column(String(32), nullable=False)
+    is_short = Column(Boolean, nullable=False)
+
+    def as_dict(self, datetime_output_format):
+        '''
+        Print row as JSON dict
+        '''
+        return as_dict(self, datetime_output_format)
+
+
+class BroadcastResolution(BASE):
+    '''
+    BroadcastResolution table
+    Ids an archive looks up for a broadcast before it can list it, such as the
+    uploads playlist of a youtube channel or the user id of a twitch channel
+    '''
+    __tablename__ = 'broadcast_resolution'
+    __table_args__ = (UniqueConstraint('archive_type', 'broadcast_id',
+                                       name='_broadcast_resolution_identifier'),)
+
+    id = Column(Integer, primary_key=True)
+    # Lengths given so the unique constraint over them can be built on mysql too
+    archive_type = Column(String(32), nullable=False)
+    broadcast_id = Column(String(256), nullable=False)
+    resolved_id = Column(String(256), nullable=False)
+    resolved_at = Column(DateTime, nullable=False)
+
+    def as_dict(self, datetime_output_format):
+        '''
+        Print row as JSON dict
+        '''
+        return as_dict(self, datetime_output_format)
+
+
+class SchemaVersion(BASE):
+    '''
+    SchemaVersion table
+    One row per schema migration applied to the database
+    '''
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String(256))
+    applied_at = Column(DateTime, nullable=False)
+
+    def as_dict(self, datetime_output_format):
+        '''
+        Print row as JSON dict
+        '''
+        return as_dict(self, datetime_output_format)
@@ -0,0 +1,101 @@
+'''
+Background plugin hooks
+
+Plugins named "background_<function>" run after the client function on a small pool of
+worker threads, so a slow one, say a notification to a remote system, never holds up the
+sync or download that triggered it
+'''
+import sys
+from queue import Queue
+from threading import Condition, Thread
+
+from hathor.exc import HathorException
+
+# Background hooks run at once
+PLUGIN_WORKERS = 2
+# Seconds a background hook may run before it is logged and abandoned
+PLUGIN_TIMEOUT = 60
+
+class HookPool():
+    '''
+    Run plugin hooks off the calling thread, each isolated from the caller and from the others
+    '''
+    def __init__(self, logger, workers: int = PLUGIN_WORKERS, timeout: float = PLUGIN_TIMEOUT):
+        '''
+        Initialize the pool
+        logger      :   Logger hook failures and timeouts are reported to
+        workers     :   Hooks run at once
+        timeout     :   Seconds a hook may run before it is abandoned
+        '''
+        self.logger = logger
+        if workers < 1:
+            self._fail(f'Plugin workers must be positive integer, {workers} given')
+        self.workers = workers
+        if timeout <= 0:
+            self._fail(f'Plugin timeout must be positive number, {timeout} given')
+        self.timeout = timeout
+
+        self._queue = Queue()
+        self._threads = []
+        # Hooks queued or running, waited on when the client closes
+        self._pending = 0
+        self._idle = Condition()
+
+    def _fail(self, message):
+        self.logger.error(message)
+        raise HathorException(message)
+
+    def submit(self, hook, *args, **kwargs):
+        '''
+        Queue hook to be called with args and kwargs, returning straight away
+        '''
+        with self._idle:
+            self._pending += 1
+            # Workers start with the first hook, so a client without background plugins never starts any
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._work, name=f'hathor-hooks-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._queue.put((hook, args, kwargs))
+
+    def wait(self, timeout: float | None = None) -> bool:
+        '''
+        Wait for every queued hook to finish or be abandoned
+        timeout     :   Most seconds to wait, None waits for all of them
+
+        Returns: True if no hooks are left pending
+        '''
+        with self._idle:
+            # Worker threads stop running once the interpreter starts shutting down, so
+            # the hooks left would never finish
+            if sys.is_finalizing():
+                return self._pending == 0
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _work(self):
+        while True:
+            hook, args, kwargs = self._queue.get()
+            try:
+                self._run(hook, args, kwargs)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    def _run(self, hook, args, kwargs):
+        name = f'{hook.__module__}.{hook.__name__}'
+
+        def call():
+            try:
+                hook(*args, **kwargs)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # A failing plugin must not take the worker, or the client, down with it
+                self.logger.error(f'Plugin {name} failed: {str(error)}')
+
+        # A thread can not be killed, so a hook that runs over is left on its own daemon
+        # thread and the worker moves on to the next one
+        thread = Thread(target=call, name=f'hathor-hook-{hook.__name__}', daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            self.logger.error(f'Plugin {name} still running after {self.timeout} seconds, abandoning it')
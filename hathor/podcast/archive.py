@@ -1,22 +1,35 @@
+# pylint: disable=too-many-lines
+import os
 import re
 from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
+from importlib import import_module
 from logging import RootLogger
 from mimetypes import guess_extension, guess_type
 from pathlib import Path
-from time import mktime
+from threading import Lock
+from time import mktime, monotonic
 
-from feedparser import parse
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from validators import url
-
-from requests import get, head, post
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from hathor.exc import EpisodeNotReady, FunctionUndefined, HathorException
 from hathor import utils
 
+# yt-dlp, the google api client, feedparser and validators take longer to import than
+# the rest of hathor put together, so each is imported the first time an archive
+# uses it. Commands that never list or download anything do not pay for them, and
+# nor does a library of rss feeds pay for youtube's
+@lru_cache(maxsize=None)
+def _lazy_module(name: str):
+    '''
+    Import a module the first time it is asked for
+    name : Dotted module name
+    '''
+    return import_module(name)
+
 _YOUTUBE_VIDEO_ID_RE = re.compile(
     r'(?:youtube\.com/(?:watch\?(?:[^ ]*&)?v=|live/|embed/|shorts/)|youtu\.be/)'
     r'(?P<id>[A-Za-z0-9_-]{11})'
@@ -27,6 +40,9 @@ _TWITCH_VIDEO_ID_RE = re.compile(r'twitch\.tv/videos/(?P<id>\d+)')
 TWITCH_OAUTH_URL = 'https://id.twitch.tv/oauth2/token'
 TWITCH_API_URL = 'https://api.twitch.tv/helix'
 TWITCH_REQUEST_TIMEOUT = 30
+# App tokens last around two months. They are fetched again this many seconds before
+# they run out, so a request never goes out with one that expires on the way
+TWITCH_TOKEN_REFRESH_MARGIN = 300
 # Helix caps a page at 100 items
 TWITCH_PAGE_SIZE = 100
 # While a broadcast is still being recorded, and for a while after it ends, twitch
@@ -74,6 +90,8 @@ YOUTUBE_MAX_PAGES = 20
 # of 403 with randomised exponential backoff, and leaves quotaExceeded alone --
 # that one does not recover inside a run.
 YOUTUBE_NUM_RETRIES = 4
+# Most ids videos.list takes in one call
+YOUTUBE_VIDEOS_BATCH_SIZE = 50
 # 403 reasons that mean the daily quota is spent
 YOUTUBE_QUOTA_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
 
@@ -84,6 +102,54 @@ YOUTUBE_QUOTA_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
 # two minute regular upload for a short.
 YOUTUBE_SHORTS_URL = 'https://www.youtube.com/shorts'
 YOUTUBE_SHORTS_REQUEST_TIMEOUT = 30
+# Most shorts checks in flight at once. Checks are only run ahead for the next
+# few videos of a page, so a walk that stops early has spent at most this many
+YOUTUBE_SHORTS_CONCURRENCY = 8
+
+# Every manager shares one session, so repeat calls to a host ride a kept-alive
+# connection instead of paying for a fresh TCP and TLS handshake each time.
+# pool_connections is how many hosts keep a pool, pool_maxsize how many open
+# connections each of those pools holds on to.
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 10
+# Connection errors and these statuses are retried with exponential backoff,
+# honouring any Retry-After the server sends. Only for idempotent methods, the
+# twitch token POST is never sent twice.
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CURL_DOWNLOAD_TIMEOUT = 120
+CURL_CHUNK_SIZE = 16 * 1024
+# Downloads land here until they are complete, and are resumed from here
+CURL_PART_SUFFIX = '.part'
+# Added to the part file name, holds the ETag or Last-Modified the part was started
+# from, so it is only resumed against the same version of the file
+CURL_VALIDATOR_SUFFIX = '.validator'
+# Segmented downloads land here instead, and are started over rather than resumed
+CURL_SEGMENTS_SUFFIX = '.segments'
+# Below this size the extra connections of a segmented download cost more than
+# they save
+CURL_SEGMENT_THRESHOLD = 50 * 1024 * 1024
+
+def build_http_session(pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                       retries: int = HTTP_RETRIES, backoff_factor: float = HTTP_BACKOFF_FACTOR) -> Session:
+    '''
+    Build a keep-alive http session with pooled connections and retries
+    pool_connections : Number of hosts to keep a connection pool for
+    pool_maxsize     : Connections kept open per host
+    retries          : Times to retry a failed idempotent request
+    backoff_factor   : Base of the exponential sleep between retries, in seconds
+    '''
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=HTTP_RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  # Hand the last response back rather than raising, callers check the status
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 def twitch_timestamp(timestamp: str) -> datetime:
     '''
@@ -106,7 +172,7 @@ def extract_youtube_video_id(youtube_url: str) -> str | None:
     m = _YOUTUBE_VIDEO_ID_RE.search(youtube_url)
     return m.group('id') if m else None
 
-def youtube_quota_exhausted(error: HttpError) -> bool:
+def youtube_quota_exhausted(error: Exception) -> bool:
     '''
     Check whether an api error means the daily quota is spent. Retrying will not
     clear it, the quota resets on googles clock.
@@ -120,18 +186,82 @@ def youtube_quota_exhausted(error: HttpError) -> bool:
             return True
     return False
 
-def curl_download(episode_url: str, output_path: Path) -> int:
+def _curl_download_segment(session: Session, episode_url: str, file_descriptor: int, start: int, end: int,
+                           req: Response | None = None) -> int:
     '''
-    Download url to file
+    Fetch one byte range of a file, writing it at its own offset
+    session         : Http session to fetch with
+    episode_url     : Episode url
+    file_descriptor : Open descriptor of the preallocated output
+    start           : First byte of the range
+    end             : Last byte of the range, inclusive
+    req             : Response already streaming the file from start, read up to end
+                      instead of making a new range request
+    '''
+    if req is None:
+        req = session.get(episode_url, allow_redirects=True, timeout=CURL_DOWNLOAD_TIMEOUT, stream=True,
+                          headers={'Range': f'bytes={start}-{end}'})
+        if req.status_code != 206:
+            req.close()
+            raise HathorException(f'Range request refused for url: {episode_url}, status {req.status_code}')
+    position = start
+    try:
+        for chunk in req.iter_content(chunk_size=CURL_CHUNK_SIZE):
+            # A whole file response runs on past the range
+            chunk = chunk[:end + 1 - position]
+            os.pwrite(file_descriptor, chunk, position)
+            position += len(chunk)
+            if position > end:
+                break
+    finally:
+        req.close()
+    if position != end + 1:
+        raise HathorException(f'Incomplete segment for url: {episode_url}, '
+                              f'got {position - start} of {end + 1 - start} bytes')
+    return position - start
+
+def _curl_download_segmented(session: Session, episode_url: str, output_path: Path, size: int, segments: int,
+                             req: Response) -> int:
+    '''
+    Download a file as concurrent byte ranges into a preallocated file
+    session     : Http session to fetch with
     episode_url : Episode url
     output_path : Path to output file
+    size        : Size of the file in bytes
+    segments    : Number of ranges to split the file into
+    req         : Response streaming the whole file, read for the first range
     '''
-    req = get(episode_url, allow_redirects=True, timeout=120, stream=True)
+    # Kept apart from the ".part" file. Preallocated, it is full size from the start,
+    # and resuming it as a plain part file would take the holes for downloaded bytes
+    segments_path = Path(f'{output_path}{CURL_SEGMENTS_SUFFIX}')
+    segment_size = -(-size // segments)
+    # The response the headers were read from already streams from byte 0, so it
+    # serves the first range without another request
+    ranges = [(start, min(start + segment_size, size) - 1, None if start else req) \
+              for start in range(0, size, segment_size)]
+    file_descriptor = os.open(str(segments_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     try:
-        content_type = req.headers['content-type']
-    except KeyError:
-        content_type = ''
-    extension = guess_extension(content_type)
+        os.ftruncate(file_descriptor, size)
+        for _ in utils.run_concurrently(lambda r: _curl_download_segment(session, episode_url, file_descriptor, *r),
+                                        ranges, len(ranges)):
+            pass
+    except Exception:
+        # In case the first range never got to read it
+        req.close()
+        os.close(file_descriptor)
+        segments_path.unlink()
+        raise
+    os.close(file_descriptor)
+    segments_path.replace(output_path)
+    return size
+
+def _curl_extension(headers, episode_url: str) -> str:
+    '''
+    File extension for a download, from its content type or else its url
+    headers     : Response headers
+    episode_url : Episode url
+    '''
+    extension = guess_extension(headers.get('content-type', ''))
     if not extension:
         try:
             extension = guess_extension(guess_type(episode_url)[0])
@@ -139,22 +269,143 @@ def curl_download(episode_url: str, output_path: Path) -> int:
             extension = None
     if extension is None:
         raise HathorException(f'Unable to determine extension type for url: {episode_url}')
-    output_path = Path(f'{output_path}{extension}')
-    track_download_size = False
+    return extension
 
+def _curl_expected_size(headers) -> int | None:
+    '''
+    Bytes a download should come to, when the response says
+    headers : Response headers
+    '''
+    # Content-Length counts the encoded bytes, and the chunks come back decoded, so
+    # an encoded response can be neither checked nor resumed by size
+    if headers.get('content-encoding', 'identity') != 'identity':
+        return None
     try:
-        download_size = int(req.headers.get('content-length'))
+        return int(headers.get('content-length'))
     except TypeError:
-        track_download_size = True
-        download_size = 0
-    chunk_size = 16 * 1024
-    with open(str(output_path), 'wb') as file_output:
-        for chunk in req.iter_content(chunk_size=chunk_size):
+        return None
+
+def _curl_validator(headers) -> str | None:
+    '''
+    Value identifying the version of a file served, as If-Range takes it
+    headers : Response headers
+    '''
+    # Weak etags do not promise the same bytes, so If-Range does not take them
+    etag = headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('last-modified')
+
+def curl_download(episode_url: str, output_path: Path, segments: int = 1,
+                  segment_threshold: int = CURL_SEGMENT_THRESHOLD, session: Session | None = None) -> tuple[Path, int]:
+    '''
+    Download url to file
+    episode_url         : Episode url
+    output_path         : Path to output file
+    segments            : Split files that take range requests into this many ranges, fetched at once
+    segment_threshold   : Files smaller than this many bytes are fetched as one stream regardless
+    session             : Http session to fetch with, a new one is built when not given
+
+    The download is written to a ".part" file next to the output, and only
+    renamed into place once complete. A ".part" left by an earlier attempt is
+    picked up where it stopped when the server takes range requests, and still
+    serves the same version of the file it was started from.
+    '''
+    session = session or build_http_session()
+    req = session.get(episode_url, allow_redirects=True, timeout=CURL_DOWNLOAD_TIMEOUT, stream=True)
+    output_path = Path(f'{output_path}{_curl_extension(req.headers, episode_url)}')
+    part_path = Path(f'{output_path}{CURL_PART_SUFFIX}')
+    expected_size = _curl_expected_size(req.headers)
+
+    validator = _curl_validator(req.headers)
+    validator_path = Path(f'{part_path}{CURL_VALIDATOR_SUFFIX}')
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    ranges = req.headers.get('accept-ranges') == 'bytes' and expected_size is not None
+    resumable = ranges and validator is not None
+    if offset:
+        started_from = validator_path.read_text(encoding='utf-8') if validator_path.exists() else None
+        if not resumable or started_from != validator or offset > expected_size:
+            # Left from another version of the file, or one that can not be checked, so
+            # none of it can be trusted
+            part_path.unlink()
+            offset = 0
+        elif offset == expected_size:
+            # Finished last time, but never renamed into place
+            req.close()
+            part_path.replace(output_path)
+            validator_path.unlink()
+            return output_path, offset
+    if not offset and ranges and segments > 1 and expected_size >= segment_threshold \
+            and hasattr(os, 'pwrite'):
+        # Segments are never resumed, so a validator left with a discarded part has no use
+        validator_path.unlink(missing_ok=True)
+        return output_path, _curl_download_segmented(session, episode_url, output_path, expected_size, segments,
+                                                     req)
+    if offset:
+        req.close()
+        # Should the file change between the two requests, the server sends the whole
+        # of the new version instead of the range
+        req = session.get(episode_url, allow_redirects=True, timeout=CURL_DOWNLOAD_TIMEOUT, stream=True,
+                          headers={'Range': f'bytes={offset}-', 'If-Range': validator})
+    # A server that ignores the range sends the whole file again with a 200
+    if offset and req.status_code != 206:
+        offset = 0
+        # and the whole of a new version need not be the size the first response gave
+        expected_size = _curl_expected_size(req.headers)
+    if not offset:
+        validator = _curl_validator(req.headers)
+        if validator is not None:
+            validator_path.write_text(validator, encoding='utf-8')
+        else:
+            validator_path.unlink(missing_ok=True)
+
+    with open(str(part_path), 'ab' if offset else 'wb') as file_output:
+        for chunk in req.iter_content(chunk_size=CURL_CHUNK_SIZE):
             file_output.write(chunk)
-            if track_download_size:
-                download_size += len(chunk)
+    download_size = part_path.stat().st_size
+    # A dropped connection can end the stream early without raising. The part file
+    # stays behind so the next attempt can pick it up
+    if expected_size is not None and download_size != expected_size:
+        raise HathorException(f'Incomplete download for url: {episode_url}, '
+                              f'got {download_size} of {expected_size} bytes')
+    part_path.replace(output_path)
+    validator_path.unlink(missing_ok=True)
     return output_path, download_size
 
+def feed_content_hash(entries: list[dict]) -> str:
+    '''
+    Hash the parts of feed entries an episode sync reads, so a feed served without
+    validators can still be recognised as unchanged
+    entries : Entries of a parsed feed
+    '''
+    digest = sha256()
+    for item in entries:
+        links = [link.get('href') for link in item.get('links') or []]
+        digest.update(repr((item.get('id'), item.get('title'), item.get('published_parsed'), links)).encode('utf-8'))
+    return digest.hexdigest()
+
+@lru_cache(maxsize=256)
+def compile_title_filters(filters: tuple[str, ...]) -> tuple[re.Pattern, ...]:
+    '''
+    Compile title filters into the patterns a title has to match from its start
+
+    filters: Regex filters
+
+    Cached on the filters given, so each set is compiled once however many syncs and
+    titles it is used for. Filters without groups are combined into one pattern of
+    lookaheads, so a title is checked in a single match. Groups are left out of that
+    since combining would renumber their backreferences
+    '''
+    patterns = tuple(re.compile(filty) for filty in filters)
+    if len(patterns) > 1 and all(pattern.groups == 0 for pattern in patterns) \
+            and len({pattern.flags for pattern in patterns}) == 1:
+        try:
+            return (re.compile(''.join(f'(?={pattern.pattern})' for pattern in patterns), patterns[0].flags),)
+        except re.error:
+            # Such as inline flags, which are only allowed at the start of a whole pattern
+            pass
+    return patterns
+
 def verify_title_filters(filters: list[str], title: str) -> bool:
     '''
     Verify title matches filters given
@@ -162,21 +413,24 @@ def verify_title_filters(filters: list[str], title: str) -> bool:
     filters: Regex filters
     title: Title to check
     '''
-    valid = True
-    for filty in filters:
-        matches = re.match(filty, title)
-        if not matches:
-            valid = False
-            break
-    return valid
+    return all(pattern.match(title) for pattern in compile_title_filters(tuple(filters)))
 
 class ArchiveInterface():
     '''
     Basic Archive Interface
     Must be inherited
     '''
-    def __init__(self, logger: RootLogger, **_):
+    # Most broadcast updates an episode sync runs against this archive at once.
+    # None leaves it to the client's sync concurrency
+    sync_concurrency_limit = None
+    # Most episode downloads run against this archive at once. None leaves it to
+    # the client's download concurrency
+    download_concurrency_limit = None
+
+    def __init__(self, logger: RootLogger, **kwargs):
         self.logger = logger
+        # Normally the client's session, shared with every other manager
+        self.session = kwargs.get('http_session', None) or build_http_session()
 
     def broadcast_update(self, broadcast_id, max_results=None, filters=None, **kwargs):
         '''
@@ -190,26 +444,77 @@ class ArchiveInterface():
         '''
         raise FunctionUndefined("No episode download for class")
 
+    def episode_download_prepare(self, download_urls: list[str]):
+        '''
+        Called with every url of a download run before any of them are downloaded,
+        for managers that can look them up in bulk. Does nothing by default
+        download_urls : URLs about to be downloaded
+        '''
+
 class RSSManager(ArchiveInterface):
     '''
     RSS Archive Manager
     '''
-    def __init__(self, logger: RootLogger, **_):
-        ArchiveInterface.__init__(self, logger)
+    def __init__(self, logger: RootLogger, **kwargs):
+        ArchiveInterface.__init__(self, logger, **kwargs)
+        self.download_segments = kwargs.get('download_segments', None) or 1
+        self.download_segment_threshold = kwargs.get('download_segment_threshold', None)
+        if self.download_segment_threshold is None:
+            self.download_segment_threshold = CURL_SEGMENT_THRESHOLD
+
+    def _fetch_feed(self, broadcast_id: str, feed_state: dict | None):
+        '''
+        Fetch and parse a feed, or return None when it is unchanged since last time
+        broadcast_id : URL of feed
+        feed_state   : Validators from the last fetch, see broadcast_update
+        '''
+        parse_args = {}
+        if feed_state:
+            parse_args['etag'] = feed_state.get('etag')
+            parse_args['modified'] = feed_state.get('modified')
+        data = _lazy_module('feedparser').parse(broadcast_id, **parse_args)
+        # A 304 carries no body, so there is nothing to parse or walk
+        if feed_state is not None and data.get('status') == 304:
+            self.logger.debug(f'RSS feed unchanged: {broadcast_id}, not modified since last sync')
+            feed_state['unchanged'] = True
+            return None
+        try:
+            data['feed']['link']
+        except KeyError as error:
+            raise HathorException(f'Invalid data from rss feed {broadcast_id}') from error
 
-    def broadcast_update(self, broadcast_id: str, max_results: int | None = None, filters: list[str] | None = None, **_):
+        if feed_state is None:
+            return data
+        # Plenty of hosts send no validators, or send fresh ones on every request,
+        # so the entries themselves are the last word on whether anything changed
+        content_hash = feed_content_hash(data['entries'])
+        unchanged = content_hash == feed_state.get('content_hash')
+        feed_state.update({
+            'etag' : data.get('etag'),
+            'modified' : data.get('modified'),
+            'content_hash' : content_hash,
+            'unchanged' : unchanged,
+        })
+        if unchanged:
+            self.logger.debug(f'RSS feed unchanged: {broadcast_id}, entries match last sync')
+            return None
+        return data
+
+    def broadcast_update(self, broadcast_id: str, max_results: int | None = None, filters: list[str] | None = None,
+                         feed_state: dict | None = None, **_):
         '''
         Get latest episodes from broadcast
         broadcast_id : URL to generate episodes from
         max_results  : Only return N results
         filters      : Regex filters to match against titles
+        feed_state   : Validators from the last fetch of this feed (etag, modified, content_hash).
+                       Sent as a conditional request and updated in place, with "unchanged" set
+                       when the feed is the same as last time, in which case nothing is returned
         '''
         self.logger.debug(f'Getting episode info from RSS feed: {broadcast_id}')
-        data = parse(broadcast_id)
-        try:
-            data['feed']['link']
-        except KeyError as error:
-            raise HathorException(f'Invalid data from rss feed {broadcast_id}') from error
+        data = self._fetch_feed(broadcast_id, feed_state)
+        if data is None:
+            return []
 
         filters = filters or []
 
@@ -228,7 +533,7 @@ class RSSManager(ArchiveInterface):
             episode_url = None
             # URL can be in a few different spots, lets check for proper urls
             try:
-                if url(item['id']):
+                if _lazy_module('validators').url(item['id']):
                     episode_url = item['id']
             except KeyError:
                 pass
@@ -264,21 +569,34 @@ class RSSManager(ArchiveInterface):
         download_url    : URL to download from
         output_prefix   : Name of file, should not include suffix
         '''
-        return curl_download(download_url, output_prefix)
+        return curl_download(download_url, output_prefix, segments=self.download_segments,
+                             segment_threshold=self.download_segment_threshold, session=self.session)
 
 class YoutubeManager(ArchiveInterface):
     '''
     Youtube Archive Manager
     '''
+    # The google api client sits on httplib2, which is not thread safe, and one
+    # client is shared by every sync. Listings also spend quota, so they stay serial
+    sync_concurrency_limit = 1
+    # The liveness check before each download rides the same client, and the
+    # pacing in YOUTUBE_PACING_YTDLP_OPTIONS only spaces out downloads that run
+    # one after another
+    download_concurrency_limit = 1
+
     def __init__(self, logger, **kwargs):
-        ArchiveInterface.__init__(self, logger)
+        ArchiveInterface.__init__(self, logger, **kwargs)
         self.google_api_key = kwargs.get('google_api_key', None)
         if not self.google_api_key:
             raise HathorException('Google API Key not passed')
         self.ytdlp_options = kwargs.get('ytdlp_options', None) or {}
         self.skip_shorts = kwargs.get('youtube_skip_shorts', False)
         # Built once and reused. Every call off it goes through _execute
-        self.youtube_api = build('youtube', 'v3', developerKey=self.google_api_key)
+        discovery = _lazy_module('googleapiclient.discovery')
+        self.youtube_api = discovery.build('youtube', 'v3', developerKey=self.google_api_key)
+        # Readiness of the videos in the current download run, by video id. Filled
+        # by episode_download_prepare and used up by episode_download
+        self._vod_ready = {}
 
     def _execute(self, request):
         '''
@@ -286,21 +604,26 @@ class YoutubeManager(ArchiveInterface):
         spent quota into something readable
         request : Request object from the google api client
         '''
+        errors = _lazy_module('googleapiclient.errors')
         try:
             return request.execute(num_retries=YOUTUBE_NUM_RETRIES)
-        except HttpError as error:
+        except errors.HttpError as error:
             if youtube_quota_exhausted(error):
                 raise HathorException('Youtube api daily quota exceeded') from error
             raise
 
-    def _uploads_playlist_id(self, broadcast_id: str) -> str:
+    def _uploads_playlist_id(self, broadcast_id: str, resolution_cache: dict | None = None) -> str:
         '''
         Find the uploads playlist that holds a channels videos
-        broadcast_id : Youtube channel id
+        broadcast_id     : Youtube channel id
+        resolution_cache : Uploads playlist ids looked up before, by channel id. Added to in place
         '''
         if broadcast_id.startswith(YOUTUBE_CHANNEL_ID_PREFIX):
             suffix = broadcast_id[len(YOUTUBE_CHANNEL_ID_PREFIX):]
             return f'{YOUTUBE_UPLOADS_PLAYLIST_PREFIX}{suffix}'
+        resolution_cache = {} if resolution_cache is None else resolution_cache
+        if broadcast_id in resolution_cache:
+            return resolution_cache[broadcast_id]
         # Older channel ids do not carry the uploads id in their name, so ask.
         # One unit, and only for channels that need it.
         response = self._execute(self.youtube_api.channels().list( #pylint:disable=no-member
@@ -311,26 +634,53 @@ class YoutubeManager(ArchiveInterface):
         items = response.get('items') or []
         if not items:
             raise HathorException(f'No youtube channel found for: {broadcast_id}')
-        return items[0]['contentDetails']['relatedPlaylists']['uploads']
+        resolution_cache[broadcast_id] = items[0]['contentDetails']['relatedPlaylists']['uploads']
+        return resolution_cache[broadcast_id]
 
-    def _is_short(self, video_id: str) -> bool:
+    def _is_short(self, video_id: str) -> bool | None:
         '''
         Check whether a video id points at a short
         video_id : 11 char youtube video id
 
-        Returns False when the check cannot be made, so a video is only ever
-        skipped on a definite answer
+        Returns None when the check cannot be made, so a video is only ever
+        skipped, or remembered, on a definite answer
         '''
         try:
-            response = head(f'{YOUTUBE_SHORTS_URL}/{video_id}', allow_redirects=False,
-                            timeout=YOUTUBE_SHORTS_REQUEST_TIMEOUT)
+            response = self.session.head(f'{YOUTUBE_SHORTS_URL}/{video_id}', allow_redirects=False,
+                                         timeout=YOUTUBE_SHORTS_REQUEST_TIMEOUT)
         except Exception as e: #pylint:disable=broad-except
             self.logger.warning(f'Shorts check failed for video {video_id}: {str(e)}')
-            return False
+            return None
         return response.status_code == 200
 
+    def _check_shorts(self, video_ids: list[str], shorts_cache: dict):
+        '''
+        Run the shorts checks for a few videos at once
+        video_ids    : 11 char youtube video ids
+        shorts_cache : Answers by video id, added to in place
+        '''
+        results = utils.run_concurrently(self._is_short, video_ids, YOUTUBE_SHORTS_CONCURRENCY)
+        for video_id, is_short in zip(video_ids, results):
+            if is_short is not None:
+                shorts_cache[video_id] = is_short
+
+    def _is_short_cached(self, video_id: str, shorts_candidates: list[str], shorts_cache: dict) -> bool:
+        '''
+        Check whether a video is a short, going by the cache where it can
+        video_id          : 11 char youtube video id
+        shorts_candidates : Videos on the page that may need a check, in page order
+        shorts_cache      : Answers by video id, added to in place
+        '''
+        if video_id not in shorts_cache:
+            # Checked along with the next few candidates, which the walk will
+            # most likely reach anyway
+            upcoming = shorts_candidates[shorts_candidates.index(video_id):]
+            self._check_shorts([vid for vid in upcoming if vid not in shorts_cache][:YOUTUBE_SHORTS_CONCURRENCY],
+                               shorts_cache)
+        return bool(shorts_cache.get(video_id))
+
     def broadcast_update(self, broadcast_id, max_results=None, filters=None, known_urls=None,
-                         backfill=False, **_):
+                         backfill=False, shorts_cache=None, resolution_cache=None, **_):
         '''
         Get latest episodes from broadcast
         broadcast_id    : Youtube channel id
@@ -340,6 +690,9 @@ class YoutubeManager(ArchiveInterface):
                           once YOUTUBE_KNOWN_STREAK_STOP of them turn up in a row
         backfill        : Walk past the known videos instead of stopping on them, for a
                           podcast sitting under its max allowed. Bounded by max_results
+        shorts_cache    : Shorts check answers from earlier syncs, by video id. Videos in it
+                          are not checked again, and new answers are added in place
+        resolution_cache: Uploads playlist ids from earlier syncs, by channel id. Added to in place
         '''
         self.logger.debug(f'Getting episodes for youtube broadcast: {broadcast_id}')
         archive_data = []
@@ -352,11 +705,13 @@ class YoutubeManager(ArchiveInterface):
 
         data_inputs = {
             'part': 'snippet,contentDetails',
-            'playlistId': self._uploads_playlist_id(broadcast_id),
+            'playlistId': self._uploads_playlist_id(broadcast_id, resolution_cache),
             'maxResults': YOUTUBE_PAGE_SIZE,
             'fields': 'nextPageToken,items(snippet(title,description,resourceId/videoId),'
                       'contentDetails/videoPublishedAt)',
         }
+        if shorts_cache is None:
+            shorts_cache = {}
         playlist_items = self.youtube_api.playlistItems() #pylint:disable=no-member
         req = playlist_items.list(**data_inputs)
         pages = 0
@@ -364,6 +719,12 @@ class YoutubeManager(ArchiveInterface):
         while req is not None:
             response = self._execute(req)
             pages += 1
+            # Videos on this page a shorts check could be spent on, in page order
+            shorts_candidates = []
+            if self.skip_shorts:
+                shorts_candidates = [item['snippet']['resourceId']['videoId'] for item in response['items'] \
+                                     if item['snippet']['resourceId']['videoId'] not in known_ids and \
+                                     verify_title_filters(filters, utils.clean_string(item['snippet']['title']))]
             for item in response['items']:
                 video_id = item['snippet']['resourceId']['videoId']
                 # Checked ahead of the title filters, so a filter that matches
@@ -390,7 +751,7 @@ class YoutubeManager(ArchiveInterface):
                 # resetting here would mean a channel that posts shorts between
                 # uploads could never reach the streak and would page on to the
                 # ceiling on every sync
-                if self.skip_shorts and self._is_short(video_id):
+                if self.skip_shorts and self._is_short_cached(video_id, shorts_candidates, shorts_cache):
                     self.logger.debug(f'Video {video_id} is a short, skipping')
                     continue
                 known_streak = 0
@@ -415,6 +776,70 @@ class YoutubeManager(ArchiveInterface):
             req = playlist_items.list_next(req, response)
         return archive_data
 
+    def _videos_list(self, video_ids: list[str]) -> list[dict]:
+        '''
+        Fetch what a liveness check reads for up to YOUTUBE_VIDEOS_BATCH_SIZE videos
+        video_ids : 11 char youtube video ids
+        '''
+        resp = self._execute(self.youtube_api.videos().list( #pylint:disable=no-member
+            part='snippet,liveStreamingDetails,contentDetails',
+            id=','.join(video_ids),
+            fields='items(id,snippet/liveBroadcastContent,'
+                   'liveStreamingDetails/actualEndTime,'
+                   'contentDetails/duration)',
+        ))
+        return resp.get('items') or []
+
+    def _video_item_ready(self, item: dict, download_url: str) -> bool:
+        '''
+        Decide from a videos.list item whether a video can be downloaded yet
+        item         : Item from videos.list
+        download_url : URL the item was looked up for, for logging
+        '''
+        broadcast = (item.get('snippet') or {}).get('liveBroadcastContent')
+        if broadcast in ('live', 'upcoming'):
+            self.logger.info(f'Deferring {download_url}: broadcast is {broadcast}')
+            return False
+
+        live_details = item.get('liveStreamingDetails') or {}
+        duration = (item.get('contentDetails') or {}).get('duration')
+        if live_details.get('actualEndTime') and duration in (None, 'PT0S'):
+            self.logger.info(f'Deferring {download_url}: live ended, VOD still processing')
+            return False
+
+        return True
+
+    def episode_download_prepare(self, download_urls: list[str]):
+        '''
+        Check the liveness of every video in a download run up front, one
+        videos.list call per YOUTUBE_VIDEOS_BATCH_SIZE videos instead of one each
+        download_urls : URLs about to be downloaded
+        '''
+        self._vod_ready = {}
+        urls_by_id = {}
+        for download_url in download_urls:
+            video_id = extract_youtube_video_id(download_url)
+            if video_id:
+                urls_by_id[video_id] = download_url
+        video_ids = list(urls_by_id)
+        for offset in range(0, len(video_ids), YOUTUBE_VIDEOS_BATCH_SIZE):
+            batch = video_ids[offset:offset + YOUTUBE_VIDEOS_BATCH_SIZE]
+            try:
+                items = self._videos_list(batch)
+            except Exception as e: #pylint:disable=broad-except
+                # Left out of the cache, so each is checked on its own at download
+                self.logger.warning(f'YouTube batch liveness check failed: {str(e)}')
+                continue
+            # A video missing from the response is private or gone, which is for
+            # the download to find out, same as a single check
+            ready = dict.fromkeys(batch, True)
+            for item in items:
+                if item.get('id') in ready:
+                    ready[item['id']] = self._video_item_ready(item, urls_by_id[item['id']])
+            self._vod_ready.update(ready)
+        self.logger.debug(f'Checked liveness of {len(self._vod_ready)} youtube videos '
+                          f'in {-(-len(video_ids) // YOUTUBE_VIDEOS_BATCH_SIZE)} calls')
+
     def _youtube_vod_ready(self, download_url: str) -> bool:
         '''
         Return False iff the URL points at a YouTube video that is currently
@@ -425,36 +850,19 @@ class YoutubeManager(ArchiveInterface):
         video_id = extract_youtube_video_id(download_url)
         if not video_id:
             return True
+        # Used once, a later run checks again
+        if video_id in self._vod_ready:
+            return self._vod_ready.pop(video_id)
 
         try:
-            resp = self._execute(self.youtube_api.videos().list( #pylint:disable=no-member
-                part='snippet,liveStreamingDetails,contentDetails',
-                id=video_id,
-                fields='items(snippet/liveBroadcastContent,'
-                       'liveStreamingDetails/actualEndTime,'
-                       'contentDetails/duration)',
-            ))
+            items = self._videos_list([video_id])
         except Exception as e: #pylint:disable=broad-except
             self.logger.warning(f'YouTube liveness check failed for {download_url}: {str(e)}')
             return True
 
-        items = resp.get('items') or []
         if not items:
             return True
-
-        item = items[0]
-        broadcast = (item.get('snippet') or {}).get('liveBroadcastContent')
-        if broadcast in ('live', 'upcoming'):
-            self.logger.info(f'Deferring {download_url}: broadcast is {broadcast}')
-            return False
-
-        live_details = item.get('liveStreamingDetails') or {}
-        duration = (item.get('contentDetails') or {}).get('duration')
-        if live_details.get('actualEndTime') and duration in (None, 'PT0S'):
-            self.logger.info(f'Deferring {download_url}: live ended, VOD still processing')
-            return False
-
-        return True
+        return self._video_item_ready(items[0], download_url)
 
     def episode_download(self, download_url: str, output_prefix: str, **_) -> (Path, int):
         '''
@@ -481,12 +889,13 @@ class YoutubeManager(ArchiveInterface):
             'outtmpl' : f'{output_prefix}.%(ext)s',
             'logger' : self.logger,
         }
+        yt_dlp = _lazy_module('yt_dlp')
         try:
-            with YoutubeDL(options) as yt:
+            with yt_dlp.YoutubeDL(options) as yt:
                 data = yt.extract_info(download_url, download=True)
                 file_path = Path(data['requested_downloads'][0]['filepath'])
                 return file_path, file_path.stat().st_size
-        except DownloadError as e:
+        except yt_dlp.utils.DownloadError as e:
             self.logger.error(f'Error downloading youtube url: {download_url}, {str(e)}')
             return None, None
 
@@ -497,31 +906,44 @@ class TwitchManager(ArchiveInterface):
     Downloads past broadcasts (VODs) from a twitch channel. Live streams are
     skipped, and picked up on a later sync once twitch has finished the VOD.
     '''
+    # Helix rate limits per app token, and every channel shares the one token
+    sync_concurrency_limit = 2
+    download_concurrency_limit = 2
+
     def __init__(self, logger, **kwargs):
-        ArchiveInterface.__init__(self, logger)
+        ArchiveInterface.__init__(self, logger, **kwargs)
         self.twitch_client_id = kwargs.get('twitch_client_id', None)
         self.twitch_client_secret = kwargs.get('twitch_client_secret', None)
         if not self.twitch_client_id or not self.twitch_client_secret:
             raise HathorException('Twitch client id and client secret not passed')
         self.ytdlp_options = kwargs.get('ytdlp_options', None) or {}
         self._access_token = None
+        # Monotonic time the token should be replaced by
+        self._access_token_expires = None
+        # Download workers check liveness from their own threads, and share the one token
+        self._token_lock = Lock()
 
     def _token(self) -> str:
         '''
-        Fetch an app access token, and reuse it for the life of the manager.
+        Fetch an app access token, and reuse it until shortly before it expires.
         Only public data is read, so the client credentials grant is enough and
         no user ever has to log in.
         '''
-        if self._access_token:
+        with self._token_lock:
+            if self._access_token and (self._access_token_expires is None or monotonic() < self._access_token_expires):
+                return self._access_token
+            response = self.session.post(TWITCH_OAUTH_URL, params={
+                'client_id': self.twitch_client_id,
+                'client_secret': self.twitch_client_secret,
+                'grant_type': 'client_credentials',
+            }, timeout=TWITCH_REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            self._access_token = data['access_token']
+            self._access_token_expires = None
+            if data.get('expires_in') is not None:
+                self._access_token_expires = monotonic() + data['expires_in'] - TWITCH_TOKEN_REFRESH_MARGIN
             return self._access_token
-        response = post(TWITCH_OAUTH_URL, params={
-            'client_id': self.twitch_client_id,
-            'client_secret': self.twitch_client_secret,
-            'grant_type': 'client_credentials',
-        }, timeout=TWITCH_REQUEST_TIMEOUT)
-        response.raise_for_status()
-        self._access_token = response.json()['access_token']
-        return self._access_token
 
     def _api_get(self, endpoint: str, params: dict) -> dict:
         '''
@@ -529,35 +951,50 @@ class TwitchManager(ArchiveInterface):
         endpoint : Helix endpoint name, such as "videos"
         params   : Query params
         '''
-        response = get(f'{TWITCH_API_URL}/{endpoint}', params=params, headers={
-            'Client-Id': self.twitch_client_id,
-            'Authorization': f'Bearer {self._token()}',
-        }, timeout=TWITCH_REQUEST_TIMEOUT)
+        for attempt in range(2):
+            token = self._token()
+            response = self.session.get(f'{TWITCH_API_URL}/{endpoint}', params=params, headers={
+                'Client-Id': self.twitch_client_id,
+                'Authorization': f'Bearer {token}',
+            }, timeout=TWITCH_REQUEST_TIMEOUT)
+            # A token revoked, or expired early, is fetched again and the call retried once
+            if response.status_code != 401 or attempt:
+                break
+            self.logger.debug('Twitch app token rejected, fetching a new one')
+            with self._token_lock:
+                if self._access_token == token:
+                    self._access_token = None
         response.raise_for_status()
         return response.json()
 
-    def _user_id(self, channel_name: str) -> str:
+    def _user_id(self, channel_name: str, resolution_cache: dict | None = None) -> str:
         '''
         Resolve a channel login name to the numeric user id helix wants
-        channel_name : Twitch channel login name
+        channel_name     : Twitch channel login name
+        resolution_cache : User ids looked up before, by login name. Added to in place
         '''
+        resolution_cache = {} if resolution_cache is None else resolution_cache
+        if channel_name in resolution_cache:
+            return resolution_cache[channel_name]
         data = self._api_get('users', {'login': channel_name})
         users = data.get('data') or []
         if not users:
             raise HathorException(f'No twitch channel found for: {channel_name}')
-        return users[0]['id']
+        resolution_cache[channel_name] = users[0]['id']
+        return resolution_cache[channel_name]
 
-    def broadcast_update(self, broadcast_id, max_results=None, filters=None, **_):
+    def broadcast_update(self, broadcast_id, max_results=None, filters=None, resolution_cache=None, **_):
         '''
         Get latest episodes from broadcast
-        broadcast_id    : Twitch channel login name
-        max_results     : Return max N results
-        filters         : List of regex filters
+        broadcast_id     : Twitch channel login name
+        max_results      : Return max N results
+        filters          : List of regex filters
+        resolution_cache : User ids from earlier syncs, by login name. Added to in place
         '''
         self.logger.debug(f'Getting episodes for twitch broadcast: {broadcast_id}')
         archive_data = []
         filters = filters or []
-        user_id = self._user_id(broadcast_id)
+        user_id = self._user_id(broadcast_id, resolution_cache)
 
         params = {
             'user_id': user_id,
@@ -648,12 +1085,13 @@ class TwitchManager(ArchiveInterface):
             'outtmpl' : f'{output_prefix}.%(ext)s',
             'logger' : self.logger,
         }
+        yt_dlp = _lazy_module('yt_dlp')
         try:
-            with YoutubeDL(options) as yt:
+            with yt_dlp.YoutubeDL(options) as yt:
                 data = yt.extract_info(download_url, download=True)
                 file_path = Path(data['requested_downloads'][0]['filepath'])
                 return file_path, file_path.stat().st_size
-        except DownloadError as e:
+        except yt_dlp.utils.DownloadError as e:
             self.logger.error(f'Error downloading twitch url: {download_url}, {str(e)}')
             return None, None
 
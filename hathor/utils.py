@@ -1,10 +1,20 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from errno import EXDEV
 from logging import getLogger, Formatter, StreamHandler, RootLogger
 from logging.handlers import RotatingFileHandler
-from string import ascii_lowercase, ascii_uppercase, digits
+import os
+import re
 
 from pathlib import Path
+from shutil import copyfile, copystat, rmtree
+from threading import Lock
 from urllib.parse  import urlparse
 
+# Runs of anything but ascii letters and digits, underscores included, so a run
+# mixing underscores and other characters still becomes a single underscore
+NORMALIZE_NAME_RE = re.compile(r'[^A-Za-z0-9]+')
+
 def process_url(url: str) -> str:
     '''
     Process url and remove extra options
@@ -28,25 +38,7 @@ def normalize_name(name: str) -> str:
     Remove non alpha numeric characters from string
     name: original name
     '''
-    valid_chars = ascii_lowercase + digits
-    valid_chars += ascii_uppercase + '_'
-
-    new_str = ''
-    for char in name:
-        if char not in valid_chars:
-            new_str = f'{new_str}_'
-            continue
-        new_str = f'{new_str}{char}'
-
-    while True:
-        new_name = new_str.replace('__', '_')
-        if new_name == new_str:
-            break
-        new_str = new_name
-
-    name_str = new_str.lstrip('_')
-    name_str = new_str.rstrip('_')
-    return name_str
+    return NORMALIZE_NAME_RE.sub('_', name).strip('_')
 
 def clean_string(stringy: str) -> str:
     '''
@@ -55,10 +47,76 @@ def clean_string(stringy: str) -> str:
     '''
     if stringy is None:
         return None
-    s = stringy.lstrip(' ')
-    s = s.rstrip(' ').rstrip('\n').rstrip(' ')
-    s = s.replace('\n', ' ').replace('\r', '')
-    return s
+    # Each of these is a single pass in C, and str.translate is slower than the two replaces
+    return stringy.lstrip(' ').rstrip(' ').rstrip('\n').rstrip(' ').replace('\n', ' ').replace('\r', '')
+
+def run_concurrently(func, items: list, max_workers: int, limits=None):
+    '''
+    Run a function over items on a thread pool, yielding the results in item order
+    func: Function to call with each item
+    items: Items to run over
+    max_workers: Items run at once, below 2 runs them serially on the calling thread
+    limits: Function giving the (key, limit) pairs of an item. An item only starts
+            once fewer than limit items holding each of its keys are running, and
+            until then the workers go to items behind it that are free to start
+
+    An exception from any item is raised when its result is reached, and items
+    that have not started by then are cancelled
+    '''
+    if max_workers < 2 or len(items) < 2:
+        for item in items:
+            yield func(item)
+        return
+    # Items waiting on the same keys, in item order. A worker never sits blocked on
+    # a busy key, it is only handed an item that is free to run
+    queues = {}
+    for index, item in enumerate(items):
+        queues.setdefault(tuple(limits(item)) if limits else (), deque()).append(index)
+    results = [Future() for _ in items]
+    running = Counter()
+    lock = Lock()
+    active = 0
+    stopped = False
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def dispatch():
+        # Called with the lock held, starts the earliest free items until the workers are full
+        nonlocal active
+        while not stopped and active < max_workers:
+            ready = [(queue[0], slots, queue) for slots, queue in queues.items() \
+                     if queue and all(running[key] < limit for key, limit in slots)]
+            if not ready:
+                return
+            index, slots, queue = min(ready, key=lambda entry: entry[0])
+            queue.popleft()
+            for key, _limit in slots:
+                running[key] += 1
+            active += 1
+            pool.submit(run, index, slots)
+
+    def run(index, slots):
+        nonlocal active
+        try:
+            results[index].set_result(func(items[index]))
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # Raised on the calling thread, once its result is reached
+            results[index].set_exception(error)
+        finally:
+            with lock:
+                for key, _limit in slots:
+                    running[key] -= 1
+                active -= 1
+                dispatch()
+
+    try:
+        with lock:
+            dispatch()
+        for result in results:
+            yield result.result()
+    finally:
+        with lock:
+            stopped = True
+        pool.shutdown(wait=True, cancel_futures=True)
 
 def setup_logger(name: str,
                  logging_file: Path = None,
@@ -97,11 +155,50 @@ def rm_tree(pth: Path) -> bool:
     Remove all files in a tree
     pth: Path to remove
     '''
-    # https://stackoverflow.com/questions/50186904/pathlib-recursively-remove-directory
-    for child in pth.glob('*'):
-        if child.is_file():
-            child.unlink()
-        else:
-            rm_tree(child)
-    pth.rmdir()
+    rmtree(pth)
     return True
+
+def unlink_files(paths: list[Path], max_workers: int):
+    '''
+    Remove files on a thread pool, yielding in path order whether each file was there to remove
+    paths: Paths of files to remove
+    max_workers: Files removed at once
+    '''
+    def unlink(pth):
+        try:
+            Path(pth).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+    yield from run_concurrently(unlink, paths, max_workers)
+
+def move_file(source: Path, destination: Path) -> int:
+    '''
+    Move a file, renaming it when both paths are on one filesystem and copying it otherwise
+    source: File to move
+    destination: Path to move it to
+
+    Returns the size of the file moved. A move that was interrupted can be made again,
+    a file already at its destination is left there and a partial copy is started over
+    '''
+    source = Path(source)
+    destination = Path(destination)
+    if not source.exists() and destination.exists():
+        return destination.stat().st_size
+    size = source.stat().st_size
+    try:
+        os.rename(source, destination)
+        return size
+    except OSError as error:
+        # Raised across filesystems, and across separate mount points of the same
+        # filesystem, which is what two bind mounts of one drive are inside a container
+        if error.errno != EXDEV:
+            raise
+    # Copied under a temporary name first, so the destination is never a partial file.
+    # copyfile hands the copy to the kernel with sendfile where it can
+    part_path = destination.with_name(f'{destination.name}.part')
+    copyfile(source, part_path)
+    copystat(source, part_path)
+    os.replace(part_path, destination)
+    source.unlink()
+    return size
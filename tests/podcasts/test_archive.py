@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 import logging
 from pathlib import Path
 import random
+import sys
 from tempfile import TemporaryDirectory
 from time import struct_time
 
@@ -11,9 +12,10 @@ from yt_dlp.utils import DownloadError
 
 from hathor.client import HathorClient
 from hathor.exc import EpisodeNotReady, HathorException, FunctionUndefined
-from hathor.podcast.archive import ArchiveInterface, RSSManager, TwitchManager
-from hathor.podcast.archive import extract_twitch_video_id
-from hathor.podcast.archive import twitch_timestamp, verify_title_filters
+from hathor.podcast.archive import CURL_SEGMENT_THRESHOLD, ArchiveInterface, RSSManager, TwitchManager
+from hathor.podcast.archive import build_http_session, curl_download, extract_twitch_video_id
+from hathor.podcast.archive import compile_title_filters, twitch_timestamp, verify_title_filters
+from hathor.podcast import archive
 
 from tests import utils as test_utils
 from tests.data.rss_feed import SIMPLE_RSS_FEED
@@ -59,16 +61,275 @@ def requests_get_mock_no_content(_url, audio_file, **_):
         return RequestsMockObject({}, audio_file)
     return func
 
+class RangeResponseMock():
+    def __init__(self, headers, body, status_code=200):
+        self.headers = headers
+        self.body = body
+        self.status_code = status_code
+        self.closed = False
+
+    def iter_content(self, chunk_size: None): #pylint:disable=unused-argument
+        return [self.body]
+
+    def close(self):
+        self.closed = True
+
+
+def range_get_mock(body, accept_ranges=True, honour_range=True, served=None, calls=None, etag='"v1"'):
+    # Serves body like a plain http server. served caps how many bytes are sent
+    # before the connection "drops"
+    def func(_url, headers=None, **_):
+        if calls is not None:
+            calls.append(headers)
+        response_headers = {
+            'content-type': 'audio/mpeg',
+            'content-length': str(len(body)),
+        }
+        if accept_ranges:
+            response_headers['accept-ranges'] = 'bytes'
+        if etag:
+            response_headers['etag'] = etag
+        range_header = (headers or {}).get('Range')
+        if_range = (headers or {}).get('If-Range')
+        if range_header and honour_range and (if_range is None or if_range == etag):
+            start, end = range_header.split('=')[1].split('-')
+            start = int(start)
+            end = int(end) + 1 if end else len(body)
+            response_headers['content-length'] = str(end - start)
+            return RangeResponseMock(response_headers, body[start:end][:served], status_code=206)
+        return RangeResponseMock(response_headers, body[:served])
+    return func
+
+def test_curl_download_resumes_part_file(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(body[:400])
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v1"', encoding='utf-8')
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        assert calls[-1] == {'Range': 'bytes=400-', 'If-Range': '"v1"'}
+        assert size == len(body)
+        assert path.read_bytes() == body
+        assert not Path(f'{tmp_dir}/episode0.mp3.part').exists()
+        assert not Path(f'{tmp_dir}/episode0.mp3.part.validator').exists()
+
+def test_curl_download_part_file_other_version(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v0"', encoding='utf-8')
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # The enclosure changed since the part was started, so none of it is kept
+        assert calls == [None]
+        assert size == len(body)
+        assert path.read_bytes() == body
+
+def test_curl_download_part_file_changed_between_requests(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v1"', encoding='utf-8')
+        before, after = range_get_mock(body), range_get_mock(body, etag='"v2"')
+        def get(url, headers=None, **kwargs):
+            # The enclosure is replaced just after the first request
+            return after(url, headers=headers, **kwargs) if headers else before(url, **kwargs)
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=get)
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # If-Range no longer matched, so the whole new version came back and replaced the part
+        assert size == len(body)
+        assert path.read_bytes() == body
+        assert not Path(f'{tmp_dir}/episode0.mp3.part.validator').exists()
+
+def test_curl_download_part_file_changed_size_between_requests(mocker):
+    body = b'0123456789' * 100
+    new_body = b'abcdefghij' * 150
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v1"', encoding='utf-8')
+        before, after = range_get_mock(body), range_get_mock(new_body, etag='"v2"')
+        def get(url, headers=None, **kwargs):
+            return after(url, headers=headers, **kwargs) if headers else before(url, **kwargs)
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=get)
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # Checked against the size of the new version, not the one first announced
+        assert size == len(new_body)
+        assert path.read_bytes() == new_body
+
+def test_curl_download_part_file_no_validator(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls, etag=None))
+        path, _ = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        assert calls == [None]
+        assert path.read_bytes() == body
+        assert not Path(f'{tmp_dir}/episode0.mp3.part.validator').exists()
+
+def test_curl_download_part_file_too_large(mocker):
+    body = b'0123456789' * 80
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 1000)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v1"', encoding='utf-8')
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # Larger than the file can be, so it is thrown out rather than taken as finished
+        assert size == len(body)
+        assert path.read_bytes() == body
+
+def test_curl_download_range_ignored(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, honour_range=False))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # the whole file came back, so the part file is written over, not added to
+        assert size == len(body)
+        assert path.read_bytes() == body
+
+def test_curl_download_no_accept_ranges(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(body[:400])
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, accept_ranges=False, calls=calls))
+        path, _ = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        assert calls == [None]
+        assert path.read_bytes() == body
+
+def test_curl_download_part_file_complete(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(body)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v1"', encoding='utf-8')
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        # nothing left to fetch, only the rename was missing
+        assert len(calls) == 1
+        assert size == len(body)
+        assert path.read_bytes() == body
+
+def test_curl_download_incomplete(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, served=600))
+        with pytest.raises(HathorException) as error:
+            curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        assert 'got 600 of 1000 bytes' in str(error.value)
+        # kept for the next attempt, and never put in place of the episode
+        assert Path(f'{tmp_dir}/episode0.mp3.part').stat().st_size == 600
+        assert not Path(f'{tmp_dir}/episode0.mp3').exists()
+
+def test_curl_download_segmented(mocker):
+    body = bytes(range(256)) * 40
+    with TemporaryDirectory() as tmp_dir:
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls))
+        path, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0',
+                                   segments=3, segment_threshold=1024)
+        # The first range is read off the response the headers came from
+        assert calls[0] is None
+        assert sorted(c['Range'] for c in calls[1:]) == ['bytes=3414-6827', 'bytes=6828-10239']
+        assert size == len(body)
+        assert path.read_bytes() == body
+        assert not Path(f'{tmp_dir}/episode0.mp3.segments').exists()
+
+def test_curl_download_segmented_discards_part_file(mocker):
+    body = bytes(range(256)) * 40
+    with TemporaryDirectory() as tmp_dir:
+        Path(f'{tmp_dir}/episode0.mp3.part').write_bytes(b'x' * 400)
+        Path(f'{tmp_dir}/episode0.mp3.part.validator').write_text('"v0"', encoding='utf-8')
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body))
+        path, _ = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0',
+                                segments=3, segment_threshold=1024)
+        assert path.read_bytes() == body
+        # Only the finished file is left
+        assert [p.name for p in Path(tmp_dir).iterdir()] == ['episode0.mp3']
+
+def test_curl_download_segmented_under_threshold(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        calls = []
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, calls=calls))
+        path, _ = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0',
+                                segments=3, segment_threshold=2048)
+        assert calls == [None]
+        assert path.read_bytes() == body
+
+def test_curl_download_segmented_range_refused(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, honour_range=False))
+        with pytest.raises(HathorException) as error:
+            curl_download('https://example.foo/download1', f'{tmp_dir}/episode0',
+                          segments=2, segment_threshold=10)
+        assert 'Range request refused for url' in str(error.value)
+        # nothing is left that a later attempt could mistake for a part download
+        assert not list(Path(tmp_dir).iterdir())
+
+def test_curl_download_segmented_incomplete(mocker):
+    body = b'0123456789' * 100
+    with TemporaryDirectory() as tmp_dir:
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=range_get_mock(body, served=100))
+        with pytest.raises(HathorException) as error:
+            curl_download('https://example.foo/download1', f'{tmp_dir}/episode0',
+                          segments=2, segment_threshold=10)
+        assert 'Incomplete segment for url' in str(error.value)
+        assert not list(Path(tmp_dir).iterdir())
+
+def test_rss_manager_download_segment_threshold_zero():
+    # An explicit 0 splits every download that takes ranges, rather than falling back to the default
+    assert RSSManager(logging, download_segment_threshold=0).download_segment_threshold == 0
+    assert RSSManager(logging).download_segment_threshold == CURL_SEGMENT_THRESHOLD
+
+def test_rss_manager_download_segments(mocker):
+    manager = RSSManager(logging, download_segments=4, download_segment_threshold=10)
+    mocked_curl = mocker.patch('hathor.podcast.archive.curl_download', return_value=(None, None))
+    manager.episode_download('https://example.foo/download1', 'episode0')
+    mocked_curl.assert_called_with('https://example.foo/download1', 'episode0', segments=4, segment_threshold=10,
+                                   session=manager.session)
+
+def test_build_http_session():
+    session = build_http_session(pool_connections=3, pool_maxsize=7, retries=2, backoff_factor=0.1)
+    adapter = session.get_adapter('https://example.foo')
+    assert adapter._pool_connections == 3 #pylint:disable=protected-access
+    assert adapter._pool_maxsize == 7 #pylint:disable=protected-access
+    assert adapter.max_retries.total == 2
+    assert adapter.max_retries.backoff_factor == 0.1
+    assert 429 in adapter.max_retries.status_forcelist
+    assert 'POST' not in adapter.max_retries.allowed_methods
+    assert session.get_adapter('http://example.foo') is adapter
+
+def test_managers_share_given_session():
+    session = build_http_session()
+    manager = RSSManager(logging, http_session=session)
+    assert manager.session is session
+    # Built on the fly when no session is handed in
+    assert RSSManager(logging).session is not session
+
+def test_curl_download_encoded_not_checked(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        def func(_url, **_):
+            return RangeResponseMock({'content-type': 'audio/mpeg', 'content-length': '10',
+                                      'content-encoding': 'gzip'}, b'0123456789' * 5)
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=func)
+        _, size = curl_download('https://example.foo/download1', f'{tmp_dir}/episode0')
+        assert size == 50
+
 def test_curl_download(mocker):
     client = HathorClient()
     with TemporaryDirectory() as tmp_dir:
-        parse_mock = mocker.patch('hathor.podcast.archive.parse')
+        parse_mock = mocker.patch('feedparser.parse')
         parse_mock.return_value = SIMPLE_RSS_FEED
         client.podcast_create('rss', 'https://example.foo', 'temp', file_location=tmp_dir)
         client.episode_sync()
         episode_list = client.episode_list(only_files=False)
         with test_utils.temp_audio_file() as temp_audio_file:
-            mocker.patch('hathor.podcast.archive.get', side_effect=requests_get_mock('https://example.foo/download1', temp_audio_file))
+            mocker.patch('hathor.podcast.archive.Session.get', side_effect=requests_get_mock('https://example.foo/download1', temp_audio_file))
             client.episode_download([episode_list[0]['id']])
             episode_list = client.episode_list()
             assert 'Episode_1.mp3' in episode_list[0]['file_path']
@@ -78,32 +339,32 @@ def test_curl_download(mocker):
 def test_curl_download_no_content_type(mocker):
     client = HathorClient()
     with TemporaryDirectory() as tmp_dir:
-        parse_mock = mocker.patch('hathor.podcast.archive.parse')
+        parse_mock = mocker.patch('feedparser.parse')
         parse_mock.return_value = SIMPLE_RSS_FEED
         client.podcast_create('rss', 'https://example.foo', 'temp', file_location=tmp_dir)
         client.episode_sync()
         episode_list = client.episode_list(only_files=False)
         with test_utils.temp_audio_file() as temp_audio_file:
-            mocker.patch('hathor.podcast.archive.get', side_effect=requests_get_mock_no_content('https://example.foo/download1', temp_audio_file))
+            mocker.patch('hathor.podcast.archive.Session.get', side_effect=requests_get_mock_no_content('https://example.foo/download1', temp_audio_file))
             client.episode_download([episode_list[0]['id']])
             episode_list = client.episode_list()
             assert 'Episode_1.mp3' in episode_list[0]['file_path']
             path = Path(episode_list[0]['file_path'])
             assert path.exists()
 
-def test_curl_download_invalid_type(mocker):
+def test_curl_download_invalid_type(mocker, caplog):
     client = HathorClient()
     with TemporaryDirectory() as tmp_dir:
-        parse_mock = mocker.patch('hathor.podcast.archive.parse')
+        parse_mock = mocker.patch('feedparser.parse')
         parse_mock.return_value = RSS_FEED_INVALID_URL
         client.podcast_create('rss', 'https://example.foo', 'temp', file_location=tmp_dir)
         client.episode_sync()
         episode_list = client.episode_list(only_files=False)
         with test_utils.temp_audio_file() as temp_audio_file:
-            mocker.patch('hathor.podcast.archive.get', side_effect=requests_get_mock_no_content('https://example.foo/download1-no-extension', temp_audio_file))
-            with pytest.raises(HathorException) as error:
-                client.episode_download([episode_list[0]['id']])
-            assert 'Unable to determine extension type for url' in str(error.value)
+            mocker.patch('hathor.podcast.archive.Session.get', side_effect=requests_get_mock_no_content('https://example.foo/download1-no-extension', temp_audio_file))
+            # Fails only the one episode, the rest of the run carries on
+            assert not client.episode_download([episode_list[0]['id']])
+            assert 'Unable to determine extension type for url' in caplog.text
 
 def test_title_filters():
     no_filters = verify_title_filters([], 'foo')
@@ -113,6 +374,36 @@ def test_title_filters():
     bad_filter = verify_title_filters([r'^foo$'], 'bar')
     assert bad_filter is False
 
+def test_title_filters_combined():
+    # Every filter has to match from the start of the title, as with re.match
+    filters = [r'^Episode', r'.*Part \d', r'[A-Z]']
+    assert len(compile_title_filters(tuple(filters))) == 1
+    assert verify_title_filters(filters, 'Episode 4: Part 2') is True
+    assert verify_title_filters(filters, 'Episode 4') is False
+    assert verify_title_filters(filters, 'Bonus: Episode 4 Part 2') is False
+    assert verify_title_filters([r'foo$', r'.*bar'], 'foo') is False
+    # Groups and inline flags are matched one pattern at a time
+    assert len(compile_title_filters((r'(a)\1', r'.*b'))) == 2
+    assert verify_title_filters([r'(a)\1', r'(x)?a'], 'aa') is True
+    assert len(compile_title_filters((r'(?i)episode', r'(?i).*part'))) == 2
+    assert verify_title_filters([r'(?i)episode', r'(?i).*part'], 'EPISODE 1 PART 2') is True
+    assert len(compile_title_filters((r'(?i)episode', r'.*part'))) == 2
+
+def test_title_filters_cached():
+    compile_title_filters.cache_clear()
+    for _ in range(3):
+        verify_title_filters([r'^foo', r'.*bar'], 'foo bar')
+    assert compile_title_filters.cache_info().misses == 1
+
+def test_lazy_module():
+    # Imported on first use, then handed back from the cache
+    archive._lazy_module.cache_clear() #pylint:disable=protected-access
+    feedparser = archive._lazy_module('feedparser') #pylint:disable=protected-access
+    feed = feedparser.parse('<rss version="2.0"><channel><item><title>Episode 0</title></item></channel></rss>')
+    assert feed['entries'][0]['title'] == 'Episode 0'
+    assert archive._lazy_module('feedparser') is sys.modules['feedparser'] #pylint:disable=protected-access
+    assert archive._lazy_module.cache_info().hits == 1 #pylint:disable=protected-access
+
 def test_archive_interface():
     manager = ArchiveInterface(logging)
     with pytest.raises(FunctionUndefined) as error:
@@ -124,14 +415,14 @@ def test_archive_interface():
 
 def test_rss_interface_broadcast_update(mocker):
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = SIMPLE_RSS_FEED
     episode_list = manager.broadcast_update('https://example.foo')
     assert episode_list[0]['title'] == 'Episode 0'
 
 def test_rss_interface_broadcast_update_max_results(mocker):
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = SIMPLE_RSS_FEED
     episode_list = manager.broadcast_update('https://example.foo', max_results=1)
     assert episode_list[0]['title'] == 'Episode 0'
@@ -139,12 +430,42 @@ def test_rss_interface_broadcast_update_max_results(mocker):
 
 def test_rss_interface_broadcast_update_filters(mocker):
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = SIMPLE_RSS_FEED
     episode_list = manager.broadcast_update('https://example.foo', filters=[r'^Episode 1'])
     assert episode_list[0]['title'] == 'Episode 1'
     assert len(episode_list) == 1
 
+def test_rss_interface_broadcast_update_feed_state(mocker):
+    manager = RSSManager(logging)
+    parse_mock = mocker.patch('feedparser.parse')
+    parse_mock.return_value = {**SIMPLE_RSS_FEED, 'etag': '"abc"', 'modified': 'Wed, 11 Dec 2024 23:40:01 GMT'}
+    feed_state = {}
+    episode_list = manager.broadcast_update('https://example.foo', feed_state=feed_state)
+    assert len(episode_list) == 2
+    # nothing to be conditional on yet
+    parse_mock.assert_called_with('https://example.foo')
+    assert feed_state['etag'] == '"abc"'
+    assert feed_state['modified'] == 'Wed, 11 Dec 2024 23:40:01 GMT'
+    assert feed_state['unchanged'] is False
+
+    # same entries, served again without a 304
+    episode_list = manager.broadcast_update('https://example.foo', feed_state=feed_state)
+    parse_mock.assert_called_with('https://example.foo', etag='"abc"', modified='Wed, 11 Dec 2024 23:40:01 GMT')
+    assert not episode_list
+    assert feed_state['unchanged'] is True
+
+def test_rss_interface_broadcast_update_not_modified(mocker):
+    manager = RSSManager(logging)
+    parse_mock = mocker.patch('feedparser.parse')
+    parse_mock.return_value = {'status': 304, 'feed': {}, 'entries': []}
+    feed_state = {'etag': '"abc"', 'modified': None, 'content_hash': 'def'}
+    assert not manager.broadcast_update('https://example.foo', feed_state=feed_state)
+    assert feed_state['unchanged'] is True
+    # a 304 keeps the validators it was sent with
+    assert feed_state['etag'] == '"abc"'
+    assert feed_state['content_hash'] == 'def'
+
 def test_rss_valid_id(mocker):
     rss_feed_with_id = {
         'feed': {
@@ -159,7 +480,7 @@ def test_rss_valid_id(mocker):
         ]
     }
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = rss_feed_with_id
     episode_list = manager.broadcast_update('https://example.foo')
     assert episode_list[0]['title'] == 'Episode 0'
@@ -167,7 +488,7 @@ def test_rss_valid_id(mocker):
 
 def test_rss_invalid_feed(mocker):
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = {
         'entries': [
             {
@@ -188,7 +509,7 @@ def test_rss_invalid_feed(mocker):
 
 def test_rss_invalid_link(mocker):
     manager = RSSManager(logging)
-    parse_mock = mocker.patch('hathor.podcast.archive.parse')
+    parse_mock = mocker.patch('feedparser.parse')
     parse_mock.return_value = {
         'feed': {
             'link': 'https://example.foo'
@@ -212,7 +533,7 @@ def test_rss_invalid_link(mocker):
 def test_ress_interface_episode_download(mocker):
     manager = RSSManager(logging)
     with test_utils.temp_audio_file() as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.get', side_effect=requests_get_mock('https://example.foo/download1', temp_audio_file))
+        mocker.patch('hathor.podcast.archive.Session.get', side_effect=requests_get_mock('https://example.foo/download1', temp_audio_file))
         with TemporaryDirectory() as temp_dir:
             path, size = manager.episode_download('https://example.foo/download1', f'{temp_dir}/episode0')
             assert size == Path(path).stat().st_size
@@ -225,8 +546,9 @@ TWITCH_PUBLISHED_AT = '2026-08-11T17:55:36Z'
 
 
 class TwitchResponseMock():
-    def __init__(self, payload):
+    def __init__(self, payload, status_code=200):
         self._payload = payload
+        self.status_code = status_code
 
     def raise_for_status(self):
         return None
@@ -270,8 +592,8 @@ def twitch_get_mock(routes, calls=None):
 
 
 def build_twitch_manager(mocker, routes, calls=None, post_mock=None, **kwargs):
-    mocker.patch('hathor.podcast.archive.post', side_effect=post_mock or twitch_post_mock())
-    mocker.patch('hathor.podcast.archive.get', side_effect=twitch_get_mock(routes, calls))
+    mocker.patch('hathor.podcast.archive.Session.post', side_effect=post_mock or twitch_post_mock())
+    mocker.patch('hathor.podcast.archive.Session.get', side_effect=twitch_get_mock(routes, calls))
     return TwitchManager(logging, twitch_client_id='id123',
                          twitch_client_secret='secret123', **kwargs)
 
@@ -340,6 +662,21 @@ def test_twitch_broadcast_update(mocker):
     assert videos_call[2]['Client-Id'] == 'id123'
 
 
+def test_twitch_broadcast_update_user_id_cached(mocker):
+    calls = []
+    manager = build_twitch_manager(mocker, {
+        'users': users_route(user_id='777'),
+        'videos': {'data': [twitch_video(title='Stream 0')]},
+    }, calls=calls)
+    resolution_cache = {}
+    manager.broadcast_update('somechannel', resolution_cache=resolution_cache)
+    assert resolution_cache == {'somechannel': '777'}
+    manager.broadcast_update('somechannel', resolution_cache={'somechannel': '888'})
+    # the second listing reads the user id from the cache
+    assert [c[0] for c in calls] == ['users', 'videos', 'videos']
+    assert calls[-1][1]['user_id'] == '888'
+
+
 def test_twitch_broadcast_update_honors_max_results(mocker):
     manager = build_twitch_manager(mocker, {
         'users': users_route(),
@@ -413,6 +750,62 @@ def test_twitch_token_is_reused(mocker):
     assert post_calls[0]['client_secret'] == 'secret123'
 
 
+def test_twitch_token_refreshed_before_expiry(mocker):
+    post_calls = []
+    def counting_post(_url, params=None, timeout=None): #pylint:disable=unused-argument
+        post_calls.append(params)
+        return TwitchResponseMock({'access_token': f'token{len(post_calls)}', 'expires_in': 1000})
+    calls = []
+    manager = build_twitch_manager(mocker, {
+        'users': users_route(),
+        'videos': {'data': [twitch_video()]},
+    }, calls=calls, post_mock=counting_post)
+    mocker.patch('hathor.podcast.archive.monotonic', return_value=100)
+    manager.broadcast_update('somechannel')
+    # Still inside the refresh margin, so the token is kept
+    mocker.patch('hathor.podcast.archive.monotonic', return_value=100 + 1000 - archive.TWITCH_TOKEN_REFRESH_MARGIN - 1)
+    manager.broadcast_update('somechannel')
+    assert len(post_calls) == 1
+    mocker.patch('hathor.podcast.archive.monotonic', return_value=100 + 1000 - archive.TWITCH_TOKEN_REFRESH_MARGIN)
+    manager.broadcast_update('somechannel')
+    assert len(post_calls) == 2
+    assert calls[-1][2]['Authorization'] == 'Bearer token2'
+
+
+def test_twitch_token_retried_once_on_unauthorized(mocker):
+    post_calls = []
+    def counting_post(_url, params=None, timeout=None): #pylint:disable=unused-argument
+        post_calls.append(params)
+        return TwitchResponseMock({'access_token': f'token{len(post_calls)}', 'expires_in': 5000})
+    manager = build_twitch_manager(mocker, {}, post_mock=counting_post)
+    headers_seen = []
+    def revoked_get(url, params=None, headers=None, timeout=None): #pylint:disable=unused-argument
+        headers_seen.append(headers['Authorization'])
+        if headers['Authorization'] == 'Bearer token1':
+            return TwitchResponseMock({}, status_code=401)
+        return TwitchResponseMock(users_route())
+    mocker.patch('hathor.podcast.archive.Session.get', side_effect=revoked_get)
+    assert manager._api_get('users', {'login': 'somechannel'}) == users_route() #pylint:disable=protected-access
+    assert headers_seen == ['Bearer token1', 'Bearer token2']
+    assert len(post_calls) == 2
+
+
+def test_twitch_unauthorized_not_retried_twice(mocker):
+    post_calls = []
+    def counting_post(_url, params=None, timeout=None): #pylint:disable=unused-argument
+        post_calls.append(params)
+        return TwitchResponseMock({'access_token': 'token123'})
+    manager = build_twitch_manager(mocker, {}, post_mock=counting_post)
+    get_calls = []
+    def unauthorized_get(url, params=None, headers=None, timeout=None): #pylint:disable=unused-argument
+        get_calls.append(url)
+        return TwitchResponseMock({'message': 'Invalid OAuth token'}, status_code=401)
+    mocker.patch('hathor.podcast.archive.Session.get', side_effect=unauthorized_get)
+    manager._api_get('users', {'login': 'somechannel'}) #pylint:disable=protected-access
+    assert len(get_calls) == 2
+    assert len(post_calls) == 2
+
+
 class MockTwitchDLError():
     def extract_info(self, *args, **kwargs):
         raise DownloadError('issue downloading file')
@@ -456,7 +849,7 @@ def test_twitch_broadcast_download(mocker):
         'streams': {'data': []},
     })
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file))
         _file_path, size = manager.episode_download(_twitch_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -466,7 +859,7 @@ def test_twitch_broadcast_download_error(mocker):
     manager = build_twitch_manager(mocker, {
         'videos': {'data': [twitch_video(video_id='123456')]},
     })
-    mocker.patch('hathor.podcast.archive.YoutubeDL', side_effect=mock_ytdlp_error)
+    mocker.patch('yt_dlp.YoutubeDL', side_effect=mock_ytdlp_error)
     file_path, size = manager.episode_download(_twitch_url(), 'bar')
     assert file_path is None
     assert size is None
@@ -477,7 +870,7 @@ def test_twitch_download_skips_live_broadcast(mocker):
         'videos': {'data': [twitch_video(video_id='123456', stream_id='stream999')]},
         'streams': {'data': [{'id': 'stream999'}]},
     })
-    yt_mock = mocker.patch('hathor.podcast.archive.YoutubeDL')
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
     with pytest.raises(EpisodeNotReady) as error:
         manager.episode_download(_twitch_url(), 'bar')
     assert 'Episode not ready for download' in str(error.value)
@@ -490,7 +883,7 @@ def test_twitch_download_proceeds_when_other_stream_live(mocker):
         'streams': {'data': [{'id': 'a-newer-stream'}]},
     })
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file))
         _file_path, size = manager.episode_download(_twitch_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -502,7 +895,7 @@ def test_twitch_download_skips_vod_still_processing(mocker):
             video_id='123456',
             thumbnail='https://vod-secure.twitch.tv/_404/404_processing_320x180.png')]},
     })
-    yt_mock = mocker.patch('hathor.podcast.archive.YoutubeDL')
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
     with pytest.raises(EpisodeNotReady) as error:
         manager.episode_download(_twitch_url(), 'bar')
     assert 'Episode not ready for download' in str(error.value)
@@ -512,7 +905,7 @@ def test_twitch_download_skips_vod_still_processing(mocker):
 def test_twitch_download_proceeds_when_video_not_found(mocker):
     manager = build_twitch_manager(mocker, {'videos': {'data': []}})
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file))
         _file_path, size = manager.episode_download(_twitch_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -521,7 +914,7 @@ def test_twitch_download_proceeds_when_video_not_found(mocker):
 def test_twitch_download_proceeds_for_unparseable_url(mocker):
     manager = build_twitch_manager(mocker, {})
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file))
         _file_path, size = manager.episode_download('https://example.com/not-a-vod', 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -530,11 +923,11 @@ def test_twitch_download_proceeds_for_unparseable_url(mocker):
 def test_twitch_download_proceeds_when_liveness_check_errors(mocker):
     def boom(*_args, **_kwargs):
         raise RuntimeError('api unreachable')
-    mocker.patch('hathor.podcast.archive.post', side_effect=twitch_post_mock())
-    mocker.patch('hathor.podcast.archive.get', side_effect=boom)
+    mocker.patch('hathor.podcast.archive.Session.post', side_effect=twitch_post_mock())
+    mocker.patch('hathor.podcast.archive.Session.get', side_effect=boom)
     manager = TwitchManager(logging, twitch_client_id='id123', twitch_client_secret='secret123')
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file))
         _file_path, size = manager.episode_download(_twitch_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -546,7 +939,7 @@ def test_twitch_download_ytdlp_options_override_format(mocker):
     }, ytdlp_options={'format': 'worst', 'proxy': 'socks5://localhost:1080'})
     captured = {}
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file, captured))
         manager.episode_download(_twitch_url(), 'bar')
     assert captured['format'] == 'worst'
@@ -559,7 +952,7 @@ def test_twitch_download_ytdlp_options_cannot_override_output(mocker):
     }, ytdlp_options={'outtmpl': 'nope', 'logger': None})
     captured = {}
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_twitch(temp_audio_file, captured))
         manager.episode_download(_twitch_url(), 'bar')
     assert captured['outtmpl'] == 'bar.%(ext)s'
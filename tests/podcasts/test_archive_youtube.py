@@ -5,6 +5,7 @@ import logging
 from pathlib import Path
 import random
 import string
+from threading import Barrier
 
 from googleapiclient.errors import HttpError
 import pytest
@@ -14,6 +15,7 @@ from hathor.exc import EpisodeNotReady, HathorException
 from hathor.podcast.archive import YoutubeManager, extract_youtube_video_id
 from hathor.podcast.archive import youtube_quota_exhausted
 from hathor.podcast.archive import YOUTUBE_KNOWN_STREAK_STOP, YOUTUBE_MAX_PAGES, YOUTUBE_NUM_RETRIES
+from hathor.podcast.archive import YOUTUBE_SHORTS_CONCURRENCY
 
 from tests import utils as test_utils
 
@@ -101,7 +103,7 @@ def youtube_manager(mocker, client=None, **kwargs):
     land before construction, the manager builds its api client in __init__
     '''
     client = client if client is not None else MockYoutubeClient()
-    mocker.patch('hathor.podcast.archive.build', return_value=client)
+    mocker.patch('googleapiclient.discovery.build', return_value=client)
     kwargs.setdefault('google_api_key', 'derp')
     return YoutubeManager(logging, **kwargs)
 
@@ -300,6 +302,23 @@ def test_youtube_broadcast_update_legacy_channel_id(mocker):
     assert client.playlist_items_mock.list_calls[0]['playlistId'] == 'UUlegacy'
 
 
+def test_youtube_broadcast_update_legacy_channel_id_cached(mocker):
+    client = MockYoutubeClient(
+        pages=[playlist_page(playlist_item())],
+        channels_response={'items': [{'contentDetails': {'relatedPlaylists': {'uploads': 'UUlegacy'}}}]})
+    manager = youtube_manager(mocker, client)
+    resolution_cache = {}
+    manager.broadcast_update('legacy-channel-name', resolution_cache=resolution_cache)
+    assert resolution_cache == {'legacy-channel-name': 'UUlegacy'}
+
+    client = MockYoutubeClient(pages=[playlist_page(playlist_item())])
+    manager = youtube_manager(mocker, client)
+    manager.broadcast_update('legacy-channel-name', resolution_cache=resolution_cache)
+    # found in the cache, so no call is spent on it
+    assert not client.channels_mock.list_calls
+    assert client.playlist_items_mock.list_calls[0]['playlistId'] == 'UUlegacy'
+
+
 def test_youtube_broadcast_update_channel_not_found(mocker):
     client = MockYoutubeClient(channels_response={'items': []})
     manager = youtube_manager(mocker, client)
@@ -377,7 +396,7 @@ def mock_shorts_head(mocker, short_ids=(), error=None):
             raise error
         return MockHeadResponse(200 if url.rsplit('/', 1)[-1] in short_ids else 303)
 
-    mocker.patch('hathor.podcast.archive.head', side_effect=_head)
+    mocker.patch('hathor.podcast.archive.Session.head', side_effect=_head)
     return calls
 
 
@@ -455,6 +474,62 @@ def test_youtube_broadcast_update_keeps_video_when_shorts_check_fails(mocker):
     assert len(manager.broadcast_update(YOUTUBE_CHANNEL)) == 1
 
 
+
+def test_youtube_broadcast_update_shorts_cache(mocker):
+    short_id = random_video_id()
+    cached_short = random_video_id()
+    cached_regular = random_video_id()
+    client = MockYoutubeClient(pages=[playlist_page(
+        playlist_item(video_id=cached_short, title='Short 0'),
+        playlist_item(video_id=cached_regular, title='Episode 0'),
+        playlist_item(video_id=short_id, title='Short 1'),
+        playlist_item(title='Episode 1'))])
+    manager = youtube_manager(mocker, client, youtube_skip_shorts=True)
+    calls = mock_shorts_head(mocker, short_ids=[short_id])
+    shorts_cache = {cached_short: True, cached_regular: False}
+    episode_list = manager.broadcast_update(YOUTUBE_CHANNEL, shorts_cache=shorts_cache)
+    assert [e['title'] for e in episode_list] == ['Episode 0', 'Episode 1']
+    # answered from the cache, so only the new videos cost a request
+    assert len(calls) == 2
+    assert shorts_cache[short_id] is True
+    assert len(shorts_cache) == 4
+
+
+def test_youtube_broadcast_update_shorts_failure_not_cached(mocker):
+    video_id = random_video_id()
+    client = MockYoutubeClient(pages=[playlist_page(playlist_item(video_id=video_id))])
+    manager = youtube_manager(mocker, client, youtube_skip_shorts=True)
+    mock_shorts_head(mocker, error=RuntimeError('youtube unreachable'))
+    shorts_cache = {}
+    manager.broadcast_update(YOUTUBE_CHANNEL, shorts_cache=shorts_cache)
+    # no answer to remember, the next sync asks again
+    assert not shorts_cache
+
+
+def test_youtube_broadcast_update_shorts_checked_ahead_bounded(mocker):
+    client = MockYoutubeClient(pages=[playlist_page(*[playlist_item(title=f'Episode {i}') for i in range(30)])])
+    manager = youtube_manager(mocker, client, youtube_skip_shorts=True)
+    calls = mock_shorts_head(mocker)
+    episode_list = manager.broadcast_update(YOUTUBE_CHANNEL, max_results=2)
+    assert len(episode_list) == 2
+    # checked a few at a time, so stopping early wastes no more than one round
+    assert len(calls) == YOUTUBE_SHORTS_CONCURRENCY
+
+
+def test_youtube_broadcast_update_shorts_checked_concurrently(mocker):
+    client = MockYoutubeClient(pages=[playlist_page(*[playlist_item(title=f'Episode {i}') for i in range(4)])])
+    manager = youtube_manager(mocker, client, youtube_skip_shorts=True)
+    barrier = Barrier(4, timeout=5)
+
+    def _head(_url, **_):
+        # Only passes once all four checks are in flight together
+        barrier.wait()
+        return MockHeadResponse(303)
+
+    mocker.patch('hathor.podcast.archive.Session.head', side_effect=_head)
+    assert len(manager.broadcast_update(YOUTUBE_CHANNEL)) == 4
+
+
 class MockYoutubeDL():
     def __init__(self, temp_audio_file):
         self.temp_audio_file = temp_audio_file
@@ -488,13 +563,13 @@ def mock_youtube_error(_options):
 def test_youtube_broadcast_download(mocker):
     manager = youtube_manager(mocker)
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL', side_effect=generate_mock_youtube(temp_audio_file))
+        mocker.patch('yt_dlp.YoutubeDL', side_effect=generate_mock_youtube(temp_audio_file))
         _file_path, size = manager.episode_download('foo', 'bar')
         assert size == Path(temp_audio_file).stat().st_size
 
 def test_youtube_broadcast_download_error(mocker):
     manager = youtube_manager(mocker)
-    mocker.patch('hathor.podcast.archive.YoutubeDL', side_effect=mock_youtube_error)
+    mocker.patch('yt_dlp.YoutubeDL', side_effect=mock_youtube_error)
     file_path, size = manager.episode_download('foo', 'bar')
     assert file_path is None
     assert size is None
@@ -508,7 +583,7 @@ def capture_ytdlp_options(temp_audio_file, captured):
 
 def download_with_options(mocker, manager, captured):
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=capture_ytdlp_options(temp_audio_file, captured))
         manager.episode_download('foo', 'bar')
 
@@ -594,7 +669,7 @@ def test_youtube_download_skips_live_broadcast(mocker):
             'contentDetails': {'duration': 'PT0S'},
         }]
     }))
-    yt_mock = mocker.patch('hathor.podcast.archive.YoutubeDL')
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
     with pytest.raises(EpisodeNotReady) as error:
         manager.episode_download(_live_url(), 'bar')
     assert 'Episode not ready for download' in str(error.value)
@@ -609,7 +684,7 @@ def test_youtube_download_skips_upcoming_broadcast(mocker):
             'contentDetails': {},
         }]
     }))
-    yt_mock = mocker.patch('hathor.podcast.archive.YoutubeDL')
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
     with pytest.raises(EpisodeNotReady) as error:
         manager.episode_download(_live_url(), 'bar')
     assert 'Episode not ready for download' in str(error.value)
@@ -624,7 +699,7 @@ def test_youtube_download_skips_live_still_processing(mocker):
             'contentDetails': {'duration': 'PT0S'},
         }]
     }))
-    yt_mock = mocker.patch('hathor.podcast.archive.YoutubeDL')
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
     with pytest.raises(EpisodeNotReady) as error:
         manager.episode_download(_live_url(), 'bar')
     assert 'Episode not ready for download' in str(error.value)
@@ -640,7 +715,7 @@ def test_youtube_download_proceeds_for_processed_live_vod(mocker):
         }]
     }))
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_youtube(temp_audio_file))
         _file_path, size = manager.episode_download(_live_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -654,7 +729,7 @@ def test_youtube_download_proceeds_for_regular_vod(mocker):
         }]
     }))
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_youtube(temp_audio_file))
         _file_path, size = manager.episode_download(
             f'https://www.youtube.com/watch?v={random_video_id()}', 'bar')
@@ -665,7 +740,7 @@ def test_youtube_download_proceeds_when_api_check_fails(mocker):
     manager = youtube_manager(mocker, MockYoutubeClient(
         videos_response=RuntimeError('api unreachable')))
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_youtube(temp_audio_file))
         _file_path, size = manager.episode_download(_live_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
@@ -674,7 +749,60 @@ def test_youtube_download_proceeds_when_api_check_fails(mocker):
 def test_youtube_download_proceeds_when_video_not_found(mocker):
     manager = youtube_manager(mocker, MockYoutubeClient(videos_response={'items': []}))
     with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
-        mocker.patch('hathor.podcast.archive.YoutubeDL',
+        mocker.patch('yt_dlp.YoutubeDL',
                      side_effect=generate_mock_youtube(temp_audio_file))
         _file_path, size = manager.episode_download(_live_url(), 'bar')
         assert size == Path(temp_audio_file).stat().st_size
+
+
+class MockVideosByIds(MockApiCollection):
+    '''Answers videos.list for whatever ids are asked for, out of a table of items'''
+    def __init__(self, items):
+        super().__init__(None)
+        self._items = items
+
+    def list(self, **kwargs):
+        self.list_calls.append(kwargs)
+        ids = kwargs['id'].split(',')
+        return MockApiRequest({'items': [{'id': video_id, **self._items[video_id]} \
+                                         for video_id in ids if video_id in self._items]})
+
+
+def test_youtube_download_prepare_batches_liveness(mocker):
+    video_ids = [random_video_id() for _ in range(60)]
+    items = {video_id: {'snippet': {'liveBroadcastContent': 'none'},
+                        'contentDetails': {'duration': random_duration()}} for video_id in video_ids}
+    items[video_ids[0]] = {'snippet': {'liveBroadcastContent': 'live'}, 'contentDetails': {'duration': 'PT0S'}}
+    # Gone from youtube, so left for the download to find out about
+    del items[video_ids[1]]
+    client = MockYoutubeClient()
+    client.videos_mock = MockVideosByIds(items)
+    manager = youtube_manager(mocker, client)
+    manager.episode_download_prepare([watch_url(video_id) for video_id in video_ids] + ['https://example.foo/bar'])
+    assert len(client.videos_mock.list_calls) == 2
+    assert client.videos_mock.list_calls[0]['id'] == ','.join(video_ids[:50])
+    assert client.videos_mock.list_calls[1]['id'] == ','.join(video_ids[50:])
+
+    yt_mock = mocker.patch('yt_dlp.YoutubeDL')
+    with pytest.raises(EpisodeNotReady):
+        manager.episode_download(watch_url(video_ids[0]), 'bar')
+    with test_utils.temp_audio_file(suffix='.mp4') as temp_audio_file:
+        yt_mock.side_effect = generate_mock_youtube(temp_audio_file)
+        for video_id in video_ids[1:3]:
+            manager.episode_download(watch_url(video_id), 'bar')
+    # Answered from the batch, no call per download
+    assert len(client.videos_mock.list_calls) == 2
+    # Used up by the download, so a later one checks again
+    assert manager._youtube_vod_ready(watch_url(video_ids[2])) #pylint:disable=protected-access
+    assert len(client.videos_mock.list_calls) == 3
+
+
+def test_youtube_download_prepare_failure_falls_back(mocker):
+    client = MockYoutubeClient(videos_response=http_error(500, 'backendError'))
+    manager = youtube_manager(mocker, client)
+    video_id = random_video_id()
+    manager.episode_download_prepare([watch_url(video_id)])
+    assert not manager._vod_ready #pylint:disable=protected-access
+    # Checked on its own at download, which fails open the same way
+    assert manager._youtube_vod_ready(watch_url(video_id)) #pylint:disable=protected-access
+    assert len(client.videos_mock.list_calls) == 2
@@ -2,9 +2,13 @@ from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory, NamedTemporaryFile
+from threading import Barrier, Lock
+from time import sleep
 import pytest
+from sqlalchemy import event
 
 from hathor.client import HathorClient
+from hathor.database.tables import BroadcastResolution, YoutubeShortsCheck
 from hathor.exc import AudioFileException, EpisodeNotReady, HathorException
 from hathor.podcast.archive import RSSManager, YoutubeManager
 
@@ -228,6 +232,75 @@ def test_episode_sync_known_urls_scoped(mocker):
         # one podcast's episodes must never stop another podcast's paging
         assert kwargs.get('known_urls') == {e['download_link'] for e in mock_episode_data_two}
 
+def test_episode_sync_feed_state(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        def rss_update(_broadcast_id, feed_state=None, **_):
+            if feed_state.get('etag') == '"abc"':
+                feed_state['unchanged'] = True
+                return []
+            feed_state.update({'etag': '"abc"', 'modified': None, 'content_hash': 'def', 'unchanged': False})
+            return mock_episode_data
+        mocked_rss = mocker.patch.object(RSSManager, 'broadcast_update', side_effect=rss_update)
+        assert len(client.episode_sync(include_podcasts=[new_pod1['id']])) == 2
+        _, kwargs = mocked_rss.call_args
+        # the validators handed back are saved for the next sync
+        assert kwargs.get('feed_state')['etag'] == '"abc"'
+
+        commit_spy = mocker.spy(client.db_session, 'commit')
+        assert not client.episode_sync(include_podcasts=[new_pod1['id']])
+        _, kwargs = mocked_rss.call_args
+        assert kwargs.get('feed_state')['unchanged'] is True
+        # unchanged validators are not written again
+        assert commit_spy.call_count == 0
+
+def test_episode_sync_feed_state_cleared(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo', max_allowed=2)
+        # the state is filled in place, so keep what each call was sent
+        sent = []
+        def rss_update(_broadcast_id, feed_state=None, backfill=False, **_):
+            sent.append((None if feed_state is None else dict(feed_state), backfill))
+            if feed_state is not None:
+                feed_state.update({'etag': '"abc"', 'modified': None, 'content_hash': 'def'})
+            return mock_episode_data
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=rss_update)
+        # empty podcast, so the first sync is a backfill
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1] == (None, True)
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0] == {}
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0]['etag'] == '"abc"'
+
+        # a new filter changes which episodes belong, so the feed is fetched in full
+        client.filter_create(new_pod1['id'], '^Episode')
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0] == {}
+
+        # as does deleting an episode, which leaves the podcast under its max allowed
+        # and backfilling, with no validators to send at all
+        client.episode_delete([client.episode_list(only_files=False)[0]['id']], delete_files=False)
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1] == (None, True)
+
+        # and an explicit max episode sync never trusts them
+        client.episode_sync(include_podcasts=[new_pod1['id']], max_episode_sync=0)
+        assert sent[-1] == (None, False)
+
+        # neither saved any, so the next plain sync starts over and the one after is conditional
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0] == {}
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0]['etag'] == '"abc"'
+        client.podcast_update(new_pod1['id'], max_allowed=0)
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert sent[-1][0] == {}
+
 def test_archive_manager_is_reused():
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
@@ -245,6 +318,102 @@ def test_episode_sync_duplicate_podcast(mocker):
         episode_list = client.episode_list(only_files=False)
         assert len(episode_list) == 1
 
+def test_episode_sync_single_commit_per_podcast(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        commit_spy = mocker.spy(client.db_session, 'commit')
+        new_episodes = client.episode_sync(include_podcasts=[new_pod1['id']])
+        # every new episode goes in with the one commit, not one apiece
+        assert commit_spy.call_count == 1
+        assert [ep['download_url'] for ep in new_episodes] == [e['download_link'] for e in mock_episode_data]
+        assert all(ep['id'] is not None for ep in new_episodes)
+
+        # nothing new on the second pass, so nothing to commit
+        assert not client.episode_sync(include_podcasts=[new_pod1['id']])
+        assert commit_spy.call_count == 1
+
+def test_episode_sync_url_stored_on_other_podcast(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('rss', '5678', 'bar')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        # download urls are unique across the library, so the second podcast
+        # has to skip them even though they are not in its own known urls
+        assert not client.episode_sync(include_podcasts=[new_pod2['id']])
+        assert len(client.episode_list(only_files=False)) == 2
+
+def test_episode_sync_patreon_stored_on_other_podcast(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('rss', '5678', 'bar')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_patreon)
+        client.episode_sync(include_podcasts=[new_pod1['id']])
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_patreon_two + mock_patreon_two)
+        assert not client.episode_sync(include_podcasts=[new_pod2['id']])
+        assert len(client.episode_list(only_files=False)) == 2
+
+def test_episode_sync_concurrent(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', sync_concurrency=4)
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('rss', '5678', 'bar')
+        new_pod3 = client.podcast_create('youtube', '1234', 'baz')
+        # Both rss listings have to be in flight at once to get past the barrier
+        barrier = Barrier(2, timeout=5)
+        def rss_update(broadcast_id, **_):
+            barrier.wait()
+            if broadcast_id == '1234':
+                return mock_episode_data
+            return mock_patreon
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=rss_update)
+        mocker.patch.object(YoutubeManager, 'broadcast_update', return_value=mock_episode_data_two)
+        new_episodes = client.episode_sync(include_podcasts=[new_pod1['id'], new_pod2['id'], new_pod3['id']])
+        # stored in podcast order, however the listings finished
+        assert [ep['podcast_id'] for ep in new_episodes] == [new_pod1['id']] * 2 + [new_pod2['id']] * 2 + [new_pod3['id']] * 2
+
+def test_episode_sync_concurrent_youtube_not_blocking(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', sync_concurrency=2)
+
+        new_pod1 = client.podcast_create('youtube', '1234', 'foo')
+        new_pod2 = client.podcast_create('youtube', '5678', 'bar')
+        new_pod3 = client.podcast_create('rss', '1234', 'baz')
+        # Youtube lists one podcast at a time, so the second youtube listing waits, and
+        # the rss listing queued behind it has to take the free worker to get past the barrier
+        barrier = Barrier(2, timeout=5)
+        def youtube_update(broadcast_id, **_):
+            if broadcast_id == '1234':
+                barrier.wait()
+                return mock_episode_data_two
+            return []
+        def rss_update(_broadcast_id, **_):
+            barrier.wait()
+            return mock_episode_data
+        mocker.patch.object(YoutubeManager, 'broadcast_update', side_effect=youtube_update)
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=rss_update)
+        new_episodes = client.episode_sync(include_podcasts=[new_pod1['id'], new_pod2['id'], new_pod3['id']])
+        assert [ep['podcast_id'] for ep in new_episodes] == [new_pod1['id']] * 2 + [new_pod3['id']] * 2
+
+def test_episode_sync_concurrent_error(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', sync_concurrency=2)
+
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('rss', '5678', 'bar')
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=HathorException('Invalid data from rss feed'))
+        with pytest.raises(HathorException) as error:
+            client.episode_sync(include_podcasts=[new_pod1['id'], new_pod2['id']])
+        assert 'Invalid data from rss feed' in str(error.value)
+
 def test_episode_list(mocker):
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
@@ -262,6 +431,105 @@ def test_episode_list(mocker):
                                            exclude_podcasts=[new_pod1['id']])
         assert len(episode_list) == 2
 
+def test_episode_list_without_descriptions(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        new_pod = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        client.db_session.expire_all()
+
+        statements = []
+        event.listen(client.engine, 'before_cursor_execute',
+                     lambda _conn, _cursor, statement, *_: statements.append(statement))
+        episode_list = client.episode_list(only_files=False, include_descriptions=False)
+        assert len(episode_list) == 2
+        assert all('description' not in episode for episode in episode_list)
+        # Never read from the database, not even lazily
+        assert len(statements) == 1
+        assert 'description' not in statements[0]
+
+        statements.clear()
+        episode_list = client.episode_list(only_files=False)
+        assert episode_list[0]['description'] == 'Episode 1 description'
+        # Loaded along with the rows, not one query per row
+        assert len(statements) == 1
+
+def test_episode_descriptions_loaded_with_rows(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir)
+            new_pod = client.podcast_create('rss', '1234', 'foo')
+            mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+            mocker.patch.object(RSSManager, 'episode_download', return_value=(Path(temp_audio), 123))
+            client.episode_sync(include_podcasts=[new_pod['id']])
+            episode_ids = [ep['id'] for ep in client.episode_list(only_files=False)]
+
+            statements = []
+            event.listen(client.engine, 'before_cursor_execute',
+                         lambda _conn, _cursor, statement, *_: statements.append(statement))
+            def description_selects():
+                return [s for s in statements if s.startswith('SELECT podcast_episode.description')]
+
+            client.db_session.expire_all()
+            downloaded = client.episode_download(episode_ids)
+            assert all(ep['description'] and ep['file_size'] == 123 for ep in downloaded)
+            # One select for the rows to download, however many commits follow
+            assert len([s for s in statements if s.startswith('SELECT')]) == 1
+            client.db_session.expire_all()
+            assert client.episode_show(episode_ids)[0]['description']
+            client.db_session.expunge_all()
+            assert client.episode_update(episode_ids[0], prevent_delete=True)['description']
+            # Every description came along with its row, none with a query of its own
+            assert not description_selects()
+            assert not client.episode_show([])
+
+def test_iter_episodes_keyset_pages(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('youtube', '1234', 'bar')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        mocker.patch.object(YoutubeManager, 'broadcast_update', return_value=mock_episode_data_two)
+        client.episode_sync(include_podcasts=[new_pod1['id'], new_pod2['id']])
+        all_ids = sorted(episode['id'] for episode in client.episode_list(only_files=False))
+
+        statements = []
+        event.listen(client.engine, 'before_cursor_execute',
+                     lambda _conn, _cursor, statement, *_: statements.append(statement))
+        episodes = list(client.iter_episodes(only_files=False, batch_size=3))
+        assert [episode['id'] for episode in episodes] == all_ids
+        # Two batches, the second one short
+        assert len(statements) == 2
+        # Picked up from the last id, not skipped to by offset
+        assert 'podcast_episode.id > ?' in statements[1]
+
+        page = list(client.iter_episodes(only_files=False, limit=2, after_id=all_ids[0]))
+        assert [episode['id'] for episode in page] == all_ids[1:3]
+        page = list(client.iter_episodes(only_files=False, include_podcasts=[new_pod2['id']],
+                                         include_descriptions=False))
+        assert len(page) == 2
+        assert all('description' not in episode for episode in page)
+        assert not list(client.iter_episodes(only_files=False, after_id=all_ids[-1]))
+
+def test_iter_episodes_stops_at_limit_on_batch_boundary(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        new_pod = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        assert len(list(client.iter_episodes(only_files=False, limit=1, batch_size=1))) == 1
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'limit': 0}, 'Limit must be positive integer'),
+    ({'batch_size': 0}, 'Batch size must be positive integer'),
+])
+def test_iter_episodes_invalid(kwargs, message):
+    client = HathorClient()
+    with pytest.raises(HathorException) as error:
+        list(client.iter_episodes(**kwargs))
+    assert message in str(error.value)
+
 def test_episode_show(mocker):
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
@@ -468,6 +736,170 @@ def test_episode_download_not_ready(mocker):
             # Not ready episodes keep no file, so a later sync picks them up again
             assert client.episode_show(episode_list[0]['id'])[0]['file_path'] is None
 
+def test_episode_download_failure_isolated(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+            new_pod1 = client.podcast_create('rss', '1234', 'foo')
+            episodes = [{**mock_episode_data[0], 'download_link': f'https://foo.example.com/{i}.mp3',
+                         'title': f'Episode {i}'} for i in range(4)]
+            mocker.patch.object(RSSManager, 'broadcast_update', return_value=episodes)
+            client.episode_sync(include_podcasts=[new_pod1['id']])
+            episode_list = client.episode_list(only_files=False)
+
+            # The first download in order fails, the rest still land and get recorded
+            def download(download_url, _output_prefix, **_):
+                if download_url == episode_list[0]['download_url']:
+                    raise HathorException('Incomplete download')
+                return Path(temp_audio), 123
+            mocker.patch.object(RSSManager, 'episode_download', side_effect=download)
+
+            downloaded = client.episode_download([ep['id'] for ep in episode_list], download_concurrency=2)
+            assert sorted(ep['id'] for ep in downloaded) == sorted(ep['id'] for ep in episode_list[1:])
+            assert client.episode_show(episode_list[0]['id'])[0]['file_path'] is None
+            assert all(ep['file_path'] for ep in client.episode_show([ep['id'] for ep in episode_list[1:]]))
+
+def test_episode_download_concurrent(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+
+            new_pod1 = client.podcast_create('rss', '1234', 'foo')
+            mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+            client.episode_sync(include_podcasts=[new_pod1['id']])
+            episode_list = client.episode_list(only_files=False)
+
+            # Both downloads have to be in flight at once to get past the barrier
+            barrier = Barrier(2, timeout=5)
+            def download(_download_url, _output_prefix, **_):
+                barrier.wait()
+                return Path(temp_audio), 123
+            mocker.patch.object(RSSManager, 'episode_download', side_effect=download)
+
+            downloaded = client.episode_download([ep['id'] for ep in episode_list], download_concurrency=2)
+            assert sorted(ep['id'] for ep in downloaded) == sorted(ep['id'] for ep in episode_list)
+            assert all(ep['file_size'] == 123 for ep in downloaded)
+
+def test_episode_download_concurrent_youtube_serial(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', download_concurrency=4)
+
+            new_pod = client.podcast_create('youtube', '1234', 'bar')
+            mocker.patch.object(YoutubeManager, 'broadcast_update', return_value=mock_episode_data_two)
+            client.episode_sync(include_podcasts=[new_pod['id']])
+            episode_list = client.episode_list(only_files=False)
+
+            running = []
+            most_running = []
+            lock = Lock()
+            def download(_download_url, _output_prefix, **_):
+                with lock:
+                    running.append(1)
+                    most_running.append(len(running))
+                sleep(0.05)
+                with lock:
+                    running.pop()
+                return Path(temp_audio), 123
+            mocker.patch.object(YoutubeManager, 'episode_download', side_effect=download)
+            prepare = mocker.patch.object(YoutubeManager, 'episode_download_prepare')
+
+            downloaded = client.episode_download([ep['id'] for ep in episode_list])
+            assert len(downloaded) == 2
+            # Every url handed over at once, ahead of the downloads
+            prepare.assert_called_once()
+            assert sorted(prepare.call_args.args[0]) == sorted(ep['download_url'] for ep in episode_list)
+            # youtube holds its own share to one, however wide the pool
+            assert max(most_running) == 1
+
+def test_episode_download_youtube_not_blocking(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', download_concurrency=2)
+
+            youtube_pod = client.podcast_create('youtube', '1234', 'bar')
+            rss_pod = client.podcast_create('rss', '1234', 'foo')
+            mocker.patch.object(YoutubeManager, 'broadcast_update', return_value=mock_episode_data_two)
+            mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data[:1])
+            client.episode_sync(include_podcasts=[youtube_pod['id'], rss_pod['id']])
+            episode_list = client.episode_list(only_files=False)
+            mocker.patch.object(YoutubeManager, 'episode_download_prepare')
+
+            # The second youtube download waits on the first, so the rss download queued
+            # behind it has to take the free worker to get past the barrier
+            barrier = Barrier(2, timeout=5)
+            youtube_started = []
+            def youtube_download(_download_url, _output_prefix, **_):
+                youtube_started.append(1)
+                if len(youtube_started) == 1:
+                    barrier.wait()
+                return Path(temp_audio), 123
+            def rss_download(_download_url, _output_prefix, **_):
+                barrier.wait()
+                return Path(temp_audio), 123
+            mocker.patch.object(YoutubeManager, 'episode_download', side_effect=youtube_download)
+            mocker.patch.object(RSSManager, 'episode_download', side_effect=rss_download)
+
+            downloaded = client.episode_download([ep['id'] for ep in episode_list])
+            assert sorted(ep['podcast_id'] for ep in downloaded) == sorted(ep['podcast_id'] for ep in episode_list)
+
+def test_episode_sync_stores_shorts_checks(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo', youtube_skip_shorts=True)
+        new_pod = client.podcast_create('youtube', '1234', 'bar')
+        seen = []
+        def broadcast_update(_broadcast_id, shorts_cache=None, **_):
+            seen.append(dict(shorts_cache))
+            shorts_cache.setdefault('abc', True)
+            return []
+        mocker.patch.object(YoutubeManager, 'broadcast_update', side_effect=broadcast_update)
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        # what the first sync learned is handed to the second
+        assert seen == [{}, {'abc': True}]
+
+        # Only the answers of the podcasts being synced are loaded
+        other_pod = client.podcast_create('youtube', '5678', 'baz')
+        client.episode_sync(include_podcasts=[other_pod['id']])
+        assert seen[-1] == {}
+        rows = client.db_session.query(YoutubeShortsCheck).order_by(YoutubeShortsCheck.podcast_id).all()
+        assert [(row.podcast_id, row.video_id) for row in rows] == [(new_pod['id'], 'abc'), (other_pod['id'], 'abc')]
+        # and they go with their podcast
+        client.podcast_delete([new_pod['id']])
+        assert [row.podcast_id for row in client.db_session.query(YoutubeShortsCheck)] == [other_pod['id']]
+
+def test_episode_sync_stores_broadcast_resolutions(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod = client.podcast_create('youtube', 'legacy-name', 'bar')
+        seen = []
+        def broadcast_update(broadcast_id, resolution_cache=None, **_):
+            seen.append(dict(resolution_cache))
+            resolution_cache.setdefault(broadcast_id, 'UUfound')
+            return []
+        mocker.patch.object(YoutubeManager, 'broadcast_update', side_effect=broadcast_update)
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        assert seen == [{}, {'legacy-name': 'UUfound'}]
+
+        # Past its ttl, so it is looked up again and the row refreshed
+        row = client.db_session.query(BroadcastResolution).one()
+        row.resolved_at = datetime(2000, 1, 1)
+        client.db_session.commit()
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        assert seen[-1] == {}
+        row = client.db_session.query(BroadcastResolution).one()
+        assert row.resolved_at > datetime(2000, 1, 1)
+        assert row.archive_type == 'youtube'
+
+def test_episode_download_concurrency_invalid():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        with pytest.raises(HathorException) as error:
+            client.episode_download([1], download_concurrency=0)
+        assert 'Download concurrency must be positive integer' in str(error.value)
+
 class MockYoutubeDLOptions():
     def __init__(self, audio_file):
         self.audio_file = audio_file
@@ -498,7 +930,7 @@ def test_episode_download_uses_client_ytdlp_options(mocker):
                 captured.update(options)
                 yield MockYoutubeDLOptions(temp_audio)
 
-            mocker.patch('hathor.podcast.archive.YoutubeDL', side_effect=mock_youtube_client)
+            mocker.patch('yt_dlp.YoutubeDL', side_effect=mock_youtube_client)
             client.episode_download([episode_list[0]['id']])
 
     assert captured['sleep_requests'] == 7
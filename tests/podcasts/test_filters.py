@@ -21,6 +21,15 @@ def test_filter_create_no_podcast():
             client.filter_create(1, '1234')
         assert 'Unable to find podcast with id' in str(error.value)
 
+def test_filter_create_invalid_regex():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        podcast = client.podcast_create('rss', '1234', 'foo')
+        with pytest.raises(HathorException) as error:
+            client.filter_create(podcast['id'], 'Episode (')
+        assert 'Invalid regex string: Episode (' in str(error.value)
+        assert not client.filter_list()
+
 def test_filter_list_includes():
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir)
@@ -45,3 +54,8 @@ def test_filter_delete():
 
         filter_list = client.filter_list()
         client.filter_delete([filter_list[0]['id']])
+
+def test_filter_delete_none_found():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        assert not client.filter_delete([1])
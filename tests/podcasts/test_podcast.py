@@ -1,11 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from errno import EXDEV
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import pytest
+from sqlalchemy import event
 
 from hathor.client import HathorClient
+from hathor.database.tables import PodcastFeedValidator, PodcastSyncCheck
 from hathor.exc import HathorException
 from hathor.podcast.archive import RSSManager
 
@@ -193,11 +195,38 @@ def test_podcast_update_file_location_move_failure(mocker):
             original_dir = client.podcast_list()[0]['file_location']
 
             with TemporaryDirectory() as new_dir:
-                mocker.patch('hathor.client.move', side_effect=OSError('disk on fire'))
+                mocker.patch('hathor.utils.move_file', side_effect=OSError('disk on fire'))
                 with pytest.raises(OSError):
                     client.podcast_update_file_location(new_pod1['id'], Path(new_dir))
                 assert client.podcast_list()[0]['file_location'] == original_dir
 
+def test_podcast_update_file_location_resume(mocker):
+    # An interrupted run can leave files in the new dir that the database still has in the
+    # old one, and running it again picks them up where they are
+    def fake_download(_url, path_prefix):
+        path = Path(f'{path_prefix}.mp3')
+        path.write_bytes(b'foo')
+        return path, 3
+
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        mocker.patch.object(RSSManager, 'episode_download', side_effect=fake_download)
+        client.episode_sync()
+        client.podcast_sync(sync_web_episodes=False)
+        with TemporaryDirectory() as new_dir:
+            moved_path = Path(client.episode_list()[0]['file_path'])
+            moved_path.rename(Path(new_dir) / moved_path.name)
+
+            client.podcast_update_file_location(new_pod1['id'], Path(new_dir))
+            episode_list = client.episode_list()
+            assert len(episode_list) == 2
+            for episode in episode_list:
+                assert episode['file_path'].startswith(str(Path(new_dir).resolve()))
+                assert Path(episode['file_path']).read_bytes() == b'foo'
+            assert not Path(new_pod1['file_location']).exists()
+
 def test_podcast_update_file_no_move(mocker):
     with TemporaryDirectory() as tmp_dir:
         with temp_audio_file() as temp_audio:
@@ -268,6 +297,109 @@ def test_podcast_delete_keep_files(mocker):
             assert len(episodes) == 0
             assert Path(temp_audio).exists()
 
+def empty_feed(_broadcast_id, feed_state=None, **_):
+    feed_state['etag'] = '"abc"'
+    return []
+
+def test_podcast_delete_without_episodes_clears_validators(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        new_pod = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=empty_feed)
+        client.episode_sync()
+        assert client.db_session.query(PodcastFeedValidator).count() == 1
+
+        client.podcast_delete([new_pod['id']])
+        assert client.db_session.query(PodcastFeedValidator).count() == 0
+
+def test_podcast_delete_synced_without_episodes(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        new_pod = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', side_effect=empty_feed)
+        client.podcast_sync(download_episodes=False)
+        assert client.db_session.query(PodcastSyncCheck).count() == 1
+
+        client.podcast_delete([new_pod['id']])
+        assert client.db_session.query(PodcastFeedValidator).count() == 0
+        assert client.db_session.query(PodcastSyncCheck).count() == 0
+        # Nothing is passed on to a podcast that reuses the id
+        reused_pod = client.podcast_create('rss', '5678', 'bar')
+        assert reused_pod['id'] == new_pod['id']
+        assert client.db_session.query(PodcastSyncCheck).count() == 0
+
+def test_podcast_delete_failure_keeps_podcast(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        new_pod = client.podcast_create('rss', '1234', 'foo')
+        mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+        client.episode_sync()
+        client.filter_create(new_pod['id'], 'Episode')
+
+        def fail(*_, **__):
+            raise HathorException('plugin failed')
+        client.plugins = {'__podcast_title_filter_delete_input': (fail,)}
+        with pytest.raises(HathorException) as error:
+            client.podcast_delete([new_pod['id']])
+        assert 'plugin failed' in str(error.value)
+        client.db_session.rollback()
+        client.plugins = {}
+        # Nothing was committed, so the podcast keeps its episodes and filters
+        assert len(client.podcast_list()) == 1
+        assert len(client.episode_list(only_files=False)) == 2
+        assert len(client.filter_list()) == 1
+
+def test_podcast_delete_bulk(mocker):
+    def fake_download(_url, path_prefix):
+        path = Path(f'{path_prefix}.mp3')
+        path.write_bytes(b'foo')
+        return path, 3
+
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod1 = client.podcast_create('rss', '1234', 'foo')
+        new_pod2 = client.podcast_create('rss', '5678', 'bar')
+        broadcasts = {'1234': mock_episode_data, '5678': mock_episode_data_second_run}
+        mocker.patch.object(RSSManager, 'broadcast_update',
+                            side_effect=lambda broadcast_id, *_, **__: broadcasts[broadcast_id])
+        mocker.patch.object(RSSManager, 'episode_download', side_effect=fake_download)
+        client.episode_sync()
+        client.podcast_sync(sync_web_episodes=False)
+        client.filter_create(new_pod1['id'], 'foo')
+        episode_list = client.episode_list()
+        assert len(episode_list) == 4
+        # Already gone files are skipped over
+        Path(episode_list[0]['file_path']).unlink()
+
+        plugin_calls = {}
+        def record(name):
+            def plugin(_client, result, *_, **__):
+                plugin_calls[name] = result
+                return result
+            return plugin
+        client.plugins = {name: (record(name),) for name in ['__episode_delete_input', '__episode_delete_file_input',
+                                                             '__podcast_title_filter_delete_input']}
+        statements = []
+        event.listen(client.engine, 'before_cursor_execute',
+                     lambda _conn, _cursor, statement, *_: statements.append(statement))
+        commits = []
+        event.listen(client.engine, 'commit', lambda _conn: commits.append(1))
+        assert client.podcast_delete([new_pod1['id'], new_pod2['id']]) == [new_pod1['id'], new_pod2['id']]
+        # Episodes, files, filters and podcasts all go in one transaction
+        assert len(commits) == 1
+        episode_deletes = [s for s in statements if s.startswith('DELETE FROM podcast_episode')]
+        assert len(episode_deletes) == 1
+        # Deleting a podcast runs the plugins of the episode, file and filter deletes, once each
+        assert sorted(plugin_calls['__episode_delete_input']) == sorted(e['id'] for e in episode_list)
+        assert sorted(plugin_calls['__episode_delete_file_input']) == sorted(e['id'] for e in episode_list[1:])
+        assert len(plugin_calls['__podcast_title_filter_delete_input']) == 1
+        assert not client.podcast_list()
+        assert not client.filter_list()
+        assert not client.episode_list(only_files=False)
+        assert not Path(new_pod1['file_location']).exists()
+        assert not Path(new_pod2['file_location']).exists()
+        assert not client.podcast_delete([])
+
 def test_podcast_sync_automatic_off():
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
@@ -325,7 +457,8 @@ def test_podcast_sync_new_data(mocker):
             assert episode_list[0]['title'] == 'Episode 1'
 
             mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data_second_run)
-            client.podcast_sync()
+            # Forced, as the podcast was only just synced and is not expected to have published
+            client.podcast_sync(force=True)
             episode_list = client.episode_list()
             assert len(episode_list) == 1
             assert episode_list[0]['title'] == 'Episode 3'
@@ -342,10 +475,94 @@ def test_podcast_sync_new_data_with_prevent_delete(mocker):
             assert episode_list[0]['title'] == 'Episode 1'
             client.episode_update(episode_list[0]['id'], prevent_delete=True)
             mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data_second_run)
-            client.podcast_sync()
+            client.podcast_sync(force=True)
             episode_list = client.episode_list()
             assert len(episode_list) == 2
 
+def test_podcast_sync_max_allowed_many_podcasts(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+            pods = [client.podcast_create('rss', f'pod{i}', f'pod{i}', max_allowed=max_allowed) \
+                    for i, max_allowed in enumerate([1, 2, None])]
+            def broadcast_update(broadcast_id, **_):
+                return [{**episode, 'download_link': f'{episode["download_link"]}/{broadcast_id}'} \
+                        for episode in mock_episode_data + mock_episode_data_second_run]
+            mocker.patch.object(RSSManager, 'broadcast_update', side_effect=broadcast_update)
+            mocker.patch.object(RSSManager, 'episode_download', return_value=(Path(temp_audio), 123))
+            statements = []
+            event.listen(client.engine, 'before_cursor_execute',
+                         lambda _conn, _cursor, statement, *_: statements.append(statement))
+            client.podcast_sync()
+            episode_list = client.episode_list()
+            titles = {pod['id']: sorted(e['title'] for e in episode_list if e['podcast_id'] == pod['id']) \
+                      for pod in pods}
+            assert titles[pods[0]['id']] == ['Episode 3']
+            assert titles[pods[1]['id']] == ['Episode 2', 'Episode 3']
+            assert len(titles[pods[2]['id']]) == 4
+            # Planned with one ranked query for downloads and one for deletions, and
+            # the publishing intervals measured with another, however many podcasts there are
+            assert len([s for s in statements if 'row_number' in s.lower()]) == 3
+
+def weekly_episodes(last_published):
+    return [{
+        'download_link': f'https://foo.com/weekly{i}',
+        'title': f'Weekly {i}',
+        'date': last_published - timedelta(days=7 * i),
+        'description': None,
+    } for i in range(4)]
+
+def test_podcast_sync_adaptive(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod = client.podcast_create('rss', 'foo', 'foo')
+        last_published = datetime.now() - timedelta(days=1)
+        mocked_rss = mocker.patch.object(RSSManager, 'broadcast_update', return_value=weekly_episodes(last_published))
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 1
+        sync_check = client.db_session.query(PodcastSyncCheck).one()
+        assert sync_check.publish_interval == 7 * 24 * 60 * 60
+        assert sync_check.last_published == last_published
+
+        # Next episode is six days out, so nothing is checked for a quarter of that
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 1
+        sync_check.last_checked -= timedelta(hours=35)
+        client.db_session.commit()
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 1
+        sync_check.last_checked -= timedelta(hours=2)
+        client.db_session.commit()
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 2
+
+        # Unless forced
+        client.podcast_sync(download_episodes=False, force=True)
+        assert mocked_rss.call_count == 3
+        # and episode sync always syncs
+        client.episode_sync(include_podcasts=[new_pod['id']])
+        assert mocked_rss.call_count == 4
+
+def test_podcast_sync_adaptive_expected_soon(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+        new_pod = client.podcast_create('rss', 'foo', 'foo')
+        mocked_rss = mocker.patch.object(RSSManager, 'broadcast_update',
+                                         return_value=weekly_episodes(datetime.now() - timedelta(days=7)))
+        client.podcast_sync(download_episodes=False)
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 1
+        # Due any minute, so checked again after the shortest interval
+        sync_check = client.db_session.query(PodcastSyncCheck).one()
+        sync_check.last_checked -= timedelta(minutes=16)
+        client.db_session.commit()
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 2
+        # Changing the podcast syncs it next time whatever its schedule
+        client.podcast_update(new_pod['id'], max_allowed=2)
+        client.podcast_sync(download_episodes=False)
+        assert mocked_rss.call_count == 3
+
 def test_podcast_sync_exclude():
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
@@ -366,6 +583,38 @@ def test_podcast_sync_include(mocker):
             episode_list = client.episode_list()
             assert len(episode_list) == 2
 
+def test_podcast_sync_download_plugins_and_rank_filters(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with temp_audio_file() as temp_audio:
+            client = HathorClient(podcast_directory=tmp_dir, google_api_key='foo')
+            pod1 = client.podcast_create('rss', 'foo', 'foo', max_allowed=1)
+            pod2 = client.podcast_create('rss', 'bar', 'bar', max_allowed=1)
+            def broadcast_update(broadcast_id, **_):
+                return [{**episode, 'download_link': f'{episode["download_link"]}/{broadcast_id}'} \
+                        for episode in mock_episode_data]
+            mocker.patch.object(RSSManager, 'broadcast_update', side_effect=broadcast_update)
+            mocker.patch.object(RSSManager, 'episode_download', return_value=(Path(temp_audio), 123))
+            plugin_calls = []
+            def download_plugin(_client, result, *_, **__):
+                plugin_calls.append(result)
+                return result
+            client.plugins = {'_podcast_download_episodes': (download_plugin,)}
+            statements = []
+            event.listen(client.engine, 'before_cursor_execute',
+                         lambda _conn, _cursor, statement, *_: statements.append(statement))
+            client.podcast_sync(include_podcasts=[pod1['id']])
+            assert len(plugin_calls) == 1
+            # Only the podcasts in the sync are ranked
+            ranked = [s for s in statements if 'row_number' in s.lower()]
+            assert ranked and all('podcast_episode.podcast_id IN' in s for s in ranked)
+            statements.clear()
+            client.podcast_sync(exclude_podcasts=[pod1['id']])
+            assert len(plugin_calls) == 2
+            ranked = [s for s in statements if 'row_number' in s.lower()]
+            # One ranked query for downloads and one for deletions
+            assert len([s for s in ranked if 'podcast_episode.podcast_id NOT IN' in s]) == 2
+            assert {e['podcast_id'] for e in client.episode_list()} == {pod1['id'], pod2['id']}
+
 def test_podcast_create_twitch():
     with TemporaryDirectory() as tmp_dir:
         client = HathorClient(podcast_directory=tmp_dir,
@@ -2,12 +2,15 @@ from copy import deepcopy
 from datetime import datetime
 from json import loads
 from pathlib import Path
+import subprocess
+import sys
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
 from click.testing import CliRunner
 from yaml import dump
 
 from hathor.cli import cli
+from hathor.exc import HathorException
 from hathor.podcast.archive import RSSManager
 
 from tests.utils import temp_audio_file
@@ -60,7 +63,17 @@ def test_dump_config():
         runner = CliRunner()
         result = runner.invoke(cli, ['-c', f'{config.name}', 'dump-config'])
         assert result.exit_code == 0
-        assert result.output == '{\n    "hathor": {},\n    "logging": {}\n}\n'
+        assert result.output == '{\n    "hathor": {},\n    "logging": {},\n    "daemon": {}\n}\n'
+
+def test_cli_import_skips_archive_libraries():
+    # Each of these costs more to import than the rest of the cli, and is left
+    # until an archive first needs it
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import hathor.cli'],
+                            capture_output=True, text=True, check=True)
+    imported = {line.split('|')[-1].strip().split('.')[0] for line in result.stderr.splitlines() \
+                if line.startswith('import time:')}
+    assert 'hathor' in imported
+    assert not imported & {'yt_dlp', 'googleapiclient', 'feedparser', 'validators'}
 
 def test_logging_config():
     with NamedTemporaryFile(suffix='.log') as log_file:
@@ -491,6 +504,22 @@ def test_episode_list(mocker):
                         'title': 'Episode 0',
                     },
                 ]
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--no-descriptions'])
+                assert 'description' not in loads(result.output)[0]
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--ndjson'])
+                lines = result.output.splitlines()
+                assert len(lines) == 1
+                assert loads(lines[0])['title'] == 'Episode 0'
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--after-id', '1'])
+                assert not loads(result.output)
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--limit', '1'])
+                assert loads(result.output)[0]['id'] == 1
+                # Zero is a value given, not the option left out
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--after-id', '0'])
+                assert loads(result.output)[0]['id'] == 1
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'list', '--limit', '0'])
+                assert isinstance(result.exception, HathorException)
+                assert 'Limit must be positive integer, 0 given' in str(result.exception)
 
 def test_episode_list_only_files(mocker):
     with NamedTemporaryFile(suffix='.sql') as db_file:
@@ -776,3 +805,80 @@ def test_podcast_sync():
                 result = runner.invoke(cli, ['-c', f'{config.name}', 'podcast', 'sync',
                                              '--no-sync-web-episodes', '--no-download-episodes'])
                 assert loads(result.output) is True
+                result = runner.invoke(cli, ['-c', f'{config.name}', 'podcast', 'sync', '--force',
+                                             '--no-sync-web-episodes', '--no-download-episodes'])
+                assert loads(result.output) is True
+
+def test_daemon(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        with NamedTemporaryFile(suffix='.yml') as config:
+            config_data = {
+                'hathor': {
+                    'podcast_directory': tmp_dir,
+                },
+                'daemon': {
+                    'sync_interval': 600,
+                    'podcast_sync_intervals': {1: 60},
+                },
+            }
+            with open(config.name, 'w+', encoding='utf-8') as writer:
+                dump(config_data, writer)
+            scheduler = mocker.patch('hathor.cli.SyncScheduler')
+            runner = CliRunner()
+            result = runner.invoke(cli, ['-c', f'{config.name}', 'daemon', '--sync-jitter', '5',
+                                         '--no-download-episodes', '--download-concurrency', '2'])
+            assert result.exit_code == 0
+            assert scheduler.call_args.kwargs == {
+                'sync_interval': 600,
+                'podcast_sync_intervals': {1: 60},
+                'sync_jitter': 5,
+                'download_episodes': False,
+                'download_concurrency': 2,
+            }
+            scheduler.return_value.run.assert_called_once_with()
+
+def test_podcast_sync_download_concurrency(mocker):
+    with NamedTemporaryFile(suffix='.sql') as db_file:
+        with TemporaryDirectory() as tmp_dir:
+            with NamedTemporaryFile(suffix='.yml') as config:
+                with temp_audio_file() as temp_audio:
+                    config_data = {
+                        'hathor': {
+                            'database_connection_string': f'sqlite:///{db_file.name}',
+                            'podcast_directory': tmp_dir,
+                        }
+                    }
+                    with open(config.name, 'w+', encoding='utf-8') as writer:
+                        dump(config_data, writer)
+                    runner = CliRunner()
+                    runner.invoke(cli, ['-c', f'{config.name}', 'podcast', 'create',
+                                        'rss', 'https://foo.com/example', 'temp-pod',
+                                        '--file-location', tmp_dir])
+                    mocker.patch.object(RSSManager, 'broadcast_update', return_value=mock_episode_data)
+                    mocked_download = mocker.patch.object(RSSManager, 'episode_download',
+                                                          return_value=(Path(temp_audio), 123))
+                    result = runner.invoke(cli, ['-c', f'{config.name}', 'podcast', 'sync',
+                                                 '--download-concurrency', '2'])
+                    assert loads(result.output) is True
+                    assert mocked_download.call_count == 1
+                    result = runner.invoke(cli, ['-c', f'{config.name}', 'episode', 'download', '1',
+                                                 '--download-concurrency', '2'])
+                    assert loads(result.output)[0]['file_size'] == 123
+
+def test_db_status_and_migrate():
+    with NamedTemporaryFile(suffix='.sql') as db_file:
+        with NamedTemporaryFile(suffix='.yml') as config:
+            config_data = {
+                'hathor': {
+                    'database_connection_string': f'sqlite:///{db_file.name}',
+                }
+            }
+            with open(config.name, 'w+', encoding='utf-8') as writer:
+                dump(config_data, writer)
+            runner = CliRunner()
+            result = runner.invoke(cli, ['-c', f'{config.name}', 'db', 'status'])
+            status = loads(result.output)
+            assert status['version'] == status['latest_version']
+            assert not status['pending']
+            result = runner.invoke(cli, ['-c', f'{config.name}', 'db', 'migrate'])
+            assert not loads(result.output)
@@ -1,4 +1,15 @@
-from hathor.client import HathorClient
+from tempfile import TemporaryDirectory
+from types import ModuleType
+
+import pytest
+from sqlalchemy import create_engine, desc, inspect
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql import text
+
+from hathor.client import HathorClient, load_plugins
+from hathor.database.tables import BroadcastResolution, PodcastEpisode, YoutubeShortsCheck
+from hathor.exc import HathorException
 
 def mock_plugin(self, result, *_, **__): #pylint:disable=unused-argument
     return 2
@@ -6,11 +17,79 @@ def mock_plugin(self, result, *_, **__): #pylint:disable=unused-argument
 
 def test_plugins():
     client = HathorClient()
-    client.plugins = [('episode_list', mock_plugin)]
+    client.plugins = {'episode_list': (mock_plugin,)}
     result = client.episode_list(only_files=False)
     assert result == 2
 
 
+def test_plugins_loaded_once(mocker):
+    plugin_module = ModuleType('hathor_test_plugins')
+    plugin_module.episode_list = mock_plugin
+    module_entry_point = mocker.Mock()
+    module_entry_point.name = 'hathor_test_plugins'
+    module_entry_point.load.return_value = plugin_module
+    func_entry_point = mocker.Mock()
+    func_entry_point.name = 'podcast_list'
+    func_entry_point.load.return_value = mock_plugin
+    entry_points = mocker.patch('hathor.client.entry_points',
+                                return_value=[module_entry_point, func_entry_point])
+    load_plugins.cache_clear()
+    try:
+        client = HathorClient()
+        other_client = HathorClient()
+        assert client.plugins == {'episode_list': (mock_plugin,), 'podcast_list': (mock_plugin,)}
+        assert other_client.plugins is client.plugins
+        entry_points.assert_called_once_with(group='hathor.plugins')
+        assert client.episode_list(only_files=False) == 2
+        assert client.podcast_list() == 2
+    finally:
+        load_plugins.cache_clear()
+
+
+def test_plugins_before_and_background():
+    client = HathorClient()
+    calls = []
+    def before_plugin(_client, *_, **kwargs):
+        calls.append(('before', kwargs))
+    def background_plugin(_client, result, *_, **__):
+        calls.append(('background', result))
+    client.plugins = {
+        'before_episode_list': (before_plugin,),
+        'episode_list': (mock_plugin,),
+        'background_episode_list': (background_plugin,),
+    }
+    assert client.episode_list(only_files=False) == 2
+    assert client.plugin_hooks.wait(timeout=5)
+    # Background plugins are handed the result after the regular plugins ran
+    assert calls == [('before', {'only_files': False}), ('background', 2)]
+
+
+def test_plugins_before_stops_function():
+    client = HathorClient()
+    def before_plugin(*_, **__):
+        raise HathorException('Not now')
+    client.plugins = {'before_podcast_create': (before_plugin,)}
+    with pytest.raises(HathorException) as error:
+        client.podcast_create('rss', '1234', 'foo')
+    assert 'Not now' in str(error.value)
+    assert not client.podcast_list()
+
+
+def test_plugins_background_waited_on_close():
+    client = HathorClient()
+    calls = []
+    client.plugins = {'background_podcast_list': (lambda *_: calls.append(True),)}
+    client.podcast_list()
+    client.close()
+    assert calls == [True]
+
+
+def test_plugin_settings_invalid():
+    with pytest.raises(HathorException) as error:
+        HathorClient(plugin_workers=0)
+    assert 'Plugin workers must be positive integer, 0 given' in str(error.value)
+
+
 def test_ytdlp_options_default_empty():
     client = HathorClient()
     assert client.ytdlp_options == {}
@@ -39,7 +118,209 @@ def test_youtube_skip_shorts_default_off():
 
 
 def test_youtube_skip_shorts_reaches_the_manager(mocker):
-    mocker.patch('hathor.podcast.archive.build')
+    mocker.patch('googleapiclient.discovery.build')
     client = HathorClient(google_api_key='derp', youtube_skip_shorts=True)
     manager = client._archive_manager('youtube') #pylint:disable=protected-access
     assert manager.skip_shorts is True
+
+
+def test_sync_concurrency_default_serial():
+    client = HathorClient()
+    assert client.sync_concurrency == 1
+
+
+def test_sync_concurrency_invalid():
+    with pytest.raises(HathorException) as error:
+        HathorClient(sync_concurrency=0)
+    assert 'Sync concurrency must be positive integer' in str(error.value)
+
+
+def test_download_concurrency_invalid():
+    with pytest.raises(HathorException) as error:
+        HathorClient(download_concurrency=0)
+    assert 'Download concurrency must be positive integer' in str(error.value)
+
+
+def test_download_segments_reach_the_manager():
+    client = HathorClient(download_segments=4, download_segment_threshold=1024)
+    manager = client._archive_manager('rss') #pylint:disable=protected-access
+    assert manager.download_segments == 4
+    assert manager.download_segment_threshold == 1024
+
+
+def test_download_segments_invalid():
+    with pytest.raises(HathorException) as error:
+        HathorClient(download_segments=0)
+    assert 'Download segments must be positive integer' in str(error.value)
+
+
+def test_http_session_shared_by_managers(mocker):
+    mocker.patch('googleapiclient.discovery.build')
+    client = HathorClient(google_api_key='foo', twitch_client_id='id', twitch_client_secret='secret')
+    for archive_type in ('rss', 'youtube', 'twitch'):
+        manager = client._archive_manager(archive_type) #pylint:disable=protected-access
+        assert manager.session is client.http_session
+
+
+def test_http_pool_maxsize_covers_segments():
+    client = HathorClient(download_concurrency=8, download_segments=4)
+    adapter = client.http_session.get_adapter('https://example.foo')
+    # Capped by the per host download limit, not the whole pool
+    assert adapter._pool_maxsize == 16 #pylint:disable=protected-access
+    client = HathorClient(http_pool_maxsize=3, http_pool_connections=2, http_retries=0)
+    adapter = client.http_session.get_adapter('https://example.foo')
+    assert adapter._pool_maxsize == 3 #pylint:disable=protected-access
+    assert adapter._pool_connections == 2 #pylint:disable=protected-access
+    assert adapter.max_retries.total == 0
+
+
+@pytest.mark.parametrize('settings, message', [
+    ({'http_pool_connections': 0}, 'Http pool connections must be positive integer'),
+    ({'http_pool_maxsize': 0}, 'Http pool maxsize must be positive integer'),
+    ({'http_retries': -1}, 'Http retries must be non-negative integer'),
+])
+def test_http_settings_invalid(settings, message):
+    with pytest.raises(HathorException) as error:
+        HathorClient(**settings)
+    assert message in str(error.value)
+
+
+def _query_plan(client, query):
+    statement = query.statement.compile(client.engine, compile_kwargs={'literal_binds': True})
+    with client.engine.connect() as connection:
+        return ' '.join(row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {statement}')))
+
+
+def test_podcast_episode_lookups_use_indexes():
+    client = HathorClient()
+    newest = client.db_session.query(PodcastEpisode).order_by(desc(PodcastEpisode.date)).\
+        filter(PodcastEpisode.podcast_id == 1).limit(5)
+    plan = _query_plan(client, newest)
+    # Read in index order, no sort of the whole podcast
+    assert 'ix_podcast_episode_podcast_id_date' in plan
+    assert 'TEMP B-TREE' not in plan
+    downloaded = client.db_session.query(PodcastEpisode.id).filter(PodcastEpisode.podcast_id == 1).\
+        filter(PodcastEpisode.file_path.isnot(None))
+    assert 'ix_podcast_episode_podcast_id_file_path' in _query_plan(client, downloaded)
+    patreon = client.db_session.query(PodcastEpisode.processed_url).\
+        filter(PodcastEpisode.processed_url.in_(['https://patreon.com/foo']))
+    assert 'ix_podcast_episode_processed_url' in _query_plan(client, patreon)
+
+
+def test_indexes_added_to_existing_database():
+    with TemporaryDirectory() as tmp_dir:
+        connection_string = f'sqlite:///{tmp_dir}/hathor.sql'
+        HathorClient(database_connection_string=connection_string).close()
+        engine = create_engine(connection_string)
+        with engine.begin() as connection:
+            for index in ('ix_podcast_episode_podcast_id_date', 'ix_podcast_episode_podcast_id_file_path',
+                          'ix_podcast_episode_processed_url'):
+                connection.execute(text(f'DROP INDEX {index}'))
+            # As left by a release from before schema migrations
+            connection.execute(text('DROP TABLE schema_version'))
+        client = HathorClient(database_connection_string=connection_string)
+        indexes = {index['name'] for index in inspect(client.engine).get_indexes('podcast_episode')}
+        assert 'ix_podcast_episode_podcast_id_date' in indexes
+        assert 'ix_podcast_episode_processed_url' in indexes
+        client.close()
+        engine.dispose()
+
+
+def test_youtube_shorts_check_migrated():
+    with TemporaryDirectory() as tmp_dir:
+        connection_string = f'sqlite:///{tmp_dir}/hathor.sql'
+        HathorClient(database_connection_string=connection_string).close()
+        engine = create_engine(connection_string)
+        with engine.begin() as connection:
+            # As left by a release that kept shorts checks by video id alone
+            connection.execute(text('DROP TABLE youtube_shorts_check'))
+            connection.execute(text('CREATE TABLE youtube_shorts_check (id INTEGER PRIMARY KEY, '
+                                    'video_id VARCHAR(32) NOT NULL UNIQUE, is_short BOOLEAN NOT NULL)'))
+            connection.execute(text("INSERT INTO youtube_shorts_check (video_id, is_short) VALUES ('abc', 1)"))
+            connection.execute(text('DELETE FROM schema_version WHERE version = 2'))
+        engine.dispose()
+        client = HathorClient(database_connection_string=connection_string)
+        columns = {column['name'] for column in inspect(client.engine).get_columns('youtube_shorts_check')}
+        assert 'podcast_id' in columns
+        assert not client.db_session.query(YoutubeShortsCheck).count()
+        client.close()
+
+
+def test_broadcast_resolution_mysql_ddl():
+    # Mysql wants a length on every varchar, and on anything in a unique key
+    ddl = str(CreateTable(BroadcastResolution.__table__).compile(dialect=mysql.dialect()))
+    assert 'archive_type VARCHAR(32) NOT NULL' in ddl
+    assert 'broadcast_id VARCHAR(256) NOT NULL' in ddl
+
+
+def test_database_status_new_database():
+    client = HathorClient()
+    status = client.database_status()
+    # Created at the latest schema, nothing to apply
+    assert status['version'] == status['latest_version']
+    assert not status['pending']
+    assert not client.database_migrate()
+
+
+def test_database_migrate_when_auto_migrate_off(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        connection_string = f'sqlite:///{tmp_dir}/hathor.sql'
+        HathorClient(database_connection_string=connection_string).close()
+        engine = create_engine(connection_string)
+        with engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_podcast_episode_podcast_id_date'))
+            connection.execute(text('DELETE FROM schema_version'))
+        engine.dispose()
+
+        logger = mocker.MagicMock()
+        client = HathorClient(database_connection_string=connection_string, logger=logger,
+                              database_auto_migrate=False)
+        assert 'schema migrations behind' in logger.warning.call_args.args[0]
+        status = client.database_status()
+        assert status['version'] == 0
+        assert [migration['version'] for migration in status['pending']] == [1, 2]
+
+        applied = client.database_migrate()
+        assert [migration['version'] for migration in applied] == [1, 2]
+        assert client.database_status()['version'] == 2
+        indexes = {index['name'] for index in inspect(client.engine).get_indexes('podcast_episode')}
+        assert 'ix_podcast_episode_podcast_id_date' in indexes
+        # Nothing left to do the second time round
+        assert not client.database_migrate()
+        client.close()
+
+
+def _pragma(client, name):
+    with client.engine.connect() as connection:
+        return connection.execute(text(f'PRAGMA {name}')).scalar()
+
+
+def test_sqlite_pragmas_default_profile():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(database_connection_string=f'sqlite:///{tmp_dir}/hathor.sql')
+        assert _pragma(client, 'journal_mode') == 'wal'
+        # NORMAL
+        assert _pragma(client, 'synchronous') == 1
+        assert _pragma(client, 'busy_timeout') == 5000
+        assert _pragma(client, 'cache_size') == -64000
+        client.close()
+
+
+def test_sqlite_pragmas_override():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(database_connection_string=f'sqlite:///{tmp_dir}/hathor.sql',
+                              sqlite_pragmas={'journal_mode': None, 'synchronous': 'FULL'})
+        # Left at the sqlite default
+        assert _pragma(client, 'journal_mode') == 'delete'
+        assert _pragma(client, 'synchronous') == 2
+        client.close()
+
+
+@pytest.mark.parametrize('sqlite_pragmas, message', [
+    ({'foreign_keys': 'ON'}, 'Unsupported sqlite pragma foreign_keys'),
+    ({'synchronous': 'OFF; DROP TABLE podcast'}, 'Invalid value for sqlite pragma synchronous'),
+])
+def test_sqlite_pragmas_invalid(sqlite_pragmas, message):
+    with pytest.raises(HathorException) as error:
+        HathorClient(sqlite_pragmas=sqlite_pragmas)
+    assert message in str(error.value)
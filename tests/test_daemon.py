@@ -0,0 +1,132 @@
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from hathor.client import HathorClient
+from hathor.database.tables import Podcast
+from hathor.daemon import SyncScheduler, DAEMON_POLL_INTERVAL
+from hathor.exc import HathorException
+
+class FakeClock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_scheduler_intervals(mocker):
+    clock = FakeClock()
+    mocker.patch('hathor.daemon.monotonic', side_effect=clock)
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        pod1 = client.podcast_create('rss', '1234', 'foo')
+        pod2 = client.podcast_create('rss', '5678', 'bar')
+        sync = mocker.patch.object(HathorClient, 'podcast_sync', return_value=True)
+        scheduler = SyncScheduler(client, sync_interval=600, sync_jitter=0,
+                                  podcast_sync_intervals={pod2['id']: 120}, download_episodes=False)
+
+        # Everything is due on the first run, in one sync
+        assert scheduler.run_pending() == DAEMON_POLL_INTERVAL
+        sync.assert_called_once_with(include_podcasts=[pod1['id'], pod2['id']],
+                                     download_episodes=False, download_concurrency=None)
+
+        clock.now += 60
+        assert scheduler.run_pending() == 60
+        assert sync.call_count == 1
+
+        clock.now += 60
+        scheduler.run_pending()
+        assert sync.call_args.kwargs['include_podcasts'] == [pod2['id']]
+
+        # New podcasts are picked up and deleted ones dropped
+        client.podcast_delete([pod1['id']])
+        pod3 = client.podcast_create('rss', '9012', 'baz')
+        clock.now += 1
+        scheduler.run_pending()
+        assert sync.call_args.kwargs['include_podcasts'] == [pod3['id']]
+        assert set(scheduler.next_sync) == {pod2['id'], pod3['id']}
+
+def test_scheduler_reads_podcast_edits(mocker):
+    clock = FakeClock()
+    mocker.patch('hathor.daemon.monotonic', side_effect=clock)
+    with TemporaryDirectory() as tmp_dir:
+        connection_string = f'sqlite:///{tmp_dir}/hathor.sql'
+        client = HathorClient(podcast_directory=tmp_dir, database_connection_string=connection_string)
+        pod = client.podcast_create('rss', '1234', 'foo')
+        # Held on to, as a sync holds on to the rows it loads
+        podcasts = []
+        max_allowed = []
+        def podcast_sync(*_, **__):
+            podcasts.append(client.db_session.get(Podcast, pod['id']))
+            max_allowed.append(podcasts[-1].max_allowed)
+        mocker.patch.object(HathorClient, 'podcast_sync', side_effect=podcast_sync)
+        scheduler = SyncScheduler(client, sync_interval=600, sync_jitter=0)
+        scheduler.run_pending()
+
+        # Edited from another process, such as the cli, while the daemon sleeps
+        other = HathorClient(podcast_directory=tmp_dir, database_connection_string=connection_string)
+        other.podcast_update(pod['id'], max_allowed=3)
+        other.close()
+        clock.now += 600
+        scheduler.run_pending()
+        assert max_allowed == [None, 3]
+        client.close()
+
+def test_scheduler_jitter(mocker):
+    clock = FakeClock()
+    mocker.patch('hathor.daemon.monotonic', side_effect=clock)
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        client.podcast_create('rss', '1234', 'foo')
+        sync = mocker.patch.object(HathorClient, 'podcast_sync', return_value=True)
+        scheduler = SyncScheduler(client, sync_interval=600, sync_jitter=30)
+        mocker.patch.object(scheduler, '_jitter', return_value=30)
+        assert scheduler.run_pending() == 30
+        assert sync.call_count == 0
+        clock.now += 30
+        scheduler.run_pending()
+        assert sync.call_count == 1
+        assert list(scheduler.next_sync.values()) == [clock.now + 630]
+
+def test_scheduler_sync_failure(mocker):
+    clock = FakeClock()
+    mocker.patch('hathor.daemon.monotonic', side_effect=clock)
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        client.podcast_create('rss', '1234', 'foo')
+        sync = mocker.patch.object(HathorClient, 'podcast_sync', side_effect=OSError('disk on fire'))
+        scheduler = SyncScheduler(client, sync_interval=600, sync_jitter=0)
+        scheduler.run_pending()
+        assert sync.call_count == 1
+        assert list(scheduler.next_sync.values()) == [clock.now + 600]
+
+def test_scheduler_no_podcasts():
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        assert SyncScheduler(client).run_pending() == DAEMON_POLL_INTERVAL
+
+def test_scheduler_run_until_stopped(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        scheduler = SyncScheduler(client)
+        runs = []
+        def run_pending():
+            runs.append(True)
+            if len(runs) == 3:
+                scheduler.stop()
+            return 0
+        mocker.patch.object(scheduler, 'run_pending', side_effect=run_pending)
+        scheduler.run()
+        assert len(runs) == 3
+
+@pytest.mark.parametrize('settings, message', [
+    ({'sync_interval': 0}, 'Sync interval must be positive integer'),
+    ({'sync_jitter': -1}, 'Sync jitter must be non-negative integer'),
+    ({'podcast_sync_intervals': {1: 0}}, 'Sync interval for podcast 1 must be positive integer'),
+])
+def test_scheduler_invalid_settings(settings, message):
+    with TemporaryDirectory() as tmp_dir:
+        client = HathorClient(podcast_directory=tmp_dir)
+        with pytest.raises(HathorException) as error:
+            SyncScheduler(client, **settings)
+        assert message in str(error.value)
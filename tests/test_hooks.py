@@ -0,0 +1,73 @@
+import gc
+from threading import Event
+
+import pytest
+
+from hathor.exc import HathorException
+from hathor.hooks import HookPool
+
+@pytest.fixture(autouse=True)
+def collect_garbage():
+    # Clients left in reference cycles by earlier tests hold in memory sqlite connections,
+    # which can only be closed from the thread that opened them. Collect them here, before
+    # the collector gets a chance to run on one of the hook threads
+    gc.collect()
+
+def test_hook_pool_runs_hooks(mocker):
+    logger = mocker.Mock()
+    pool = HookPool(logger, workers=2, timeout=5)
+    results = []
+    def hook(value, extra=None):
+        results.append((value, extra))
+    pool.submit(hook, 1, extra='a')
+    pool.submit(hook, 2)
+    assert pool.wait(timeout=5)
+    assert sorted(results, key=lambda x: x[0]) == [(1, 'a'), (2, None)]
+    # Workers are started once, on the first hook
+    assert len(pool._threads) == 2 #pylint:disable=protected-access
+    logger.error.assert_not_called()
+
+def test_hook_pool_isolates_failures(mocker):
+    logger = mocker.Mock()
+    pool = HookPool(logger, workers=1, timeout=5)
+    results = []
+    def bad_hook():
+        raise ValueError('remote down')
+    pool.submit(bad_hook)
+    pool.submit(results.append, 'after')
+    assert pool.wait(timeout=5)
+    # The failure is logged and the next hook still runs
+    assert results == ['after']
+    logger.error.assert_called_once()
+    assert 'bad_hook failed: remote down' in logger.error.call_args.args[0]
+
+def test_hook_pool_timeout(mocker):
+    logger = mocker.Mock()
+    pool = HookPool(logger, workers=1, timeout=0.05)
+    release = Event()
+    results = []
+    def slow_hook():
+        release.wait(5)
+    pool.submit(slow_hook)
+    pool.submit(results.append, 'after')
+    # The slow hook is abandoned, and does not hold up the one queued behind it
+    assert pool.wait(timeout=5)
+    assert results == ['after']
+    assert 'slow_hook still running after 0.05 seconds' in logger.error.call_args.args[0]
+    release.set()
+
+def test_hook_pool_wait_timeout(mocker):
+    pool = HookPool(mocker.Mock(), workers=1, timeout=5)
+    release = Event()
+    pool.submit(release.wait, 5)
+    assert not pool.wait(timeout=0.01)
+    release.set()
+    assert pool.wait(timeout=5)
+
+def test_hook_pool_invalid_settings(mocker):
+    with pytest.raises(HathorException) as error:
+        HookPool(mocker.Mock(), workers=0)
+    assert 'Plugin workers must be positive integer, 0 given' in str(error.value)
+    with pytest.raises(HathorException) as error:
+        HookPool(mocker.Mock(), timeout=0)
+    assert 'Plugin timeout must be positive number, 0 given' in str(error.value)
@@ -1,7 +1,14 @@
+from errno import EXDEV
+from random import Random
+from string import ascii_letters, digits
 from tempfile import TemporaryDirectory
+from threading import Barrier, Lock
+from time import sleep
 
 from pathlib import Path
 
+import pytest
+
 from hathor import utils
 
 def test_process_url():
@@ -22,6 +29,137 @@ def test_normalize_name():
     assert utils.normalize_name('a&-b') == 'a_b'
     assert utils.normalize_name('a         b') == 'a_b'
 
+# The loop normalize_name replaced, exactly as it was. Its lstrip result was
+# thrown away, so leading underscores were kept
+def original_normalize_name(name):
+    new_str = ''
+    for char in name:
+        if char not in ascii_letters + digits + '_':
+            new_str = f'{new_str}_'
+            continue
+        new_str = f'{new_str}{char}'
+    while True:
+        new_name = new_str.replace('__', '_')
+        if new_name == new_str:
+            break
+        new_str = new_name
+    return new_str.rstrip('_')
+
+# The corrected reference normalize_name is checked against, the original with
+# its leading underscores stripped as intended
+def reference_normalize_name(name):
+    return original_normalize_name(name).lstrip('_')
+
+# The implementation clean_string replaced, kept to check the new one against
+def reference_clean_string(stringy):
+    s = stringy.lstrip(' ')
+    s = s.rstrip(' ').rstrip('\n').rstrip(' ')
+    return s.replace('\n', ' ').replace('\r', '')
+
+def random_strings(count):
+    rand = Random(1234)
+    alphabet = ascii_letters + digits + '__  \n\r\t-&.\'é😀'
+    for _ in range(count):
+        yield ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 40)))
+
+def test_normalize_name_matches_reference():
+    for name in random_strings(2000):
+        assert utils.normalize_name(name) == reference_normalize_name(name)
+
+def test_normalize_name_strips_leading_underscores():
+    # The one intended change from the original
+    assert original_normalize_name('#1: Pilot!') == '_1_Pilot'
+    assert utils.normalize_name('#1: Pilot!') == '1_Pilot'
+    assert utils.normalize_name('__') == ''
+
+def test_clean_string_matches_reference():
+    for stringy in random_strings(2000):
+        assert utils.clean_string(stringy) == reference_clean_string(stringy)
+    # Only the last run of newlines is stripped, those further in become spaces
+    assert utils.clean_string('foo \n \r\n ') == 'foo   '
+
+def test_run_concurrently():
+    assert list(utils.run_concurrently(lambda x: x * 2, [1, 2, 3], 1)) == [2, 4, 6]
+    # results come back in item order however the pool finishes them
+    assert list(utils.run_concurrently(lambda x: x * 2, [3, 2, 1], 3)) == [6, 4, 2]
+
+def test_run_concurrently_error():
+    def fail(x):
+        raise ValueError(f'bad item {x}')
+    with pytest.raises(ValueError) as error:
+        list(utils.run_concurrently(fail, [1, 2], 2))
+    assert 'bad item 1' in str(error.value)
+
+def test_run_concurrently_limits():
+    running = []
+    most_running = []
+    lock = Lock()
+    # The last item has to start alongside the first to get past the barrier, so the
+    # ones held behind the first by their key can not take every worker
+    barrier = Barrier(2, timeout=5)
+    def func(item):
+        with lock:
+            running.append(item[0])
+            most_running.append(running.count('a'))
+        if item in ('a0', 'b0'):
+            barrier.wait()
+        sleep(0.01)
+        with lock:
+            running.remove(item[0])
+        return item
+    items = ['a0', 'a1', 'a2', 'b0']
+    limits = {'a': 1, 'b': 2}
+    assert list(utils.run_concurrently(func, items, 3, limits=lambda item: [(item[0], limits[item[0]])])) == items
+    assert max(most_running) == 1
+
+def test_run_concurrently_limits_error():
+    def fail(x):
+        raise ValueError(f'bad item {x}')
+    with pytest.raises(ValueError) as error:
+        list(utils.run_concurrently(fail, [1, 2, 3], 2, limits=lambda _x: [('key', 1)]))
+    assert 'bad item 1' in str(error.value)
+
+def test_unlink_files():
+    with TemporaryDirectory() as tmp_dir:
+        file_paths = [Path(tmp_dir) / f'{i}.txt' for i in range(4)]
+        for file_path in file_paths[:3]:
+            file_path.write_text('example')
+        assert list(utils.unlink_files(file_paths, 2)) == [True, True, True, False]
+        assert not any(file_path.exists() for file_path in file_paths)
+
+def test_move_file():
+    with TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir) / 'foo.txt'
+        source.write_text('example')
+        destination = Path(tmp_dir) / 'bar.txt'
+        assert utils.move_file(source, destination) == 7
+        assert not source.exists()
+        assert destination.read_text() == 'example'
+        # Already moved, as after an interrupted run
+        assert utils.move_file(source, destination) == 7
+
+def test_move_file_cross_device(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir) / 'foo.txt'
+        source.write_text('example')
+        destination = Path(tmp_dir) / 'bar.txt'
+        # Left over from an interrupted copy
+        (Path(tmp_dir) / 'bar.txt.part').write_text('exa')
+        mocker.patch('hathor.utils.os.rename', side_effect=OSError(EXDEV, 'Invalid cross-device link'))
+        assert utils.move_file(source, destination) == 7
+        assert not source.exists()
+        assert destination.read_text() == 'example'
+        assert not (Path(tmp_dir) / 'bar.txt.part').exists()
+
+def test_move_file_failure(mocker):
+    with TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir) / 'foo.txt'
+        source.write_text('example')
+        mocker.patch('hathor.utils.os.rename', side_effect=PermissionError('nope'))
+        with pytest.raises(PermissionError):
+            utils.move_file(source, Path(tmp_dir) / 'bar.txt')
+        assert source.exists()
+
 def test_rm_tree():
     with TemporaryDirectory() as tmp_dir:
         dir_path = Path(tmp_dir)